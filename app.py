@@ -1,11 +1,52 @@
-import math
-import random
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import streamlit as st
-from datetime import datetime
+import hashlib
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from functools import partial
 from io import BytesIO
+from pathlib import Path
+
+from nawi.analisis import (
+    DECISION_ACEPTAR, DECISION_INDETERMINADA, DECISION_RECHAZAR, METODO_FORMA2, METODO_NORMAL,
+    cribar_lotes, realizar_analisis, resumen_cribado,
+)
+from nawi.archivo import ArchivoPesajes
+from nawi.balanzas import BucleIngesta, ServicioIngesta, parsear_balanza
+from nawi.catalogo import CatalogoProductos, ErrorCatalogo, Especificacion
+from nawi.conmutacion import (
+    INSPECCION_NORMAL, INSPECCION_REDUCIDA, INSPECCION_RIGUROSA, INSPECCION_SUSPENDIDA,
+    MotorConmutacion,
+)
+from nawi.estilo import COLORES
+from nawi.exportar import (
+    FORMATO_CSV_DATOS, FORMATO_CSV_RESUMEN, FORMATO_JSON, FORMATO_PARQUET,
+    FORMATOS_EXPORTACION, carga_exportacion, nombre_archivo
+)
+from nawi.graficos import especificacion_vega, renderizar_grafico
+from nawi.historial import HistorialLotes, RegistroLote
+from nawi.importar import ErrorImportacion, evaluar_pesajes, leer_pesajes, pesos_desde_texto
+from nawi.incremental import (
+    ESTADO_ACEPTAR, ESTADO_INDETERMINADO, ESTADO_INSUFICIENTE, ESTADO_PROVISIONAL_ACEPTAR,
+    ESTADO_PROVISIONAL_RECHAZAR, ESTADO_RECHAZAR, ESTADO_SEGURO_ACEPTAR,
+    ESTADO_SEGURO_RECHAZAR, EvaluacionIncremental,
+)
+from nawi.oc import calcular_curva_oc
+from nawi.perfilador import detener_memoria_detallada, fase, iniciar_rerun, terminar_rerun
+from nawi.piramide import HistoriaPesos, especificacion_historia
+from nawi.planes import AQL_KEYS, NIVELES
+from nawi.reportes import FORMATO_PDF, FORMATO_XLSX, reporte_en_trabajo
+from nawi.simulacion import (
+    ESCENARIO_BIMODAL, ESCENARIO_DESPLAZADO, ESCENARIO_NORMAL, ESCENARIOS, Escenario,
+    generar_pesos_aleatorios,
+)
+from nawi.spc import MonitorSPC, especificacion_cartas
+from nawi.trabajos import (
+    ESTADO_CANCELADO, ESTADO_EN_CURSO, ESTADO_ERROR, ESTADO_TERMINADO, LimiteTrabajos,
+    PoolTrabajos,
+)
 
 # ============================================================
 # CONFIGURACIÓN BÁSICA
@@ -16,17 +57,15 @@ st.set_page_config(
     layout="wide",
 )
 
-# Configuración de colores
-COLORES = {
-    'primary': '#800000',
-    'secondary': '#E9C46A',
-    'accent1': '#2A9D8F',
-    'accent2': '#E76F51',
-    'success': '#28a745',
-    'warning': '#ffc107',
-    'danger': '#dc3545',
-    'light': '#f8f9fa',
-    'dark': '#343a40'
+ETIQUETAS_METODO = {
+    METODO_NORMAL: "Normal (1 - Φ(Z))",
+    METODO_FORMA2: "Forma 2 MIL-STD-414 (beta)",
+}
+
+ETIQUETAS_ESCENARIO = {
+    ESCENARIO_NORMAL: "Proceso centrado",
+    ESCENARIO_DESPLAZADO: "Media desplazada",
+    ESCENARIO_BIMODAL: "Dos máquinas (bimodal)",
 }
 
 # ============================================================
@@ -68,187 +107,6 @@ def mostrar_header():
     
     st.markdown("---")
 
-# ============================================================
-# TABLAS DE DATOS MIL-STD-414
-# ============================================================
-RANGOS_LOTE = [
-    (3, 8,     {'I': 'B', 'II': 'B', 'III': 'B', 'IV': 'B', 'V': 'C'}),
-    (9, 15,    {'I': 'B', 'II': 'B', 'III': 'B', 'IV': 'B', 'V': 'D'}),
-    (16, 25,   {'I': 'B', 'II': 'B', 'III': 'B', 'IV': 'C', 'V': 'E'}),
-    (26, 40,   {'I': 'B', 'II': 'B', 'III': 'B', 'IV': 'D', 'V': 'F'}),
-    (41, 65,   {'I': 'B', 'II': 'B', 'III': 'C', 'IV': 'E', 'V': 'G'}),
-    (66, 110,  {'I': 'B', 'II': 'B', 'III': 'D', 'IV': 'F', 'V': 'H'}),
-    (111, 180, {'I': 'B', 'II': 'C', 'III': 'E', 'IV': 'G', 'V': 'I'}),
-    (181, 300, {'I': 'B', 'II': 'D', 'III': 'F', 'IV': 'H', 'V': 'J'}),
-    (301, 500, {'I': 'C', 'II': 'E', 'III': 'G', 'IV': 'I', 'V': 'K'}),
-    (501, 800, {'I': 'D', 'II': 'F', 'III': 'H', 'IV': 'J', 'V': 'L'}),
-    (801, 1300,{'I': 'E', 'II': 'G', 'III': 'I', 'IV': 'K', 'V': 'L'}),
-    (1301, 3200,{'I': 'F', 'II': 'H', 'III': 'J', 'IV': 'L', 'V': 'M'}),
-    (3201, 8000,{'I': 'G', 'II': 'I', 'III': 'L', 'IV': 'M', 'V': 'N'}),
-    (8001, 22000,{'I': 'H', 'II': 'J', 'III': 'M', 'IV': 'N', 'V': 'O'}),
-    (22001, 110000,{'I': 'I', 'II': 'K', 'III': 'N', 'IV': 'O', 'V': 'P'}),
-    (110001, 550000,{'I': 'I', 'II': 'K', 'III': 'O', 'IV': 'P', 'V': 'Q'}),
-    (550001, float('inf'),{'I': 'I', 'II': 'K', 'III': 'P', 'IV': 'Q', 'V': 'Q'}),
-]
-
-AQL_KEYS = ["0.04", "0.065", "0.1", "0.15", "0.25", "0.4", "0.65", "1",
-            "1.5", "2.5", "4", "6.5", "10", "15"]
-
-TABLA_K = {
-    "B": {"muestra": 3, "0.04": None, "0.065": None, "0.1": None, "0.15": None,
-          "0.25": None, "0.4": None, "0.65": None, "1": None, "1.5": None,
-          "2.5": 7.59, "4": 18.86, "6.5": 26.94, "10": 33.69, "15": 40.47},
-    "C": {"muestra": 4, "0.04": None, "0.065": None, "0.1": None, "0.15": None,
-          "0.25": None, "0.4": None, "0.65": None, "1": 1.53, "1.5": 5.5,
-          "2.5": 10.92, "4": 16.45, "6.5": 22.86, "10": 29.45, "15": 36.9},
-    "D": {"muestra": 5, "0.04": None, "0.065": None, "0.1": None, "0.15": None,
-          "0.25": None, "0.4": None, "0.65": None, "1": 1.33, "1.5": 5.83,
-          "2.5": 9.8, "4": 14.39, "6.5": 20.19, "10": 26.56, "15": 33.99},
-    "E": {"muestra": 7, "0.04": None, "0.065": None, "0.1": None, "0.15": None,
-          "0.25": 0.422, "0.4": 1.06, "0.65": 2.14, "1": 3.55, "1.5": 5.35,
-          "2.5": 8.4, "4": 12.2, "6.5": 17.35, "10": 23.29, "15": 30.5},
-    "F": {"muestra": 10, "0.04": None, "0.065": None, "0.1": None,
-          "0.15": 0.349, "0.25": 0.716, "0.4": 1.3, "0.65": 2.17, "1": 3.26,
-          "1.5": 4.77, "2.5": 7.29, "4": 10.54, "6.5": 15.17, "10": 20.74, "15": 27.57},
-    "G": {"muestra": 15, "0.04": 0.099, "0.065": 0.099, "0.1": 0.312,
-          "0.15": 0.503, "0.25": 0.818, "0.4": 1.31, "0.65": 2.11, "1": 3.05,
-          "1.5": 4.31, "2.5": 6.56, "4": 9.46, "6.5": 13.71, "10": 18.94, "15": 25.61},
-    "H": {"muestra": 20, "0.04": 0.135, "0.065": 0.135, "0.1": 0.365,
-          "0.15": 0.544, "0.25": 0.846, "0.4": 1.29, "0.65": 2.05, "1": 2.95,
-          "1.5": 4.09, "2.5": 6.17, "4": 8.92, "6.5": 12.99, "10": 18.03, "15": 24.53},
-    "I": {"muestra": 25, "0.04": 0.155, "0.065": 0.156, "0.1": 0.38,
-          "0.15": 0.551, "0.25": 0.877, "0.4": 1.29, "0.65": 2, "1": 2.86,
-          "1.5": 3.97, "2.5": 5.97, "4": 8.63, "6.5": 12.57, "10": 17.51, "15": 23.97},
-    "J": {"muestra": 30, "0.04": 0.179, "0.065": 0.179, "0.1": 0.413,
-          "0.15": 0.581, "0.25": 0.879, "0.4": 1.29, "0.65": 1.98, "1": 2.83,
-          "1.5": 3.91, "2.5": 5.86, "4": 8.47, "6.5": 12.36, "10": 17.24, "15": 23.58},
-    "K": {"muestra": 35, "0.04": 0.17, "0.065": 0.17, "0.1": 0.388,
-          "0.15": 0.535, "0.25": 0.847, "0.4": 1.23, "0.65": 1.87, "1": 2.68,
-          "1.5": 3.7, "2.5": 5.57, "4": 8.1, "6.5": 11.87, "10": 16.65, "15": 22.91},
-    "L": {"muestra": 40, "0.04": 0.179, "0.065": 0.179, "0.1": 0.401,
-          "0.15": 0.566, "0.25": 0.873, "0.4": 1.26, "0.65": 1.88, "1": 2.71,
-          "1.5": 3.72, "2.5": 5.58, "4": 8.09, "6.5": 11.85, "10": 16.61, "15": 22.86},
-    "M": {"muestra": 50, "0.04": 0.163, "0.065": 0.163, "0.1": 0.363,
-          "0.15": 0.503, "0.25": 0.789, "0.4": 1.17, "0.65": 1.71, "1": 2.49,
-          "1.5": 3.45, "2.5": 5.2, "4": 7.61, "6.5": 11.23, "10": 15.87, "15": 22},
-    "N": {"muestra": 75, "0.04": 1.147, "0.065": 0.147, "0.1": 0.33,
-          "0.15": 0.467, "0.25": 0.72, "0.4": 1.07, "0.65": 1.6, "1": 2.29,
-          "1.5": 3.2, "2.5": 4.87, "4": 7.15, "6.5": 10.63, "10": 15.13, "15": 21.11},
-    "O": {"muestra": 100, "0.04": 0.145, "0.065": 0.145, "0.1": 0.317,
-          "0.15": 0.447, "0.25": 0.689, "0.4": 1.02, "0.65": 1.53, "1": 2.2,
-          "1.5": 3.07, "2.5": 4.69, "4": 6.91, "6.5": 10.32, "10": 14.75, "15": 20.66},
-    "P": {"muestra": 150, "0.04": 0.134, "0.065": 0.134, "0.1": 0.293,
-          "0.15": 0.413, "0.25": 0.638, "0.4": 0.949, "0.65": 1.43, "1": 2.05,
-          "1.5": 2.89, "2.5": 4.43, "4": 6.57, "6.5": 9.88, "10": 14.2, "15": 20.02},
-    "Q": {"muestra": 200, "0.04": 0.135, "0.065": 0.135, "0.1": 0.294,
-          "0.15": 0.414, "0.25": 0.637, "0.4": 0.945, "0.65": 1.42, "1": 2.04,
-          "1.5": 2.87, "2.5": 4.4, "4": 6.53, "6.5": 9.81, "10": 14.12, "15": 19.92}
-}
-
-# ============================================================
-# FUNCIONES UTILITARIAS
-# ============================================================
-def normal_cdf(z: float) -> float:
-    """Función de distribución acumulada de N(0,1)"""
-    return 0.5 * (1 + math.erf(z / math.sqrt(2)))
-
-def obtener_letra_muestreo(nivel, tam_lote):
-    """Obtiene la letra del plan según nivel y tamaño de lote"""
-    for minimo, maximo, letras in RANGOS_LOTE:
-        if minimo <= tam_lote <= maximo:
-            return letras[nivel]
-    return None
-
-def generar_pesos_aleatorios(n, nominal, lim_inf, lim_sup):
-    """Genera pesos aleatorios con distribución normal"""
-    if lim_sup > lim_inf:
-        sigma = (lim_sup - lim_inf) / 6.0
-    else:
-        sigma = max(0.1, abs(nominal) * 0.01)
-    
-    pesos = []
-    for _ in range(n):
-        valor = random.gauss(nominal, sigma)
-        # Asegurarnos de que el valor sea razonable
-        valor = max(nominal - 3*sigma, min(nominal + 3*sigma, valor))
-        pesos.append(round(valor, 2))
-    
-    return pesos
-
-def crear_grafico_matplotlib(pesos, nominal, lim_inf, lim_sup, media, desviacion):
-    """Crea un gráfico de calidad profesional con Matplotlib"""
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
-    
-    # Gráfico 1: Distribución de puntos
-    n = len(pesos)
-    x_positions = np.arange(1, n + 1)
-    
-    # Colores según posición relativa a límites
-    colors = []
-    for peso in pesos:
-        if peso < lim_inf:
-            colors.append(COLORES['danger'])
-        elif peso > lim_sup:
-            colors.append(COLORES['warning'])
-        else:
-            colors.append(COLORES['success'])
-    
-    ax1.scatter(x_positions, pesos, c=colors, s=100, edgecolors='black', alpha=0.7)
-    
-    # Líneas de referencia
-    ax1.axhline(y=nominal, color=COLORES['accent1'], linestyle='--', linewidth=2, label='Nominal')
-    ax1.axhline(y=lim_inf, color=COLORES['danger'], linestyle='-', linewidth=1.5, label='Lím. Inferior')
-    ax1.axhline(y=lim_sup, color=COLORES['danger'], linestyle='-', linewidth=1.5, label='Lím. Superior')
-    ax1.axhline(y=media, color=COLORES['primary'], linestyle='-', linewidth=2, label='Media')
-    
-    # Área de especificación
-    ax1.fill_between([0, n+1], lim_inf, lim_sup, alpha=0.1, color=COLORES['accent1'])
-    
-    # Configuración del gráfico 1
-    ax1.set_title('Distribución de Pesos de la Muestra', fontsize=14, fontweight='bold', pad=15)
-    ax1.set_xlabel('Número de Muestra', fontsize=12)
-    ax1.set_ylabel('Peso', fontsize=12)
-    ax1.set_xticks(x_positions)
-    ax1.set_xlim(0.5, n + 0.5)
-    ax1.grid(True, alpha=0.3)
-    ax1.legend(loc='upper right')
-    
-    # Añadir etiquetas de valores
-    for i, peso in enumerate(pesos, 1):
-        ax1.annotate(f'{peso:.2f}', (i, peso), textcoords="offset points", 
-                    xytext=(0,10), ha='center', fontsize=9, fontweight='bold')
-    
-    # Gráfico 2: Histograma y distribución normal
-    if n > 1 and desviacion > 0:
-        # Histograma
-        ax2.hist(pesos, bins=min(10, n), alpha=0.7, color=COLORES['accent1'], 
-                edgecolor='black', density=True, label='Distribución Muestral')
-        
-        # Curva normal teórica
-        x_min = min(pesos) - desviacion
-        x_max = max(pesos) + desviacion
-        x = np.linspace(x_min, x_max, 100)
-        y = (1/(desviacion * np.sqrt(2 * np.pi))) * np.exp(-0.5 * ((x - media)/desviacion)**2)
-        ax2.plot(x, y, color=COLORES['primary'], linewidth=2, label='Distribución Normal')
-        
-        # Líneas de límites en histograma
-        ax2.axvline(x=lim_inf, color=COLORES['danger'], linestyle='--', linewidth=2, label='Límites')
-        ax2.axvline(x=lim_sup, color=COLORES['danger'], linestyle='--', linewidth=2)
-        ax2.axvline(x=nominal, color=COLORES['accent1'], linestyle='-', linewidth=2, label='Nominal')
-        
-        ax2.set_title('Distribución de Frecuencias', fontsize=14, fontweight='bold', pad=15)
-        ax2.set_xlabel('Peso', fontsize=12)
-        ax2.set_ylabel('Densidad', fontsize=12)
-        ax2.legend()
-        ax2.grid(True, alpha=0.3)
-    else:
-        ax2.text(0.5, 0.5, 'No hay suficientes datos\npara el histograma', 
-                ha='center', va='center', transform=ax2.transAxes, fontsize=12)
-        ax2.set_title('Distribución de Frecuencias', fontsize=14, fontweight='bold', pad=15)
-    
-    plt.tight_layout()
-    return fig
-
 # ============================================================
 # INICIALIZACIÓN DEL ESTADO
 # ============================================================
@@ -261,29 +119,106 @@ def inicializar_estado():
     if 'k' not in st.session_state:
         st.session_state.k = None
     if 'pesos' not in st.session_state:
-        st.session_state.pesos = []
-    if 'pesos_input' not in st.session_state:
-        st.session_state.pesos_input = {}
+        st.session_state.pesos = np.zeros(0)
+    if 'version_pesos' not in st.session_state:
+        st.session_state.version_pesos = 0
     if 'analisis_realizado' not in st.session_state:
         st.session_state.analisis_realizado = False
     if 'resultados' not in st.session_state:
         st.session_state.resultados = None
+    if 'metodo' not in st.session_state:
+        st.session_state.metodo = METODO_NORMAL
+    # Valores de los widgets de plan y especificación (el catálogo los reemplaza)
+    for clave, valor in (('nivel_plan', list(NIVELES)[1]), ('tam_lote_plan', 1000),
+                         ('aql_plan', "1"), ('nominal', 100.0), ('lim_inf', 98.0),
+                         ('lim_sup', 102.0), ('sku_catalogo', SIN_CATALOGO)):
+        if clave not in st.session_state:
+            st.session_state[clave] = valor
+
+def cargar_muestra(pesos):
+    """Reemplaza la muestra de la sesión; el editor se recrea con los nuevos valores"""
+    st.session_state.pesos = np.array(pesos, dtype=float)
+    st.session_state.version_pesos += 1
+    st.session_state.analisis_realizado = False
+    st.session_state.resultados = None
+
+def hay_pesos_ingresados():
+    pesos = st.session_state.pesos
+    return pesos.size > 0 and bool(np.any(pesos != 0))
 
 # ============================================================
 # COMPONENTES PRINCIPALES
 # ============================================================
+def aplicar_plan(plan, inspeccion, nivel, tam_lote):
+    """Deja el plan en la sesión y reinicia la muestra"""
+    st.session_state.plan_calculado = True
+    st.session_state.n = plan.n
+    st.session_state.k = plan.k
+    st.session_state.letra = plan.letra
+    st.session_state.aql = plan.aql
+    st.session_state.nivel = nivel
+    st.session_state.tam_lote = tam_lote
+    st.session_state.inspeccion = inspeccion
+    
+    # Reiniciar pesos
+    cargar_muestra(np.zeros(plan.n))
+    if st.session_state.get('servicio_balanzas') is not None:
+        st.session_state.servicio_balanzas.muestra.reiniciar(plan.n)
+
+def plan_del_producto(producto, nivel, tam_lote, aql):
+    """(inspección, plan); desde la caché del catálogo si el producto está registrado"""
+    motor = obtener_conmutacion()
+    especificacion = obtener_catalogo().especificacion(producto)
+    if especificacion is None or (especificacion.nivel, especificacion.aql) != (nivel, aql):
+        return motor.plan_siguiente(producto, nivel, tam_lote, aql)
+    inspeccion = motor.inspeccion(producto)
+    return inspeccion, obtener_catalogo().plan(producto, tam_lote, inspeccion)
+
+def al_elegir_producto():
+    """Carga la especificación del SKU y su plan para el tamaño de lote actual"""
+    sku = st.session_state.sku_catalogo
+    especificacion = obtener_catalogo().especificacion(sku)
+    if especificacion is None:
+        return
+    st.session_state.producto = especificacion.sku
+    st.session_state.nominal = especificacion.nominal
+    st.session_state.lim_inf = especificacion.lim_inf
+    st.session_state.lim_sup = especificacion.lim_sup
+    st.session_state.nivel_plan = especificacion.nivel
+    st.session_state.aql_plan = especificacion.aql
+    
+    tam_lote = st.session_state.tam_lote_plan
+    inspeccion, plan = plan_del_producto(sku, especificacion.nivel, tam_lote, especificacion.aql)
+    if plan is None:
+        st.session_state.plan_calculado = False
+    else:
+        aplicar_plan(plan, inspeccion, especificacion.nivel, tam_lote)
+
 def mostrar_panel_configuracion():
     """Muestra el panel de configuración del plan"""
     st.markdown("### ⚙️ Configuración del Plan de Muestreo")
     
+    catalogo = obtener_catalogo()
+    if len(catalogo):
+        st.selectbox(
+            "Producto del catálogo",
+            [SIN_CATALOGO] + catalogo.skus(),
+            format_func=lambda sku: ("Ingreso manual" if sku == SIN_CATALOGO else
+                                     f"{sku} · {catalogo.especificacion(sku).descripcion}"
+                                     .rstrip(' ·')),
+            key="sku_catalogo",
+            on_change=al_elegir_producto,
+            help="Carga especificación, nivel y NCA del SKU y calcula su plan"
+        )
+    
     with st.container():
         col1, col2, col3 = st.columns(3)
         
         with col1:
             nivel = st.selectbox(
                 "Nivel de Inspección",
-                ["I", "II", "III", "IV", "V"],
-                index=1,
+                list(NIVELES),
+                key="nivel_plan",
                 help="Nivel de rigurosidad de la inspección"
             )
         
@@ -291,8 +226,8 @@ def mostrar_panel_configuracion():
             tam_lote = st.number_input(
                 "Tamaño del Lote",
                 min_value=3,
-                value=1000,
                 step=1,
+                key="tam_lote_plan",
                 help="Cantidad total de unidades en el lote"
             )
         
@@ -300,45 +235,50 @@ def mostrar_panel_configuracion():
             aql = st.selectbox(
                 "NCA (AQL)",
                 AQL_KEYS,
-                index=AQL_KEYS.index("1"),
+                key="aql_plan",
                 help="Nivel de Calidad Aceptable"
             )
     
+    # Tipo de inspección según el historial del producto
+    motor = obtener_conmutacion()
+    producto = st.session_state.get('producto', '')
+    inspeccion = motor.inspeccion(producto)
+    st.caption(f"Inspección actual para «{producto or 'sin producto'}»: "
+               f"{ETIQUETAS_INSPECCION[inspeccion]}")
+    if inspeccion == INSPECCION_SUSPENDIDA:
+        st.warning("⛔ Inspección suspendida: 5 lotes rechazados en inspección rigurosa. "
+                   "Reanude tras la acción correctiva.")
+        if st.button("Reanudar en inspección rigurosa"):
+            motor.reanudar(producto, obtener_historial())
+            st.rerun()
+
     # Botón para calcular plan
     if st.button("📊 Calcular Plan de Muestreo", type="primary", use_container_width=True):
         with st.spinner("Calculando plan de muestreo..."):
-            letra = obtener_letra_muestreo(nivel, tam_lote)
-            if letra is None:
+            inspeccion, plan = plan_del_producto(producto, nivel, tam_lote, aql)
+            if inspeccion == INSPECCION_SUSPENDIDA:
+                st.error("❌ La inspección de este producto está suspendida.")
+            elif plan is None and inspeccion == INSPECCION_RIGUROSA:
+                st.error("❌ No hay plan de inspección rigurosa para esa NCA y tamaño de lote.")
+            elif plan is None:
                 st.error("❌ No se encontró un rango de lote para esos datos.")
             else:
-                fila = TABLA_K.get(letra)
-                if fila is None:
-                    st.error(f"❌ Letra {letra} no está definida en la tabla.")
-                else:
-                    n = fila["muestra"]
-                    k = fila.get(aql)
-                    
-                    st.session_state.plan_calculado = True
-                    st.session_state.n = n
-                    st.session_state.k = k
-                    
-                    # Reiniciar pesos
-                    st.session_state.pesos = [0.0] * n
-                    st.session_state.pesos_input = {f"peso_{i}": 0.0 for i in range(n)}
-                    st.session_state.analisis_realizado = False
-                    st.session_state.resultados = None
-                    
-                    st.success(f"✅ Plan calculado exitosamente!")
-                    
-                    # Mostrar resumen
-                    st.markdown(f"""
-                    **Resumen del Plan:**
-                    - **Letra del plan:** {letra}
-                    - **Tamaño de muestra (n):** {n}
-                    - **Valor M (k):** {k if k is not None else "No disponible"}
-                    - **NCA (AQL):** {aql}%
-                    - **Nivel de inspección:** {nivel}
-                    """)
+                n = plan.n
+                k = plan.k
+                aplicar_plan(plan, inspeccion, nivel, tam_lote)
+                
+                st.success(f"✅ Plan calculado exitosamente!")
+                
+                # Mostrar resumen
+                st.markdown(f"""
+                **Resumen del Plan:**
+                - **Letra del plan:** {plan.letra}
+                - **Tamaño de muestra (n):** {n}
+                - **Valor M (k):** {k if k is not None else "No disponible"}
+                - **NCA (AQL):** {plan.aql}%
+                - **Nivel de inspección:** {nivel}
+                - **Tipo de inspección:** {ETIQUETAS_INSPECCION[inspeccion]}
+                """)
 
 def mostrar_panel_especificaciones():
     """Muestra el panel de especificaciones técnicas"""
@@ -350,7 +290,7 @@ def mostrar_panel_especificaciones():
         with col1:
             nominal = st.number_input(
                 "Peso Nominal",
-                value=100.0,
+                key="nominal",
                 step=0.01,
                 format="%.2f",
                 help="Peso objetivo del ovillo"
@@ -359,7 +299,7 @@ def mostrar_panel_especificaciones():
         with col2:
             lim_inf = st.number_input(
                 "Límite Inferior",
-                value=98.0,
+                key="lim_inf",
                 step=0.01,
                 format="%.2f",
                 help="Peso mínimo aceptable"
@@ -368,11 +308,36 @@ def mostrar_panel_especificaciones():
         with col3:
             lim_sup = st.number_input(
                 "Límite Superior",
-                value=102.0,
+                key="lim_sup",
                 step=0.01,
                 format="%.2f",
                 help="Peso máximo aceptable"
             )
+        
+        col4, col5, col6 = st.columns(3)
+        
+        with col4:
+            st.text_input(
+                "Producto",
+                key="producto",
+                help="Código del producto o SKU, para el historial de lotes"
+            )
+        
+        with col5:
+            st.text_input(
+                "Estación",
+                key="estacion",
+                help="Estación o balanza de pesado"
+            )
+        
+        with col6:
+            st.selectbox(
+                "Estimador del % defectuoso",
+                [METODO_NORMAL, METODO_FORMA2],
+                format_func=ETIQUETAS_METODO.get,
+                key="metodo",
+                help="Forma 2: estimador insesgado de MIL-STD-414 basado en la distribución beta"
+            )
     
     return nominal, lim_inf, lim_sup
 
@@ -387,47 +352,11 @@ def mostrar_panel_pesos(nominal, lim_inf, lim_sup):
     st.markdown(f"### ⚖️ Registro de Pesos (n={n})")
     
     # Dividir en pestañas para diferentes métodos de entrada
-    tab1, tab2 = st.tabs(["📝 Entrada Manual", "🎲 Generación Automática"])
+    tab1, tab2, tab3, tab4 = st.tabs(
+        ["📝 Entrada Manual", "🎲 Generación Automática", "📡 Balanzas", "📁 Archivo"])
     
     with tab1:
-        # Entrada manual
-        st.markdown("Ingrese los pesos individualmente:")
-        
-        # Organizar en columnas dinámicas
-        num_cols = 4 if n > 8 else (3 if n > 4 else 2)
-        cols = st.columns(num_cols)
-        
-        pesos_manual = []
-        pesos_actualizados = False
-        
-        for i in range(n):
-            col_idx = i % num_cols
-            with cols[col_idx]:
-                key = f"peso_manual_{i}"
-                
-                # Obtener valor actual o usar 0.0
-                valor_actual = st.session_state.pesos[i] if i < len(st.session_state.pesos) else 0.0
-                
-                nuevo_valor = st.number_input(
-                    f"P{i+1}",
-                    key=key,
-                    value=float(valor_actual),
-                    step=0.01,
-                    format="%.2f",
-                    label_visibility="visible"
-                )
-                
-                pesos_manual.append(nuevo_valor)
-                
-                # Verificar si el valor cambió
-                if nuevo_valor != valor_actual:
-                    pesos_actualizados = True
-        
-        # Botón para guardar pesos manuales
-        if st.button("💾 Guardar Pesos Manuales", use_container_width=True):
-            st.session_state.pesos = pesos_manual
-            st.success(f"✅ {len(pesos_manual)} pesos guardados exitosamente")
-            st.rerun()
+        mostrar_editor_pesos(n)
     
     with tab2:
         # Generación automática
@@ -443,38 +372,45 @@ def mostrar_panel_pesos(nominal, lim_inf, lim_sup):
                 step=0.1,
                 help="Desviación estándar para la generación"
             )
+            escenario = st.selectbox(
+                "Escenario",
+                ESCENARIOS,
+                format_func=ETIQUETAS_ESCENARIO.get,
+                help="Fallas típicas del proceso para entrenar la lectura del análisis"
+            )
         
         with col2:
-            if st.button("🎯 Generar Pesos Aleatorios", use_container_width=True):
-                # CORRECCIÓN CRÍTICA: Generar y actualizar correctamente
-                nuevos_pesos = generar_pesos_aleatorios(n, nominal, lim_inf, lim_sup)
-                st.session_state.pesos = nuevos_pesos
-                
-                # Actualizar también los inputs individuales
-                for i in range(n):
-                    key = f"peso_manual_{i}"
-                    if key in st.session_state:
-                        st.session_state[key] = nuevos_pesos[i]
-                
-                st.success(f"✅ {n} pesos aleatorios generados exitosamente!")
-                
-                # Mostrar vista previa
-                df_preview = pd.DataFrame({
-                    'Muestra': range(1, n+1),
-                    'Peso (g)': nuevos_pesos,
-                    'Desviación': [f"{p - nominal:+.2f}" for p in nuevos_pesos]
-                })
-                
-                st.dataframe(
-                    df_preview,
-                    use_container_width=True,
-                    height=min(300, n * 35)
-                )
-                
-                st.rerun()
+            desplazamiento, separacion, proporcion = 0.0, 3.0, 0.5
+            if escenario == ESCENARIO_DESPLAZADO:
+                desplazamiento = st.slider("Desplazamiento de la media (σ)", -3.0, 3.0, 1.0, 0.25)
+            elif escenario == ESCENARIO_BIMODAL:
+                separacion = st.slider("Separación entre máquinas (σ)", 1.0, 6.0, 3.0, 0.5)
+                proporcion = st.slider("Pesos de la primera máquina", 0.05, 0.95, 0.5, 0.05)
+            semilla = st.number_input(
+                "Semilla",
+                min_value=0,
+                value=None,
+                step=1,
+                placeholder="Aleatoria",
+                help="Con la misma semilla se repiten exactamente los mismos pesos"
+            )
+        
+        if st.button("🎯 Generar Pesos Aleatorios", use_container_width=True):
+            cargar_muestra(generar_pesos_aleatorios(
+                n, nominal, lim_inf, lim_sup, semilla=semilla,
+                escenario=Escenario(escenario, sigma, desplazamiento, separacion, proporcion),
+            ))
+            st.rerun()
+    
+    with tab3:
+        mostrar_panel_balanzas(n, nominal, lim_inf, lim_sup)
+    
+    with tab4:
+        mostrar_panel_importacion(n, nominal, lim_inf, lim_sup)
     
     # Mostrar resumen de pesos actuales
-    if st.session_state.pesos and any(p != 0 for p in st.session_state.pesos):
+    if hay_pesos_ingresados():
+        pesos = st.session_state.pesos
         st.markdown("---")
         st.markdown("**📋 Resumen de Pesos Ingresados:**")
         
@@ -482,84 +418,65 @@ def mostrar_panel_pesos(nominal, lim_inf, lim_sup):
             'Estadístico': ['Cantidad', 'Mínimo', 'Máximo', 'Promedio', 'Rango'],
             'Valor': [
                 f"{n} muestras",
-                f"{min(st.session_state.pesos):.2f}",
-                f"{max(st.session_state.pesos):.2f}",
-                f"{np.mean(st.session_state.pesos):.2f}",
-                f"{max(st.session_state.pesos) - min(st.session_state.pesos):.2f}"
+                f"{pesos.min():.2f}",
+                f"{pesos.max():.2f}",
+                f"{pesos.mean():.2f}",
+                f"{np.ptp(pesos):.2f}"
             ]
         })
         
         st.table(df_resumen)
 
-def realizar_analisis(pesos, nominal, lim_inf, lim_sup, k):
-    """Realiza el análisis estadístico completo"""
-    n = len(pesos)
-    
-    # Verificar datos válidos
-    if n < 2:
-        return {
-            'error': True,
-            'mensaje': 'Se requieren al menos 2 pesos para el análisis'
-        }
-    
-    if all(p == 0 for p in pesos):
-        return {
-            'error': True,
-            'mensaje': 'Todos los pesos son cero. Ingrese valores válidos.'
-        }
-    
-    # Calcular estadísticas básicas
-    X_bar = np.mean(pesos)
-    S = np.std(pesos, ddof=1)
-    
-    if S == 0:
-        return {
-            'error': True,
-            'mensaje': 'La desviación estándar es cero (sin variación)'
-        }
-    
-    # Calcular índices Z
-    Z_ES = (lim_sup - X_bar) / S
-    Z_EI = (X_bar - lim_inf) / S
-    
-    # Calcular porcentajes fuera de especificación
-    pi = (1 - normal_cdf(Z_EI)) * 100
-    ps = (1 - normal_cdf(Z_ES)) * 100
-    p_total = pi + ps
-    
-    # Determinar decisión
-    if k is None:
-        decision = "Indeterminado (valor k no definido)"
-        color = COLORES['warning']
-        icono = "⚠️"
-    elif p_total <= k:
-        decision = f"ACEPTAR EL LOTE (p={p_total:.2f}% ≤ k={k})"
-        color = COLORES['success']
-        icono = "✅"
-    else:
-        decision = f"RECHAZAR EL LOTE (p={p_total:.2f}% > k={k})"
-        color = COLORES['danger']
-        icono = "❌"
-    
-    return {
-        'error': False,
-        'n': n,
-        'media': X_bar,
-        'desviacion': S,
-        'Z_ES': Z_ES,
-        'Z_EI': Z_EI,
-        'pi': pi,
-        'ps': ps,
-        'p_total': p_total,
-        'k': k,
-        'decision': decision,
-        'color': color,
-        'icono': icono
-    }
+def mostrar_editor_pesos(n):
+    """Tabla editable única respaldada por el arreglo `pesos` de la sesión.
+
+    Un solo widget en lugar de n number_input: cada rerun serializa una
+    tabla en vez de reconstruir cientos de widgets. Se puede pegar un
+    rango de celdas desde una planilla directamente en la tabla.
+    """
+    st.markdown("Ingrese o pegue los pesos en la tabla (Ctrl+V sobre la primera celda):")
+    version = st.session_state.version_pesos
+    if st.session_state.get('version_base_editor') != version:
+        st.session_state.base_editor = pd.DataFrame(
+            {'Peso (g)': st.session_state.pesos},
+            index=pd.RangeIndex(1, n + 1, name='Muestra'),
+        )
+        st.session_state.version_base_editor = version
+    
+    editado = st.data_editor(
+        st.session_state.base_editor,
+        key=f"editor_pesos_{version}",
+        num_rows="fixed",
+        height=min(38 + 35 * n, 420),
+        use_container_width=True,
+        column_config={
+            'Peso (g)': st.column_config.NumberColumn(min_value=0.0, step=0.01, format="%.2f"),
+        },
+    )
+    pesos = np.nan_to_num(editado['Peso (g)'].to_numpy(dtype=float), nan=0.0)
+    if not np.array_equal(pesos, st.session_state.pesos):
+        st.session_state.pesos = pesos
+        st.session_state.analisis_realizado = False
+        st.session_state.resultados = None
+    
+    with st.popover("📋 Pegar lista de pesos"):
+        texto = st.text_area("Un peso por línea o separados por espacios, ';' o tabulaciones",
+                             key="texto_pegado")
+        if st.button("Cargar lista", use_container_width=True):
+            try:
+                pegados = pesos_desde_texto(texto)
+            except ValueError as error:
+                st.error(f"❌ {error}")
+            else:
+                if len(pegados) != n:
+                    st.error(f"❌ Se leyeron {len(pegados)} pesos y el plan pide n={n}.")
+                else:
+                    cargar_muestra(pegados)
+                    st.rerun()
 
 def mostrar_panel_analisis(nominal, lim_inf, lim_sup):
     """Muestra el panel de análisis estadístico"""
-    if not st.session_state.pesos or all(p == 0 for p in st.session_state.pesos):
+    if not hay_pesos_ingresados():
         st.info("📝 Ingrese pesos en la pestaña anterior para realizar el análisis")
         return
     
@@ -567,17 +484,26 @@ def mostrar_panel_analisis(nominal, lim_inf, lim_sup):
     
     # Botón para realizar análisis
     if st.button("🔍 Realizar Análisis Completo", type="primary", use_container_width=True):
-        with st.spinner("Calculando estadísticas..."):
+        with st.spinner("Calculando estadísticas..."), fase('calculo'):
             resultados = realizar_analisis(
                 st.session_state.pesos,
                 nominal,
                 lim_inf,
                 lim_sup,
-                st.session_state.k
+                st.session_state.k,
+                metodo=st.session_state.metodo
             )
+            if not resultados['error']:
+                # Cribado aparte: la decisión no espera a las pruebas de normalidad
+                resultados.update(resumen_cribado(cribar_lotes(
+                    np.asarray(st.session_state.pesos, dtype=float))))
             
             st.session_state.resultados = resultados
             st.session_state.analisis_realizado = True
+            st.session_state.fecha_analisis = datetime.now()
+            
+            if not resultados['error']:
+                guardar_en_historial(resultados, nominal, lim_inf, lim_sup)
     
     # Mostrar resultados si están disponibles
     if st.session_state.analisis_realizado and st.session_state.resultados:
@@ -602,6 +528,10 @@ def mostrar_panel_analisis(nominal, lim_inf, lim_sup):
         </div>
         """, unsafe_allow_html=True)
         
+        # Cribado de normalidad y atípicos: advierte, no cambia la decisión
+        if resultados.get('aviso_normalidad'):
+            st.warning(f"⚠️ {resultados['aviso_normalidad']}")
+        
         # Métricas principales
         col1, col2, col3, col4 = st.columns(4)
         
@@ -648,7 +578,25 @@ def mostrar_panel_analisis(nominal, lim_inf, lim_sup):
         st.markdown("---")
         st.markdown("#### 📈 Visualización de Datos")
         
-        fig = crear_grafico_matplotlib(
+        tipo_grafico = st.radio(
+            "Tipo de gráfico",
+            ["Matplotlib", "Interactivo (Vega)"],
+            horizontal=True,
+            help="El gráfico interactivo se dibuja en el navegador y es más liviano en muestras grandes"
+        )
+        
+        with fase('grafico'):
+            mostrar_grafico(tipo_grafico, nominal, lim_inf, lim_sup, resultados)
+        
+        # Opciones de exportación
+        with fase('exportacion'):
+            mostrar_exportacion(resultados, nominal, lim_inf, lim_sup)
+
+def mostrar_grafico(tipo_grafico, nominal, lim_inf, lim_sup, resultados):
+    """Gráfico de la muestra en Matplotlib (PNG en caché) o Vega-Lite"""
+    if tipo_grafico == "Matplotlib":
+        # PNG en caché: si pesos, límites y estadísticas no cambian no se redibuja
+        png = renderizar_grafico(
             st.session_state.pesos,
             nominal,
             lim_inf,
@@ -657,88 +605,870 @@ def mostrar_panel_analisis(nominal, lim_inf, lim_sup):
             resultados['desviacion']
         )
         
-        st.pyplot(fig)
-        
-        # Opciones de exportación
-        st.markdown("---")
-        st.markdown("#### 💾 Exportar Resultados")
-        
-        col_exp1, col_exp2 = st.columns(2)
-        
-        with col_exp1:
-            # Exportar CSV de datos
-            df_datos = pd.DataFrame({
-                'Muestra': range(1, len(st.session_state.pesos) + 1),
-                'Peso': st.session_state.pesos,
-                'Desviacion_Media': [p - resultados['media'] for p in st.session_state.pesos]
-            })
-            
-            csv = df_datos.to_csv(index=False).encode('utf-8')
+        st.image(png, use_container_width=True)
+    else:
+        st.vega_lite_chart(
+            spec=especificacion_vega(
+                st.session_state.pesos,
+                nominal,
+                lim_inf,
+                lim_sup,
+                resultados['media']
+            ),
+            use_container_width=True
+        )
+
+BOTONES_EXPORTACION = (
+    (FORMATO_CSV_DATOS, "datos", "📥 Datos (CSV)"),
+    (FORMATO_CSV_RESUMEN, "resumen", "📥 Resumen (CSV)"),
+    (FORMATO_JSON, "analisis", "📥 Análisis (JSON)"),
+    (FORMATO_PARQUET, "datos", "📥 Datos (Parquet)"),
+)
+
+def mostrar_exportacion(resultados, nominal, lim_inf, lim_sup):
+    """Botones de descarga; cada archivo se genera solo al pulsar su botón.
+
+    Los datos se pasan como función (se ejecuta al descargar) y el
+    contenido queda en caché por hash, así que un rerun sin cambios no
+    arma ningún archivo. El nombre usa la hora del análisis para que el
+    botón no cambie en cada rerun.
+    """
+    st.markdown("---")
+    st.markdown("#### 💾 Exportar Resultados")
+    
+    pesos = st.session_state.pesos
+    fecha = st.session_state.get('fecha_analisis') or datetime.now()
+    contexto = {
+        'fecha': fecha.isoformat(timespec='seconds'),
+        'producto': st.session_state.get('producto', ''),
+        'estacion': st.session_state.get('estacion', ''),
+        'nivel': st.session_state.get('nivel'),
+        'tam_lote': st.session_state.get('tam_lote'),
+        'aql': st.session_state.get('aql'),
+        'letra': st.session_state.get('letra'),
+        'metodo': st.session_state.metodo,
+        'nominal': nominal,
+        'lim_inf': lim_inf,
+        'lim_sup': lim_sup,
+    }
+    
+    for columna, (formato, prefijo, etiqueta) in zip(st.columns(len(BOTONES_EXPORTACION)),
+                                                     BOTONES_EXPORTACION):
+        extension, mime = FORMATOS_EXPORTACION[formato]
+        with columna:
             st.download_button(
-                label="📥 Descargar Datos (CSV)",
-                data=csv,
-                file_name=f"datos_nawi_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
+                label=etiqueta,
+                data=partial(carga_exportacion, formato, pesos, resultados, contexto),
+                file_name=nombre_archivo(prefijo, extension, fecha),
+                mime=mime,
+                key=f"exportar_{formato}",
                 use_container_width=True
             )
-        
-        with col_exp2:
-            # Exportar resumen
-            df_resumen = pd.DataFrame({
-                'Parámetro': ['Decisión', 'p Total (%)', 'Valor k', 'Media', 'Desviación', 'Z Inferior', 'Z Superior'],
-                'Valor': [
-                    resultados['decision'],
-                    f"{resultados['p_total']:.3f}",
-                    f"{resultados['k'] if resultados['k'] else 'N/A'}",
-                    f"{resultados['media']:.3f}",
-                    f"{resultados['desviacion']:.3f}",
-                    f"{resultados['Z_EI']:.3f}",
-                    f"{resultados['Z_ES']:.3f}"
-                ]
-            })
-            
-            csv_resumen = df_resumen.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="📥 Descargar Resumen (CSV)",
-                data=csv_resumen,
-                file_name=f"resumen_nawi_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                use_container_width=True
+
+# ============================================================
+# IMPORTACIÓN DE ARCHIVOS
+# ============================================================
+@st.cache_data(max_entries=4, show_spinner=False)
+def leer_archivo_pesajes(contenido, nombre):
+    """Pesajes agrupados del archivo; se relee solo si cambia su contenido"""
+    return leer_pesajes(contenido, nombre)
+
+def mostrar_panel_importacion(n, nominal, lim_inf, lim_sup):
+    """Carga de un lote o de muchos lotes desde CSV, XLSX o Parquet"""
+    st.markdown("Una fila por pesaje con la columna `peso` y, opcionalmente, "
+                "`lote`, `producto` y `fecha`.")
+    archivo = st.file_uploader("Archivo de pesajes", type=["csv", "xlsx", "parquet"],
+                               key="archivo_pesajes")
+    if archivo is None:
+        return
+
+    try:
+        with st.spinner("Leyendo archivo..."):
+            pesajes = leer_archivo_pesajes(archivo.getvalue(), archivo.name)
+            resultados = evaluar_pesajes(pesajes, lim_inf, lim_sup, st.session_state.k,
+                                         metodo=st.session_state.metodo)
+    except ErrorImportacion as error:
+        st.error(f"❌ {error}")
+        return
+
+    st.caption(f"{pesajes.filas:,} filas · {len(pesajes.lotes):,} lote(s) · "
+               f"{pesajes.descartadas:,} filas descartadas (peso vacío o no positivo)")
+
+    if len(pesajes.lotes) == 1:
+        pesos = pesajes.pesos_lote(0)
+        if len(pesos) != n:
+            st.warning(f"⚠️ El archivo tiene {len(pesos)} pesos válidos y el plan pide n={n}.")
+        elif st.button("📥 Usar como muestra", use_container_width=True):
+            cargar_muestra(pesos)
+            st.rerun()
+        return
+
+    etiquetas = {DECISION_ACEPTAR: "ACEPTADO", DECISION_RECHAZAR: "RECHAZADO"}
+    tabla = pd.DataFrame({
+        'Lote': pesajes.lotes,
+        'Producto': pesajes.productos,
+        'n': pesajes.tamanos(),
+        'Media': resultados['media'],
+        'S': resultados['desviacion'],
+        'p_total (%)': resultados['p_total'],
+        'Decisión': [etiquetas.get(int(d), "INDETERMINADO") for d in resultados['decision']],
+    })
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Lotes", f"{len(tabla):,}")
+    col2.metric("Aceptados", f"{int(np.count_nonzero(resultados['decision'] == DECISION_ACEPTAR)):,}")
+    col3.metric("Rechazados", f"{int(np.count_nonzero(resultados['decision'] == DECISION_RECHAZAR)):,}")
+    distintos = int(np.count_nonzero(pesajes.tamanos() != n))
+    if distintos:
+        st.warning(f"⚠️ {distintos} lote(s) no tienen n={n} pesos válidos.")
+    st.dataframe(tabla, use_container_width=True, hide_index=True, height=300)
+
+    if st.button("🗂️ Guardar lotes en el historial", use_container_width=True):
+        if guardar_pesajes_en_historial(pesajes, resultados, nominal, lim_inf, lim_sup):
+            st.success(f"✅ {len(pesajes.lotes):,} lotes guardados en el historial")
+        else:
+            st.info("ℹ️ Estos lotes ya se guardaron en el historial.")
+
+def guardar_pesajes_en_historial(pesajes, resultados, nominal, lim_inf, lim_sup):
+    """Registra los lotes importados en una sola transacción; False si ya estaban guardados"""
+    producto_sesion = st.session_state.get('producto', '')
+    registros = []
+    for i, lote in enumerate(pesajes.lotes):
+        fecha = pesajes.fechas[i]
+        registros.append(RegistroLote(
+            producto=pesajes.productos[i] or producto_sesion,
+            estacion=st.session_state.get('estacion', ''),
+            pesos=pesajes.pesos_lote(i),
+            nominal=nominal,
+            lim_inf=lim_inf,
+            lim_sup=lim_sup,
+            nivel=st.session_state.get('nivel'),
+            tam_lote=st.session_state.get('tam_lote'),
+            aql=st.session_state.get('aql'),
+            letra=st.session_state.get('letra'),
+            k=st.session_state.k,
+            media=resultados['media'][i],
+            desviacion=resultados['desviacion'][i],
+            p_total=resultados['p_total'][i],
+            decision=int(resultados['decision'][i]),
+            fecha=None if np.isnat(fecha) else fecha.astype(datetime),
+        ))
+    # El historial y la conmutación ven los lotes en orden cronológico
+    registros.sort(key=lambda r: r.fecha or datetime.max)
+    if not registrar_una_vez(registros, huella('importacion', pesajes.pesos, pesajes.offsets)):
+        return False
+    # Solo los lotes recién guardados cuentan para las reglas de conmutación
+    motor = obtener_conmutacion()
+    for r in registros:
+        motor.registrar(r.producto, r.decision)
+    return True
+
+# ============================================================
+# HISTORIAL DE LOTES
+# ============================================================
+ETIQUETAS_INSPECCION = {
+    INSPECCION_NORMAL: "Normal",
+    INSPECCION_RIGUROSA: "Rigurosa",
+    INSPECCION_REDUCIDA: "Reducida",
+    INSPECCION_SUSPENDIDA: "Suspendida",
+}
+
+@st.cache_resource
+def obtener_historial():
+    """Historial compartido por todas las sesiones del servidor"""
+    return HistorialLotes()
+
+@st.cache_resource
+def obtener_archivo_pesajes():
+    """Archivo de auditoría de solo agregado con todos los pesajes guardados"""
+    return ArchivoPesajes()
+
+@st.cache_resource
+def obtener_conmutacion():
+    """Estados de conmutación reconstruidos una vez desde el historial"""
+    return MotorConmutacion.desde_historial(obtener_historial())
+
+def huella(*partes):
+    """Hash corto de los datos de un guardado (textos y arreglos)"""
+    h = hashlib.blake2b(digest_size=16)
+    for parte in partes:
+        if isinstance(parte, str):
+            h.update(parte.encode())
+        else:
+            h.update(np.ascontiguousarray(parte, dtype='<f8').tobytes())
+        h.update(b'|')
+    return h.hexdigest()
+
+def registrar_una_vez(registros, clave):
+    """Guarda los lotes en el historial y el archivo una sola vez por `clave`.
+
+    Volver a analizar la misma muestra (otro clic en el botón) no debe
+    duplicar el lote en el historial, el archivo ni los reportes.
+    """
+    guardados = st.session_state.setdefault('lotes_guardados', set())
+    if clave in guardados:
+        return False
+    obtener_historial().registrar(registros)
+    obtener_archivo_pesajes().sincronizar(obtener_historial())
+    guardados.add(clave)
+    return True
+
+def guardar_en_historial(resultados, nominal, lim_inf, lim_sup):
+    """Registra el lote analizado con su plan, especificación y pesos.
+
+    Se guarda una vez por versión de la muestra; devuelve False si ya estaba.
+    """
+    producto = st.session_state.get('producto', '')
+    pesos = np.asarray(st.session_state.pesos, dtype=float)
+    clave = huella('muestra', str(st.session_state.version_pesos), pesos)
+    guardado = registrar_una_vez([RegistroLote(
+        producto=producto,
+        estacion=st.session_state.get('estacion', ''),
+        pesos=pesos,
+        nominal=nominal,
+        lim_inf=lim_inf,
+        lim_sup=lim_sup,
+        nivel=st.session_state.get('nivel'),
+        tam_lote=st.session_state.get('tam_lote'),
+        aql=st.session_state.get('aql'),
+        letra=st.session_state.get('letra'),
+        k=resultados['k'],
+        media=resultados['media'],
+        desviacion=resultados['desviacion'],
+        p_total=resultados['p_total'],
+        decision=resultados['codigo_decision'],
+    )], clave)
+    if not guardado:
+        # Otro clic sobre el mismo lote no es otra decisión para la conmutación
+        st.caption("ℹ️ Esta muestra ya está en el historial; no se registra de nuevo.")
+        return False
+    nueva = obtener_conmutacion().registrar(producto, resultados['codigo_decision'])
+    if nueva is not None:
+        st.info(f"🔁 El próximo lote de «{producto or 'sin producto'}» pasa a inspección "
+                f"{ETIQUETAS_INSPECCION[nueva].lower()}. Recalcule el plan.")
+    return True
+
+@st.cache_resource
+def obtener_monitor_spc():
+    """Cartas X̄–S compartidas; cada rerun solo agrega los lotes nuevos"""
+    return MonitorSPC()
+
+def mostrar_panel_spc():
+    """Cartas X̄–S y capacidad móvil por producto y estación"""
+    monitor = obtener_monitor_spc()
+    monitor.actualizar(obtener_historial())
+    claves = monitor.claves()
+    if not claves:
+        st.info("Aún no hay lotes con al menos 2 pesos válidos en el historial.")
+        return
+
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        producto, estacion = st.selectbox(
+            "Producto / estación", claves,
+            format_func=lambda c: f"{c[0] or 'sin producto'} · {c[1] or 'sin estación'}",
+            key="spc_clave",
+        )
+    with col2:
+        ultimos = st.select_slider("Lotes mostrados", [50, 200, 1000, 5000, "Todos"],
+                                   value=200, key="spc_ultimos")
+
+    carta = monitor.carta(producto, estacion)
+    cp, cpk = carta.capacidad()
+    datos = carta.datos(None if ultimos == "Todos" else ultimos)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Lotes", len(carta))
+    col2.metric("σ̂ dentro de lotes", f"{carta.sigma:.4f}")
+    col3.metric(f"Cp (últimos {carta.ventana})", f"{cp:.2f}")
+    col4.metric(f"Cpk (últimos {carta.ventana})", f"{cpk:.2f}")
+    fuera = int(datos['fuera_control'].sum())
+    if fuera:
+        st.warning(f"⚠️ {fuera} lote(s) fuera de control en la vista.")
+
+    st.vega_lite_chart(especificacion_cartas(datos), use_container_width=True)
+    st.line_chart(pd.DataFrame({'Cp': datos['cp'], 'Cpk': datos['cpk']},
+                               index=pd.Index(datos['id'].astype(int), name='Lote')))
+
+def mostrar_panel_historial():
+    """Consulta paginada de los lotes registrados"""
+    historial = obtener_historial()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        productos = historial.productos()
+        producto = st.selectbox("Producto", ["Todos"] + productos, key="historial_producto")
+    with col2:
+        etiquetas_decision = {"Todas": None, "Aceptados": DECISION_ACEPTAR,
+                              "Rechazados": DECISION_RECHAZAR}
+        etiqueta = st.selectbox("Decisión", list(etiquetas_decision), key="historial_decision")
+    
+    filtros = {
+        'producto': None if producto == "Todos" else producto,
+        'decision': etiquetas_decision[etiqueta],
+    }
+    
+    # Pila de cursores: uno por página visitada
+    if st.session_state.get('historial_filtros') != filtros:
+        st.session_state.historial_filtros = filtros
+        st.session_state.historial_cursores = [None]
+    cursores = st.session_state.historial_cursores
+    
+    filas, siguiente = historial.consultar(despues_de=cursores[-1], **filtros)
+    if not filas:
+        st.info("📝 No hay lotes registrados con esos filtros")
+        return
+    
+    nombres_decision = {DECISION_ACEPTAR: "Aceptado", DECISION_RECHAZAR: "Rechazado",
+                        DECISION_INDETERMINADA: "Indeterminado"}
+    df_historial = pd.DataFrame(filas)
+    df_historial['decision'] = df_historial['decision'].map(nombres_decision)
+    st.dataframe(df_historial, use_container_width=True, hide_index=True)
+    
+    col_ant, col_pag, col_sig = st.columns([1, 2, 1])
+    with col_ant:
+        if st.button("⬅️ Anterior", disabled=len(cursores) == 1, use_container_width=True):
+            cursores.pop()
+            st.rerun()
+    with col_pag:
+        st.caption(f"Página {len(cursores)} · {historial.contar(**filtros)} lotes en total")
+    with col_sig:
+        if st.button("Siguiente ➡️", disabled=siguiente is None, use_container_width=True):
+            cursores.append(siguiente)
+            st.rerun()
+
+# ============================================================
+# HISTORIA DE PESAJES
+# ============================================================
+@st.cache_resource
+def obtener_historia_pesos():
+    """Pirámides de pesajes compartidas; cada rerun solo agrega los lotes nuevos"""
+    return HistoriaPesos()
+
+def _segundos_seleccion(valor):
+    # Vega entrega las fechas como milisegundos o como texto ISO
+    if isinstance(valor, (int, float)):
+        return valor / 1000
+    return pd.Timestamp(valor).timestamp()
+
+def al_acercar_historia(clave):
+    fechas = st.session_state[clave].selection.get('zoom', {}).get('Fecha')
+    if fechas:
+        st.session_state.historia_rango = tuple(_segundos_seleccion(f) for f in fechas)
+        st.session_state.historia_zoom = st.session_state.get('historia_zoom', 0) + 1
+
+def al_ver_toda_la_historia():
+    st.session_state.pop('historia_rango', None)
+    st.session_state.historia_zoom = st.session_state.get('historia_zoom', 0) + 1
+
+def mostrar_panel_historia():
+    """Todos los pesajes de un producto; el detalle aumenta al acercar"""
+    historia = obtener_historia_pesos()
+    historia.actualizar(obtener_historial())
+    productos = historia.productos()
+    if not productos:
+        st.info("Aún no hay pesajes registrados en el historial.")
+        return
+    
+    rango = st.session_state.get('historia_rango')
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        producto = st.selectbox("Producto", productos, key="historia_producto",
+                                format_func=lambda p: p or 'sin producto',
+                                on_change=al_ver_toda_la_historia)
+    with col2:
+        st.button("🔍 Ver todo", disabled=rango is None, use_container_width=True,
+                  on_click=al_ver_toda_la_historia)
+    
+    piramide = historia.piramide(producto)
+    ventana = piramide.ventana(*(rango or (None, None)))
+    # Clave nueva en cada acercamiento: el gráfico nuevo no hereda la selección anterior
+    clave = f"grafico_historia_{st.session_state.get('historia_zoom', 0)}"
+    st.vega_lite_chart(especificacion_historia(ventana, *piramide.limites), key=clave,
+                       on_select=partial(al_acercar_historia, clave), selection_mode="zoom",
+                       use_container_width=True)
+    
+    if ventana['nivel'] == 0:
+        detalle = "pesos individuales"
+        bajo = int(np.count_nonzero(ventana['estado'] < 0))
+        sobre = int(np.count_nonzero(ventana['estado'] > 0))
+    else:
+        detalle = f"mín–máx por bloques de {ventana['tamano_bloque']:,} pesos"
+        bajo, sobre = int(ventana['bajo'].sum()), int(ventana['sobre'].sum())
+    st.caption(f"{len(piramide):,} pesajes en {piramide.lotes:,} lotes · vista: {detalle} · "
+               f"{bajo} bajo y {sobre} sobre los límites · arrastre sobre el gráfico para acercar")
+
+# ============================================================
+# REPORTES DE LOTES
+# ============================================================
+TIPOS_REPORTE = {FORMATO_PDF: 'application/pdf',
+                 FORMATO_XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
+
+def leer_y_borrar(ruta):
+    """Contenido del reporte para la descarga; el archivo temporal se borra al leerlo"""
+    ruta = Path(ruta)
+    try:
+        return ruta.read_bytes()
+    finally:
+        ruta.unlink(missing_ok=True)
+
+def mostrar_panel_reportes():
+    """Reporte PDF/XLSX de muchos lotes, generado como trabajo en segundo plano"""
+    trabajo = obtener_pool_trabajos().obtener(st.session_state.get('trabajo_reporte'))
+    if trabajo is not None and trabajo.activo:
+        st.fragment(mostrar_progreso_trabajo, run_every=1.0)(trabajo.id)
+        return
+    
+    historial = obtener_historial()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        producto = st.selectbox("Producto", ["Todos"] + historial.productos(),
+                                key="reporte_producto")
+    with col2:
+        hoy = datetime.now().date()
+        periodo = st.date_input("Período", value=(hoy - timedelta(days=30), hoy),
+                                key="reporte_periodo")
+    with col3:
+        formato = st.radio("Formato", [FORMATO_PDF, FORMATO_XLSX], horizontal=True,
+                           format_func=str.upper, key="reporte_formato")
+    
+    if st.button("🧾 Generar reporte", use_container_width=True):
+        desde = hasta = None
+        if len(periodo) > 0:
+            desde = datetime.combine(periodo[0], datetime.min.time())
+            hasta = datetime.combine(periodo[-1] + timedelta(days=1), datetime.min.time())
+        ruta = Path(tempfile.gettempdir()) / nombre_archivo('reporte', formato)
+        trabajo = enviar_trabajo(
+            reporte_en_trabajo, historial.ruta, str(ruta), formato,
+            None if producto == "Todos" else producto, desde, hasta,
+            nombre=f"Reporte {formato.upper()}",
+        )
+        if trabajo is not None:
+            # El reporte anterior (descargado o no) queda reemplazado
+            anterior = st.session_state.get('ruta_reporte')
+            if anterior is not None and anterior != str(ruta):
+                Path(anterior).unlink(missing_ok=True)
+            st.session_state.ruta_reporte = str(ruta)
+            st.session_state.trabajo_reporte = trabajo.id
+            st.rerun()
+    
+    if trabajo is None:
+        return
+    if trabajo.estado == ESTADO_TERMINADO:
+        reporte = trabajo.resultado
+        if not Path(reporte['ruta']).exists():
+            st.caption("📥 Reporte descargado.")
+            return
+        # El archivo se lee solo al descargarlo, no en cada rerun
+        st.download_button(
+            f"📥 Descargar reporte ({reporte['total']} lotes, {reporte['segundos']:.0f} s)",
+            data=partial(leer_y_borrar, reporte['ruta']),
+            file_name=Path(reporte['ruta']).name,
+            mime=TIPOS_REPORTE[reporte['formato']],
+            use_container_width=True
+        )
+    elif trabajo.estado == ESTADO_CANCELADO:
+        st.info("Reporte cancelado.")
+    elif trabajo.estado == ESTADO_ERROR:
+        st.error(f"❌ No se pudo generar el reporte: {trabajo.error}")
+
+# ============================================================
+# CATÁLOGO DE PRODUCTOS
+# ============================================================
+SIN_CATALOGO = ""
+
+@st.cache_resource
+def obtener_catalogo():
+    """Catálogo de SKU compartido; los planes resueltos quedan en su caché"""
+    return CatalogoProductos(obtener_historial().ruta)
+
+def mostrar_panel_catalogo():
+    """Alta, edición y baja de productos del catálogo"""
+    catalogo = obtener_catalogo()
+    especificaciones = catalogo.especificaciones()
+    tabla = pd.DataFrame(
+        [e._asdict() for e in especificaciones],
+        columns=list(Especificacion._fields),
+    )
+    editado = st.data_editor(
+        tabla,
+        key="editor_catalogo",
+        num_rows="dynamic",
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'sku': st.column_config.TextColumn("SKU", required=True),
+            'nominal': st.column_config.NumberColumn("Nominal", format="%.2f", required=True),
+            'lim_inf': st.column_config.NumberColumn("Lím. inferior", format="%.2f",
+                                                     required=True),
+            'lim_sup': st.column_config.NumberColumn("Lím. superior", format="%.2f",
+                                                     required=True),
+            'nivel': st.column_config.SelectboxColumn("Nivel", options=list(NIVELES),
+                                                      default=list(NIVELES)[1], required=True),
+            'aql': st.column_config.SelectboxColumn("NCA", options=AQL_KEYS, default="1",
+                                                    required=True),
+            'descripcion': st.column_config.TextColumn("Descripción"),
+        },
+    )
+    
+    if st.button("💾 Guardar catálogo", use_container_width=True):
+        editado = editado.dropna(how='all')
+        try:
+            nuevas = catalogo.guardar(
+                Especificacion(**{c: (None if pd.isna(v) else v) for c, v in fila.items()})
+                for fila in editado.to_dict('records')
             )
+        except ErrorCatalogo as error:
+            st.error(f"❌ {error}")
+            return
+        eliminados = {e.sku for e in especificaciones} - {e.sku for e in nuevas}
+        catalogo.eliminar(eliminados)
+        if st.session_state.get('sku_catalogo') in eliminados:
+            st.session_state.sku_catalogo = SIN_CATALOGO
+        del st.session_state.editor_catalogo
+        st.toast(f"✅ Catálogo guardado: {len(nuevas)} producto(s)")
+        st.rerun()
+
+# ============================================================
+# CURVA CARACTERÍSTICA DE OPERACIÓN
+# ============================================================
+def mostrar_panel_oc():
+    """Muestra la curva OC (probabilidad de aceptación) del plan calculado"""
+    letra = st.session_state.get('letra')
+    if st.session_state.k is None or letra is None:
+        st.info("📝 El plan actual no tiene valor k: no hay curva OC que mostrar")
+        return
+    
+    st.markdown(f"### 📉 Curva OC · Letra {letra} · NCA {st.session_state.aql}%")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        simulaciones = st.select_slider(
+            "Muestras simuladas por punto",
+            options=[5_000, 20_000, 100_000, 500_000],
+            value=20_000,
+            help="Más muestras reducen el error de la estimación"
+        )
+    with col2:
+        fraccion_inferior = st.slider(
+            "Defectuosos bajo el límite inferior",
+            min_value=0.5,
+            max_value=0.95,
+            value=0.5,
+            step=0.05,
+            help="0.5 = proceso centrado; valores mayores = proceso desplazado hacia abajo"
+        )
+    
+    # El cálculo se lanza solo con el botón: un expander cerrado también ejecuta
+    # su cuerpo, y cada rerun (p. ej. cada edición de pesos) pasa por aquí
+    clave = ('curva_oc', letra, st.session_state.aql, simulaciones, fraccion_inferior,
+             st.session_state.metodo)
+    trabajo = obtener_pool_trabajos().obtener(st.session_state.get('trabajo_oc'))
+    if trabajo is not None and trabajo.clave != clave:
+        trabajo = None
+    if trabajo is not None and trabajo.activo:
+        st.fragment(mostrar_progreso_trabajo, run_every=0.5)(trabajo.id)
+        return
+    if trabajo is None or trabajo.estado != ESTADO_TERMINADO:
+        if trabajo is not None and trabajo.estado == ESTADO_CANCELADO:
+            st.info("Cálculo de la curva OC cancelado.")
+        elif trabajo is not None and trabajo.estado == ESTADO_ERROR:
+            st.error(f"❌ No se pudo calcular la curva OC: {trabajo.error}")
+        if not st.button("📉 Calcular curva OC", use_container_width=True):
+            return
+        # La misma curva pedida por otra sesión reutiliza el trabajo
+        trabajo = enviar_trabajo(
+            calcular_curva_oc, letra, st.session_state.aql, simulaciones=simulaciones,
+            fraccion_inferior=fraccion_inferior, estimador=st.session_state.metodo,
+            nombre=f"Curva OC {letra} · NCA {st.session_state.aql}", clave=clave,
+        )
+        if trabajo is None:
+            return
+        st.session_state.trabajo_oc = trabajo.id
+        if trabajo.activo:
+            st.fragment(mostrar_progreso_trabajo, run_every=0.5)(trabajo.id)
+            return
+        if trabajo.estado != ESTADO_TERMINADO:
+            st.rerun()
+    curva = trabajo.resultado
+    df_oc = pd.DataFrame({
+        'Porcentaje defectuoso (%)': curva.porcentaje_defectuoso,
+        'Probabilidad de aceptación': curva.prob_aceptacion,
+    })
+    st.line_chart(df_oc, x='Porcentaje defectuoso (%)', y='Probabilidad de aceptación')
+    st.caption(f"n={curva.n} · k={curva.k} · error estándar máximo "
+               f"{curva.error_estandar.max():.4f}")
+
+# ============================================================
+# LECTURA DESDE BALANZAS
+# ============================================================
+@st.cache_resource
+def obtener_bucle_balanzas():
+    """Un solo hilo asyncio para la ingesta de todas las sesiones"""
+    return BucleIngesta()
+
+def obtener_servicio_balanzas():
+    """Servicio de ingesta de la sesión; se crea al conectar, no al mostrar el panel"""
+    if st.session_state.get('servicio_balanzas') is None:
+        st.session_state.servicio_balanzas = ServicioIngesta(bucle=obtener_bucle_balanzas())
+    return st.session_state.servicio_balanzas
+
+def mostrar_panel_balanzas(n, nominal, lim_inf, lim_sup):
+    """Conecta balanzas por TCP o puerto serie y llena la muestra en tiempo real"""
+    st.markdown("Lea los pesos directamente desde una o varias balanzas:")
+    servicio = st.session_state.get('servicio_balanzas')
+    
+    conexiones = st.text_area(
+        "Balanzas (una por línea)",
+        placeholder="192.168.1.50:4001\nserial:/dev/ttyUSB0@9600",
+        help="TCP como host:puerto; puerto serie como serial:dispositivo@baudios"
+    )
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("🔌 Conectar", use_container_width=True):
+            servicio = obtener_servicio_balanzas()
+            for linea in conexiones.splitlines():
+                if not linea.strip():
+                    continue
+                try:
+                    servicio.conectar(parsear_balanza(linea))
+                except ValueError as exc:
+                    st.error(f"❌ {exc}")
+            servicio.muestra.reiniciar(n)
+    with col2:
+        if st.button("🧪 Usar Simulador", use_container_width=True,
+                     help="Balanza local con pesos aleatorios, sin hardware"):
+            servicio = obtener_servicio_balanzas()
+            servicio.iniciar_simulador(nominal, lim_inf, lim_sup)
+            servicio.muestra.reiniciar(n)
+    with col3:
+        if st.button("⏹️ Desconectar Todo", use_container_width=True,
+                     disabled=servicio is None):
+            servicio.cerrar()
+    
+    rango = None
+    if st.checkbox("Anticipar aceptación con el rango físico de la balanza",
+                   help="Si los pesos restantes caen siempre en este rango, se avisa "
+                        "cuando el lote ya no puede ser rechazado"):
+        amplitud = lim_sup - lim_inf
+        col_min, col_max = st.columns(2)
+        with col_min:
+            minimo = st.number_input("Peso mínimo posible", value=lim_inf - amplitud,
+                                     step=0.01, format="%.2f")
+        with col_max:
+            maximo = st.number_input("Peso máximo posible", value=lim_sup + amplitud,
+                                     step=0.01, format="%.2f")
+        rango = (minimo, maximo)
+    
+    if servicio is not None and servicio.estado:
+        if st.button("🔁 Nueva Muestra", use_container_width=True):
+            servicio.muestra.reiniciar(n)
+        st.fragment(mostrar_lectura_en_vivo, run_every=1.0)(lim_inf, lim_sup, rango)
+
+# Mensajes de la decisión provisional mientras se pesa
+MENSAJES_EN_VIVO = {
+    ESTADO_INSUFICIENTE: ("info", "⏳ Esperando al menos 2 pesos para estimar"),
+    ESTADO_INDETERMINADO: ("warning", "⚠️ Indeterminado (valor k no definido o sin variación)"),
+    ESTADO_PROVISIONAL_ACEPTAR: ("info", "🟢 Provisional: ACEPTAR"),
+    ESTADO_PROVISIONAL_RECHAZAR: ("info", "🔴 Provisional: RECHAZAR"),
+    ESTADO_SEGURO_ACEPTAR: ("success", "✅ El lote ya no puede ser rechazado"),
+    ESTADO_SEGURO_RECHAZAR: ("error", "❌ El lote ya no puede ser aceptado"),
+    ESTADO_ACEPTAR: ("success", "✅ Muestra completa: ACEPTAR"),
+    ESTADO_RECHAZAR: ("error", "❌ Muestra completa: RECHAZAR"),
+}
+
+def mostrar_lectura_en_vivo(lim_inf, lim_sup, rango):
+    """Progreso y decisión provisional; al completarse copia la muestra a la sesión"""
+    servicio = st.session_state.servicio_balanzas
+    muestra = servicio.muestra
+    
+    for nombre, estado in list(servicio.estado.items()):
+        st.caption(f"**{nombre}:** {estado}")
+    
+    cantidad = muestra.cantidad
+    st.progress(min(cantidad / muestra.n, 1.0) if muestra.n else 0.0,
+                text=f"{cantidad} de {muestra.n} pesos recibidos")
+    if cantidad:
+        st.markdown("Últimas lecturas: " + " · ".join(
+            f"{p:.2f}" for p in muestra.pesos(max(cantidad - 8, 0))))
+    
+    # Estadísticas incrementales: la clave cambia solo al reiniciar la muestra
+    # (o los parámetros), y entre reruns solo se agregan los pesos nuevos
+    clave = (muestra.generacion, lim_inf, lim_sup, st.session_state.k, rango,
+             st.session_state.metodo)
+    evaluacion = st.session_state.get('evaluacion_en_vivo')
+    if evaluacion is None or st.session_state.get('clave_evaluacion_en_vivo') != clave:
+        evaluacion = EvaluacionIncremental(muestra.n, lim_inf, lim_sup, st.session_state.k, rango,
+                                           st.session_state.metodo)
+        st.session_state.evaluacion_en_vivo = evaluacion
+        st.session_state.clave_evaluacion_en_vivo = clave
+    for peso in muestra.pesos(evaluacion.cantidad):
+        evaluacion.agregar(peso)
+    
+    tipo, mensaje = MENSAJES_EN_VIVO[evaluacion.estado()]
+    if evaluacion.cantidad >= 2:
+        mensaje += (f" · X̄={evaluacion.media:.3f} · S={evaluacion.desviacion:.3f}"
+                    f" · p={evaluacion.p_total:.2f}%")
+    getattr(st, tipo)(mensaje)
+    
+    if muestra.completa and st.session_state.get('version_balanzas') != muestra.version:
+        st.session_state.version_balanzas = muestra.version
+        cargar_muestra(muestra.pesos())
+        st.rerun()
+
+# ============================================================
+# TRABAJOS EN SEGUNDO PLANO
+# ============================================================
+ETIQUETAS_ESTADO_TRABAJO = {
+    ESTADO_TERMINADO: "✅",
+    ESTADO_CANCELADO: "⏹️",
+    ESTADO_ERROR: "❌",
+}
+
+@st.cache_resource
+def obtener_pool_trabajos():
+    """Procesos de cálculo compartidos por todas las sesiones del servidor"""
+    pool = PoolTrabajos(precargar=('nawi.oc', 'nawi.reportes'))
+    pool.calentar()
+    return pool
+
+def id_sesion():
+    """Identificador de la sesión: las colas del pool se reparten por sesión"""
+    if 'id_sesion' not in st.session_state:
+        st.session_state.id_sesion = uuid.uuid4().hex
+    return st.session_state.id_sesion
+
+def enviar_trabajo(funcion, *args, nombre, clave=None, **kwargs):
+    """Encola un trabajo de esta sesión; None (con aviso) si ya tiene demasiados"""
+    try:
+        return obtener_pool_trabajos().enviar(funcion, *args, nombre=nombre,
+                                              propietario=id_sesion(), clave=clave, **kwargs)
+    except LimiteTrabajos as error:
+        st.warning(f"⏳ {error}")
+        return None
+
+def mostrar_progreso_trabajo(id_trabajo):
+    """Se actualiza sola mientras el trabajo avanza; al terminar recarga la página"""
+    trabajo = obtener_pool_trabajos().obtener(id_trabajo)
+    if trabajo is None or not trabajo.activo:
+        st.rerun()
+    if trabajo.estado == ESTADO_EN_CURSO:
+        texto = f"{trabajo.nombre}: {trabajo.progreso:.0%} · {trabajo.segundos:.0f} s"
+    else:
+        texto = f"{trabajo.nombre}: en cola"
+    st.progress(trabajo.progreso, text=texto)
+    st.button("Cancelar", key=f"cancelar_{id_trabajo}", on_click=trabajo.cancelar)
+
+def mostrar_trabajos_sesion(refrescar=False):
+    """Trabajos de esta sesión en la barra lateral"""
+    trabajos = obtener_pool_trabajos().trabajos(id_sesion())
+    if refrescar and not any(t.activo for t in trabajos):
+        # Terminó el último: un rerun completo muestra los resultados y corta el refresco
+        st.rerun()
+    if not trabajos:
+        return
+    st.markdown("**⏳ Trabajos en segundo plano**")
+    for trabajo in trabajos[:5]:
+        if trabajo.activo:
+            st.progress(trabajo.progreso, text=trabajo.nombre)
+        else:
+            st.caption(f"{ETIQUETAS_ESTADO_TRABAJO[trabajo.estado]} {trabajo.nombre} · "
+                       f"{trabajo.segundos:.1f} s")
+
+# ============================================================
+# DIAGNÓSTICO DE RENDIMIENTO
+# ============================================================
+def al_cambiar_memoria_detallada():
+    if not st.session_state.diagnostico_memoria:
+        detener_memoria_detallada()
+
+def mostrar_diagnostico(perfil):
+    """Tiempo y memoria por fase del rerun actual, en la barra lateral"""
+    if not st.checkbox("🩺 Diagnóstico de rendimiento", key="diagnostico"):
+        return
+    st.checkbox(
+        "Memoria detallada (tracemalloc)",
+        key="diagnostico_memoria",
+        on_change=al_cambiar_memoria_detallada,
+        help="Registra el pico de memoria de Python por fase; hace más lento el servidor"
+    )
+    st.caption(f"Rerun: {perfil.duracion * 1000:.0f} ms · "
+               f"RSS {perfil.rss_final / 2**20:.0f} MB")
+    tabla = pd.DataFrame({
+        'Fase': [f['fase'] for f in perfil.fases],
+        'ms': [f['segundos'] * 1000 for f in perfil.fases],
+        'Δ RSS (MB)': [f['delta_rss'] / 2**20 for f in perfil.fases],
+        'Pico Python (MB)': [None if f['pico_python'] is None else f['pico_python'] / 2**20
+                             for f in perfil.fases],
+    })
+    st.dataframe(tabla, hide_index=True, use_container_width=True,
+                 column_config={c: st.column_config.NumberColumn(format="%.2f")
+                                for c in ('ms', 'Δ RSS (MB)', 'Pico Python (MB)')})
 
 # ============================================================
 # APLICACIÓN PRINCIPAL
 # ============================================================
 def main():
     """Función principal de la aplicación"""
+    # Perfil de tiempos y memoria de este rerun
+    perfil = iniciar_rerun(st.session_state.get('diagnostico_memoria', False))
+    
     # Inicializar estado
-    inicializar_estado()
+    with fase('estado'):
+        inicializar_estado()
     
     # Mostrar header
-    mostrar_header()
+    with fase('header'):
+        mostrar_header()
     
     # Panel de configuración
-    with st.expander("⚙️ CONFIGURACIÓN DEL PLAN", expanded=True):
+    with st.expander("⚙️ CONFIGURACIÓN DEL PLAN", expanded=True), fase('configuracion'):
         mostrar_panel_configuracion()
     
     st.markdown("---")
     
     # Panel de especificaciones técnicas
-    with st.expander("🎯 ESPECIFICACIONES TÉCNICAS", expanded=True):
+    with st.expander("🎯 ESPECIFICACIONES TÉCNICAS", expanded=True), fase('especificaciones'):
         nominal, lim_inf, lim_sup = mostrar_panel_especificaciones()
     
     st.markdown("---")
     
     # Panel de ingreso de datos
     if st.session_state.plan_calculado:
-        with st.expander(f"⚖️ REGISTRO DE PESOS (n={st.session_state.n})", expanded=True):
+        with st.expander(f"⚖️ REGISTRO DE PESOS (n={st.session_state.n})", expanded=True), \
+                fase('pesos'):
             mostrar_panel_pesos(nominal, lim_inf, lim_sup)
         
         st.markdown("---")
         
         # Panel de análisis
-        with st.expander("📈 ANÁLISIS ESTADÍSTICO", expanded=True):
+        with st.expander("📈 ANÁLISIS ESTADÍSTICO", expanded=True), fase('analisis'):
             mostrar_panel_analisis(nominal, lim_inf, lim_sup)
+        
+        # Curva OC del plan
+        with st.expander("📉 CURVA OC DEL PLAN", expanded=False), fase('curva_oc'):
+            mostrar_panel_oc()
+    
+    st.markdown("---")
+    
+    # Historial de lotes
+    with st.expander("🗂️ HISTORIAL DE LOTES", expanded=False), fase('historial'):
+        mostrar_panel_historial()
+    
+    # Todos los pesajes a lo largo del tiempo
+    with st.expander("📈 HISTORIA DE PESAJES", expanded=False), fase('historia'):
+        mostrar_panel_historia()
+    
+    # Reportes de muchos lotes
+    with st.expander("🧾 REPORTES DE LOTES", expanded=False), fase('reportes'):
+        mostrar_panel_reportes()
+    
+    # Control estadístico entre lotes
+    with st.expander("📊 CARTAS DE CONTROL Y CAPACIDAD", expanded=False), fase('spc'):
+        mostrar_panel_spc()
+    
+    # Productos y especificaciones registradas
+    with st.expander("📦 CATÁLOGO DE PRODUCTOS", expanded=False), fase('catalogo'):
+        mostrar_panel_catalogo()
     
     # Footer
     st.markdown("---")
@@ -753,10 +1483,20 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
+    terminar_rerun(perfil)
+    with st.sidebar:
+        if obtener_pool_trabajos().activos(id_sesion()):
+            st.fragment(mostrar_trabajos_sesion, run_every=1.0)(refrescar=True)
+        else:
+            mostrar_trabajos_sesion()
+        mostrar_diagnostico(perfil)
+    
     # Botón de reinicio en sidebar si existe
     try:
         with st.sidebar:
             if st.button("🔄 Reiniciar Aplicación", type="secondary", use_container_width=True):
+                if st.session_state.get('servicio_balanzas') is not None:
+                    st.session_state.servicio_balanzas.cerrar()
                 for key in list(st.session_state.keys()):
                     del st.session_state[key]
                 st.rerun()
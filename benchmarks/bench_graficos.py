@@ -0,0 +1,62 @@
+"""Tiempo de dibujo del gráfico de la muestra según el modo.
+
+Compara, para muestras de letras grandes, la ruta detallada (la original:
+una etiqueta por punto y una marca por muestra) con el modo rápido y con
+la especificación Vega-Lite. No usa la caché de imágenes.
+
+    python benchmarks/bench_graficos.py [--repeticiones 5]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from nawi.graficos import (  # noqa: E402
+    MODO_DETALLADO, MODO_RAPIDO, codificar_figura, crear_grafico_matplotlib,
+    especificacion_vega,
+)
+
+NOMINAL, LIM_INF, LIM_SUP = 100.0, 98.0, 102.0
+
+
+def medir(funcion, repeticiones):
+    """Mediana en milisegundos de `repeticiones` ejecuciones"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # Calentamiento: carga de fuentes y backends de Matplotlib
+    codificar_figura(crear_grafico_matplotlib([100.0, 101.0], NOMINAL, LIM_INF, LIM_SUP, 100.5, 0.7))
+
+    print(f"{'n':>5} {'detallado (ms)':>15} {'rápido (ms)':>12} {'vega (ms)':>10} {'mejora':>7}")
+    for n in (50, 150, 200):
+        pesos = [round(random.gauss(NOMINAL, 0.8), 2) for _ in range(n)]
+        media = statistics.fmean(pesos)
+        desviacion = statistics.stdev(pesos)
+
+        def dibujar(modo):
+            fig = crear_grafico_matplotlib(pesos, NOMINAL, LIM_INF, LIM_SUP, media, desviacion, modo)
+            return codificar_figura(fig)
+
+        detallado = medir(lambda: dibujar(MODO_DETALLADO), args.repeticiones)
+        rapido = medir(lambda: dibujar(MODO_RAPIDO), args.repeticiones)
+        vega = medir(lambda: especificacion_vega(pesos, NOMINAL, LIM_INF, LIM_SUP, media),
+                     args.repeticiones)
+        print(f"{n:>5} {detallado:>15.1f} {rapido:>12.1f} {vega:>10.2f} {detallado / rapido:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""Suite de rendimiento del núcleo de muestreo y de la página completa.
+
+Mide, para cada letra de plan B–Q, `obtener_letra_muestreo`,
+`buscar_plan`, `realizar_analisis` (normal y Forma 2),
+`generar_pesos_aleatorios` y `crear_grafico_matplotlib` (dibujo y
+codificación PNG), y una ejecución completa de app.py con AppTest
+(página inicial y flujo plan → pesos → análisis). Escribe los resultados
+en JSON y los compara con una línea base guardada: sale con código 1 si
+algún caso empeora más que la tolerancia, o si la evaluación por lotes
+deja de coincidir bit a bit con la evaluación de un lote.
+
+    python benchmarks/bench_suite.py                      # medir y comparar
+    python benchmarks/bench_suite.py --salida actual.json
+    python benchmarks/bench_suite.py --guardar-base       # actualizar la línea base
+    python benchmarks/bench_suite.py --filtro analisis --repeticiones 9
+
+La línea base depende de la máquina: se regenera con --guardar-base en
+la misma máquina (o tipo de runner) donde se hará la comparación.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+# La página guarda lotes en el historial: nunca en la base del repositorio
+os.environ.setdefault('NAWI_HISTORIAL', str(Path(tempfile.gettempdir()) / 'nawi_bench.db'))
+
+import numpy as np  # noqa: E402
+
+from nawi.analisis import (  # noqa: E402
+    METODO_FORMA2, METODO_NORMAL, evaluar_lotes, normal_cdf, realizar_analisis,
+)
+from nawi.planes import INDICE, buscar_plan, obtener_letra_muestreo  # noqa: E402
+from nawi.simulacion import generar_pesos_aleatorios  # noqa: E402
+
+LINEA_BASE = Path(__file__).resolve().parent / 'linea_base.json'
+NOMINAL, LIM_INF, LIM_SUP = 100.0, 98.0, 102.0
+# Cada muestra de tiempo repite la función hasta durar al menos esto
+DURACION_MINIMA_MS = 20.0
+TOLERANCIA = 0.5
+PISO_MS = 0.05
+
+
+def medir(funcion, repeticiones):
+    """Tiempo por llamada (ms): mediana y mínimo de `repeticiones` muestras"""
+    funcion()
+    bucles = 1
+    while True:
+        inicio = time.perf_counter()
+        for _ in range(bucles):
+            funcion()
+        duracion = (time.perf_counter() - inicio) * 1000
+        if duracion >= DURACION_MINIMA_MS or bucles >= 1_000_000:
+            break
+        bucles *= 10 if duracion < DURACION_MINIMA_MS / 10 else 2
+
+    tiempos = [duracion / bucles]
+    for _ in range(repeticiones - 1):
+        inicio = time.perf_counter()
+        for _ in range(bucles):
+            funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000 / bucles)
+    return {'mediana_ms': statistics.median(tiempos), 'minimo_ms': min(tiempos),
+            'repeticiones': repeticiones, 'bucles': bucles}
+
+
+def planes_por_letra():
+    """Para cada letra, un (nivel, tamaño de lote, NCA) que la produce"""
+    planes = {}
+    for j, nivel in enumerate(INDICE.niveles):
+        for i, tam_lote in enumerate(INDICE.limites_inf):
+            letra = INDICE.letras[INDICE.letra_por_rango[i, j]]
+            if letra in planes:
+                continue
+            fila = INDICE.letras.index(letra)
+            columnas = np.flatnonzero(~np.isnan(INDICE.matriz_k[fila]))
+            aql = '1' if '1' in [INDICE.aqls[c] for c in columnas] else INDICE.aqls[columnas[0]]
+            planes[letra] = (nivel, int(tam_lote), aql)
+    return dict(sorted(planes.items(), key=lambda e: INDICE.letras.index(e[0])))
+
+
+def casos_nucleo(graficos=True):
+    """(nombre, función) de los casos por letra"""
+    casos = []
+    rng = np.random.default_rng(0)
+    for letra, (nivel, tam_lote, aql) in planes_por_letra().items():
+        plan = buscar_plan(nivel, tam_lote, aql)
+        pesos = np.round(rng.normal(NOMINAL, 0.6, plan.n), 2)
+        media, desviacion = float(pesos.mean()), float(pesos.std(ddof=1))
+
+        casos.append((f'letra.{letra}', lambda nv=nivel, t=tam_lote: obtener_letra_muestreo(nv, t)))
+        casos.append((f'plan.{letra}', lambda nv=nivel, t=tam_lote, a=aql: buscar_plan(nv, t, a)))
+        for metodo in (METODO_NORMAL, METODO_FORMA2):
+            casos.append((f'analisis.{metodo}.{letra}',
+                          lambda p=pesos, k=plan.k, m=metodo:
+                          realizar_analisis(p, NOMINAL, LIM_INF, LIM_SUP, k, metodo=m)))
+        casos.append((f'generar_pesos.{letra}',
+                      lambda n=plan.n: generar_pesos_aleatorios(n, NOMINAL, LIM_INF, LIM_SUP)))
+        if graficos:
+            from nawi.graficos import codificar_figura, crear_grafico_matplotlib
+
+            casos.append((f'grafico.{letra}',
+                          lambda p=pesos, m=media, s=desviacion: codificar_figura(
+                              crear_grafico_matplotlib(p, NOMINAL, LIM_INF, LIM_SUP, m, s))))
+    return casos
+
+
+def casos_pagina():
+    """Ejecuciones completas de app.py con AppTest"""
+    from streamlit.testing.v1 import AppTest
+
+    ruta = str(RAIZ / 'app.py')
+
+    def pagina_inicial():
+        AppTest.from_file(ruta, default_timeout=300).run()
+
+    def flujo_analisis():
+        at = AppTest.from_file(ruta, default_timeout=300).run()
+        at.button[0].click().run()
+        n = at.session_state['n']
+        at.text_area(key='texto_pegado').set_value(
+            '\n'.join(f"{100 + 0.5 * np.sin(i):.2f}" for i in range(n)))
+        next(b for b in at.button if 'Cargar lista' in b.label).click().run()
+        next(b for b in at.button if 'Análisis' in b.label).click().run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    return [('pagina.inicial', pagina_inicial), ('pagina.analisis', flujo_analisis)]
+
+
+def verificar_equivalencia(lotes=2000, semilla=0):
+    """Campos de `evaluar_lotes` que no coinciden bit a bit con el cálculo escalar.
+
+    Compara cada lote (matriz densa y con offsets de tamaños variados)
+    contra `realizar_analisis` y p_total contra `normal_cdf` con math.erf.
+    """
+    rng = np.random.default_rng(semilla)
+    tamanos = rng.integers(3, 40, lotes)
+    offsets = np.concatenate([[0], np.cumsum(tamanos)])
+    pesos = np.round(rng.normal(NOMINAL, 0.8, offsets[-1]), 2)
+    diferencias = []
+    for metodo in (METODO_NORMAL, METODO_FORMA2):
+        densa = pesos[:lotes * 15].reshape(lotes, 15)
+        for nombre, lote, muestras in (
+                ('densa', evaluar_lotes(densa, LIM_INF, LIM_SUP, 1.0, metodo=metodo), densa),
+                ('offsets', evaluar_lotes(pesos, LIM_INF, LIM_SUP, 1.0, offsets=offsets,
+                                          metodo=metodo),
+                 [pesos[a:b] for a, b in zip(offsets[:-1], offsets[1:])])):
+            escalares = [realizar_analisis(m, NOMINAL, LIM_INF, LIM_SUP, 1.0, metodo=metodo)
+                         for m in muestras]
+            for campo in ('media', 'desviacion', 'Z_EI', 'Z_ES', 'pi', 'ps', 'p_total'):
+                escalar = np.array([r[campo] for r in escalares], dtype=float)
+                distintos = np.count_nonzero(lote[campo].view(np.int64) != escalar.view(np.int64))
+                if distintos:
+                    diferencias.append(f"{metodo}.{nombre}.{campo}: {distintos} lote(s)")
+            if metodo == METODO_NORMAL:
+                referencia = np.array([(1 - normal_cdf(a)) * 100 + (1 - normal_cdf(b)) * 100
+                                       for a, b in zip(lote['Z_EI'], lote['Z_ES'])])
+                distintos = np.count_nonzero(lote['p_total'] != referencia)
+                if distintos:
+                    diferencias.append(f"{metodo}.{nombre}.normal_cdf: {distintos} lote(s)")
+    return diferencias
+
+
+def seleccionar_casos(filtro=None, graficos=True, pagina=True):
+    casos = casos_nucleo(graficos) + (casos_pagina() if pagina else [])
+    return {nombre: funcion for nombre, funcion in casos if not filtro or filtro in nombre}
+
+
+def ejecutar(casos, repeticiones=5):
+    resultados = {}
+    for nombre, funcion in casos.items():
+        # Los casos lentos (gráficos, página) se repiten menos
+        resultados[nombre] = medir(funcion, repeticiones if not nombre.startswith(
+            ('grafico.', 'pagina.')) else max(3, repeticiones // 2))
+        print(f"{nombre:<28} {resultados[nombre]['mediana_ms']:>11.4f} ms", flush=True)
+    return resultados
+
+
+def informe(resultados):
+    return {
+        'meta': {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'procesador': platform.processor() or platform.machine(),
+        },
+        'resultados': resultados,
+    }
+
+
+def comparar(actual, base, tolerancia=TOLERANCIA, piso_ms=PISO_MS):
+    """Casos más lentos que la base en más de `tolerancia` (y de `piso_ms`).
+
+    Se compara el mínimo de las muestras: es el estimador menos sensible
+    al ruido de la máquina (otras cargas solo pueden sumar tiempo).
+    """
+    regresiones = []
+    for nombre, medida in actual['resultados'].items():
+        referencia = base['resultados'].get(nombre)
+        if referencia is None:
+            continue
+        antes, ahora = referencia['minimo_ms'], medida['minimo_ms']
+        if ahora > antes * (1 + tolerancia) and ahora - antes > piso_ms:
+            regresiones.append((nombre, antes, ahora))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--filtro', help="Solo casos cuyo nombre contiene este texto")
+    parser.add_argument('--sin-graficos', action='store_true')
+    parser.add_argument('--sin-pagina', action='store_true')
+    parser.add_argument('--salida', type=Path, help="Archivo JSON de resultados")
+    parser.add_argument('--base', type=Path, default=LINEA_BASE)
+    parser.add_argument('--guardar-base', action='store_true',
+                        help="Escribe los resultados como nueva línea base")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA,
+                        help="Empeoramiento relativo permitido (0.5 = 50 %%)")
+    args = parser.parse_args(argv)
+
+    diferencias = verificar_equivalencia()
+    for diferencia in diferencias:
+        print(f"DIFERENCIA lote a lote vs escalar en {diferencia}")
+
+    casos = seleccionar_casos(args.filtro, not args.sin_graficos, not args.sin_pagina)
+    actual = informe(ejecutar(casos, args.repeticiones))
+    base = json.loads(args.base.read_text(encoding='utf-8')) if args.base.exists() else None
+    if base is not None and not args.guardar_base:
+        # Confirmación: los casos marcados se vuelven a medir y se conserva
+        # la mejor medida, para no reportar picos de carga de la máquina
+        marcados = [nombre for nombre, _, _ in comparar(actual, base, args.tolerancia)]
+        if marcados:
+            print(f"Confirmando {len(marcados)} caso(s)...")
+            for nombre, medida in ejecutar({n: casos[n] for n in marcados},
+                                           args.repeticiones).items():
+                if medida['minimo_ms'] < actual['resultados'][nombre]['minimo_ms']:
+                    actual['resultados'][nombre] = medida
+
+    texto = json.dumps(actual, indent=2, ensure_ascii=False) + '\n'
+    if args.salida:
+        args.salida.write_text(texto, encoding='utf-8')
+    if args.guardar_base:
+        args.base.write_text(texto, encoding='utf-8')
+        print(f"Línea base guardada en {args.base}")
+        return 1 if diferencias else 0
+    if base is None:
+        print(f"Sin línea base en {args.base}; use --guardar-base")
+        return 1 if diferencias else 0
+
+    regresiones = comparar(actual, base, args.tolerancia)
+    for nombre, antes, ahora in regresiones:
+        print(f"REGRESIÓN {nombre}: {antes:.4f} ms -> {ahora:.4f} ms ({ahora / antes:.2f}x)")
+    if not regresiones:
+        print(f"Sin regresiones (tolerancia {args.tolerancia:.0%})")
+    return 1 if regresiones or diferencias else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""Generador de carga para la API HTTP (nawi/api.py).
+
+Levanta la API en un proceso aparte (o usa una ya levantada con --url),
+abre `--concurrencia` conexiones keep-alive y envía solicitudes durante
+`--duracion` segundos. Informa solicitudes/s, lotes/s y latencias
+p50/p95/p99, y con --verificar sale con código 1 si no se cumplen los
+objetivos del escenario.
+
+    python benchmarks/carga_api.py                          # todos los escenarios
+    python benchmarks/carga_api.py --escenario lotes --concurrencia 16
+    python benchmarks/carga_api.py --url http://127.0.0.1:8600 --verificar
+
+Escenarios:
+
+- evaluar: un lote de n=35 por solicitud (una balanza que envía cada lote).
+- lotes:   100 lotes de n=35 por solicitud (envío por tandas del MES).
+- plan:    GET /plan (consulta de letra, n y k).
+
+Los objetivos valen para un solo núcleo compartido con el propio
+generador de carga, con holgura; con más núcleos el rendimiento escala
+con --trabajadores.
+"""
+import argparse
+import http.client
+import json
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Objetivos por escenario: latencia p95 máxima (ms) y solicitudes/s mínimas
+OBJETIVOS = {
+    'evaluar': {'p95_ms': 30.0, 'solicitudes_s': 400.0},
+    'lotes': {'p95_ms': 120.0, 'solicitudes_s': 100.0},
+    'plan': {'p95_ms': 15.0, 'solicitudes_s': 1500.0},
+}
+LOTES_POR_TANDA = 100
+N_MUESTRA = 35
+
+
+def cuerpos(escenario, semilla=0):
+    """(método, ruta, cuerpo, lotes por solicitud) del escenario"""
+    rng = np.random.default_rng(semilla)
+    if escenario == 'plan':
+        return 'GET', '/plan?nivel=II&tam_lote=1000&aql=1', None, 0
+    if escenario == 'evaluar':
+        cuerpo = {'pesos': np.round(rng.normal(100, 0.6, N_MUESTRA), 2).tolist(),
+                  'lim_inf': 98, 'lim_sup': 102, 'nivel': 'II', 'tam_lote': 1000, 'aql': '1'}
+        return 'POST', '/evaluar', json.dumps(cuerpo).encode(), 1
+    lotes = [{'id': f'L{i}', 'pesos': np.round(rng.normal(100, 0.6, N_MUESTRA), 2).tolist()}
+             for i in range(LOTES_POR_TANDA)]
+    cuerpo = {'lim_inf': 98, 'lim_sup': 102, 'nivel': 'II', 'tam_lote': 1000, 'aql': '1',
+              'lotes': lotes}
+    return 'POST', '/evaluar/lotes', json.dumps(cuerpo).encode(), LOTES_POR_TANDA
+
+
+def _cliente(host, puerto, solicitud, fin, latencias, errores):
+    metodo, ruta, cuerpo, _ = solicitud
+    encabezados = {'Content-Type': 'application/json'} if cuerpo else {}
+    conexion = http.client.HTTPConnection(host, puerto, timeout=30)
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        try:
+            conexion.request(metodo, ruta, body=cuerpo, headers=encabezados)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status != 200:
+                errores.append(respuesta.status)
+                continue
+        except (OSError, http.client.HTTPException) as error:
+            errores.append(type(error).__name__)
+            conexion.close()
+            conexion = http.client.HTTPConnection(host, puerto, timeout=30)
+            continue
+        latencias.append(time.perf_counter() - inicio)
+    conexion.close()
+
+
+def medir(url, escenario, concurrencia, duracion, calentamiento=1.0):
+    partes = urlsplit(url)
+    solicitud = cuerpos(escenario)
+    # Calentamiento: los procesos del pool cargan NumPy y el núcleo
+    _cliente(partes.hostname, partes.port, solicitud, time.perf_counter() + calentamiento,
+             [], [])
+
+    latencias, errores = [], []
+    fin = time.perf_counter() + duracion
+    hilos = [threading.Thread(target=_cliente,
+                              args=(partes.hostname, partes.port, solicitud, fin, latencias,
+                                    errores))
+             for _ in range(concurrencia)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.perf_counter() - inicio
+
+    ms = np.array(latencias) * 1000
+    percentil = (lambda q: float(np.percentile(ms, q))) if len(ms) else (lambda q: float('nan'))
+    return {
+        'escenario': escenario,
+        'concurrencia': concurrencia,
+        'solicitudes': len(latencias),
+        'errores': len(errores),
+        'solicitudes_s': len(latencias) / transcurrido,
+        'lotes_s': len(latencias) * solicitud[3] / transcurrido,
+        'p50_ms': percentil(50),
+        'p95_ms': percentil(95),
+        'p99_ms': percentil(99),
+        'media_ms': statistics.fmean(ms) if len(ms) else float('nan'),
+    }
+
+
+def cumple(resultado):
+    objetivo = OBJETIVOS[resultado['escenario']]
+    return (resultado['errores'] == 0 and resultado['p95_ms'] <= objetivo['p95_ms']
+            and resultado['solicitudes_s'] >= objetivo['solicitudes_s'])
+
+
+def levantar_api(puerto, trabajadores=None):
+    """Proceso con la API; espera a que responda /salud"""
+    comando = [sys.executable, '-m', 'nawi', 'api', '--puerto', str(puerto)]
+    if trabajadores is not None:
+        comando += ['--trabajadores', str(trabajadores)]
+    proceso = subprocess.Popen(comando, cwd=RAIZ, stdout=subprocess.DEVNULL)
+    limite = time.perf_counter() + 60
+    while time.perf_counter() < limite:
+        try:
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=1)
+            conexion.request('GET', '/salud')
+            if conexion.getresponse().status == 200:
+                return proceso
+        except OSError:
+            time.sleep(0.2)
+    proceso.kill()
+    raise RuntimeError("La API no respondió a tiempo")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help="API ya levantada (si no, se levanta una)")
+    parser.add_argument('--puerto', type=int, default=8651)
+    parser.add_argument('--trabajadores', type=int, default=None,
+                        help="Procesos de cálculo de la API levantada (por defecto, los de la API)")
+    parser.add_argument('--escenario', choices=sorted(OBJETIVOS), action='append',
+                        help="Repetible; por defecto todos")
+    parser.add_argument('--concurrencia', type=int, default=8)
+    parser.add_argument('--duracion', type=float, default=5.0, help="Segundos por escenario")
+    parser.add_argument('--salida', type=Path, help="Archivo JSON de resultados")
+    parser.add_argument('--verificar', action='store_true',
+                        help="Código de salida 1 si algún escenario no cumple sus objetivos")
+    args = parser.parse_args(argv)
+
+    proceso = None
+    url = args.url
+    if url is None:
+        proceso = levantar_api(args.puerto, args.trabajadores)
+        url = f'http://127.0.0.1:{args.puerto}'
+    try:
+        resultados = []
+        for escenario in args.escenario or ('evaluar', 'lotes', 'plan'):
+            r = medir(url, escenario, args.concurrencia, args.duracion)
+            r['cumple'] = cumple(r)
+            resultados.append(r)
+            print(f"{escenario:<8} {r['solicitudes_s']:>8.1f} sol/s {r['lotes_s']:>9.1f} lotes/s"
+                  f"  p50 {r['p50_ms']:6.1f}  p95 {r['p95_ms']:6.1f}  p99 {r['p99_ms']:6.1f} ms"
+                  f"  errores {r['errores']}  {'OK' if r['cumple'] else 'NO CUMPLE'}",
+                  flush=True)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait(10)
+
+    if args.salida:
+        args.salida.write_text(json.dumps({'url': url, 'objetivos': OBJETIVOS,
+                                           'resultados': resultados}, indent=2) + '\n',
+                               encoding='utf-8')
+    return 1 if args.verificar and not all(r['cumple'] for r in resultados) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Núcleo de muestreo MIL-STD-414 de NAWI KUYCHI.
+
+Se puede importar sin Streamlit, Matplotlib ni pandas. Los nombres
+públicos se cargan de forma diferida desde sus submódulos, de modo que
+`import nawi` no cuesta nada hasta que se usa algo.
+"""
+import importlib
+
+_EXPORTACIONES = {
+    'AQL_KEYS': 'planes',
+    'NIVELES': 'planes',
+    'RANGOS_LOTE': 'planes',
+    'TABLA_K': 'planes',
+    'INDICE': 'planes',
+    'PlanMuestreo': 'planes',
+    'buscar_plan': 'planes',
+    'obtener_letra_muestreo': 'planes',
+    'normal_cdf': 'analisis',
+    'evaluar_lotes': 'analisis',
+    'realizar_analisis': 'analisis',
+    'evaluar_estadisticos': 'analisis',
+    'cribar_lotes': 'analisis',
+    'porcentaje_forma2': 'forma2',
+    'curva_oc': 'oc',
+    'leer_pesajes': 'importar',
+    'MotorConmutacion': 'conmutacion',
+    'CatalogoProductos': 'catalogo',
+    'Especificacion': 'catalogo',
+    'MonitorSPC': 'spc',
+    'HistoriaPesos': 'piramide',
+    'plan_para_inspeccion': 'conmutacion',
+    'generar_pesos_aleatorios': 'simulacion',
+    'generar_lotes': 'simulacion',
+    'Escenario': 'simulacion',
+    'crear_grafico_matplotlib': 'graficos',
+    'renderizar_grafico': 'graficos',
+    'iniciar_reporte': 'reportes',
+    'ArchivoPesajes': 'archivo',
+    'PoolTrabajos': 'trabajos',
+    'csv_datos': 'exportar',
+    'csv_resumen': 'exportar',
+    'carga_exportacion': 'exportar',
+    'COLORES': 'estilo',
+}
+
+__all__ = sorted(_EXPORTACIONES)
+
+
+def __getattr__(nombre):
+    modulo = _EXPORTACIONES.get(nombre)
+    if modulo is None:
+        raise AttributeError(f"module 'nawi' has no attribute {nombre!r}")
+    valor = getattr(importlib.import_module(f'.{modulo}', __name__), nombre)
+    globals()[nombre] = valor
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
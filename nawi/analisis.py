@@ -0,0 +1,279 @@
+"""Análisis estadístico MIL-STD-414 por variables (σ desconocida)."""
+import math
+
+import numpy as np
+
+from .estilo import COLORES
+from .forma2 import porcentaje_forma2
+from .normalidad import ALFA, aviso_normalidad, cribar_grupos
+
+# ============================================================
+# FUNCIONES UTILITARIAS
+# ============================================================
+def normal_cdf(z: float) -> float:
+    """Función de distribución acumulada de N(0,1)"""
+    return 0.5 * (1 + math.erf(z / math.sqrt(2)))
+
+
+# ============================================================
+# EVALUACIÓN VECTORIZADA DE LOTES
+# ============================================================
+# Códigos de decisión por lote
+DECISION_INDETERMINADA = -1
+DECISION_RECHAZAR = 0
+DECISION_ACEPTAR = 1
+
+# Códigos de error por lote (0 = lote válido)
+ERROR_POCOS_DATOS = 1
+ERROR_PESOS_CERO = 2
+ERROR_SIN_VARIACION = 3
+
+MENSAJES_ERROR = {
+    ERROR_POCOS_DATOS: 'Se requieren al menos 2 pesos para el análisis',
+    ERROR_PESOS_CERO: 'Todos los pesos son cero. Ingrese valores válidos.',
+    ERROR_SIN_VARIACION: 'La desviación estándar es cero (sin variación)',
+}
+
+# Estimadores del porcentaje fuera de especificación
+METODO_NORMAL = 'normal'   # 1 - Φ(Z), como la versión original
+METODO_FORMA2 = 'forma2'   # MIL-STD-414 Forma 2: beta simétrica (insesgado de varianza mínima)
+METODOS = (METODO_NORMAL, METODO_FORMA2)
+
+# math.erf elemento a elemento: garantiza los mismos valores que normal_cdf
+_erf = np.frompyfunc(math.erf, 1, 1)
+
+
+def normal_cdf_vec(z):
+    """Versión vectorizada de normal_cdf (mismo resultado valor a valor)"""
+    z = np.asarray(z, dtype=float)
+    return 0.5 * (1 + _erf(z / math.sqrt(2)).astype(float))
+
+
+def _grupos_por_tamano(pesos, offsets):
+    """Agrupa los lotes por tamaño de muestra como matrices densas.
+
+    Devuelve una lista de (indices_de_lote, matriz lotes × muestras).
+    """
+    if offsets is None:
+        matriz = np.atleast_2d(np.asarray(pesos, dtype=float))
+        return [(np.arange(matriz.shape[0]), matriz)]
+
+    pesos = np.asarray(pesos, dtype=float).ravel()
+    offsets = np.asarray(offsets, dtype=np.int64)
+    tamanos = np.diff(offsets)
+    grupos = []
+    for tamano in np.unique(tamanos):
+        indices = np.flatnonzero(tamanos == tamano)
+        posiciones = offsets[indices][:, None] + np.arange(tamano)
+        grupos.append((indices, pesos[posiciones]))
+    return grupos
+
+
+def _cribar(grupos, num_lotes, pesos, offsets, alfa):
+    """cribar_grupos con la máscara de atípicos unida en la forma de `pesos`"""
+    cribado = cribar_grupos(grupos, num_lotes, alfa)
+    mascaras = cribado.pop('mascaras_atipicos')
+    if offsets is None:
+        mascara = mascaras[0][1].reshape(np.shape(pesos))
+    else:
+        mascara = np.zeros(np.shape(pesos), dtype=bool)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        for indices, por_lote in mascaras:
+            mascara[offsets[indices][:, None] + np.arange(por_lote.shape[1])] = por_lote
+    cribado['mascara_atipicos'] = mascara
+    return cribado
+
+
+def cribar_lotes(pesos, offsets=None, alfa=ALFA):
+    """Solo el cribado de normalidad y atípicos de evaluar_lotes(cribar=True)"""
+    grupos = _grupos_por_tamano(pesos, offsets)
+    return _cribar(grupos, sum(len(indices) for indices, _ in grupos), pesos, offsets, alfa)
+
+
+def evaluar_lotes(pesos, lim_inf, lim_sup, k, offsets=None, metodo=METODO_NORMAL,
+                  cribar=False, alfa=ALFA):
+    """Evalúa muchos lotes a la vez con la misma regla que realizar_analisis.
+
+    `pesos` es una matriz lotes × muestras o, si se indica `offsets`
+    (inicio de cada lote más el final, estilo CSR), un vector con las
+    muestras de todos los lotes concatenadas. `lim_inf`, `lim_sup` y `k`
+    pueden ser escalares o vectores por lote; k=None o NaN deja el lote
+    como indeterminado. `metodo` elige el estimador del porcentaje
+    (METODO_NORMAL o METODO_FORMA2).
+
+    Devuelve un diccionario de arreglos con las mismas claves que
+    realizar_analisis más 'decision' (códigos DECISION_*) y
+    'codigo_error' (0 o un código ERROR_*). Con `cribar` agrega el
+    cribado de `nawi.normalidad` ('ad', 'p_ad', 'sf', 'p_sf',
+    'normalidad', 'atipicos' y 'mascara_atipicos' con la forma de
+    `pesos`); no cambia la decisión.
+    """
+    grupos = _grupos_por_tamano(pesos, offsets)
+    num_lotes = sum(len(indices) for indices, _ in grupos)
+
+    n = np.zeros(num_lotes, dtype=np.int64)
+    media = np.full(num_lotes, np.nan)
+    desviacion = np.full(num_lotes, np.nan)
+    codigo_error = np.zeros(num_lotes, dtype=np.int8)
+
+    # Estadísticas básicas por grupo de igual tamaño
+    for indices, matriz in grupos:
+        tamano = matriz.shape[1]
+        n[indices] = tamano
+        if tamano < 2:
+            codigo_error[indices] = ERROR_POCOS_DATOS
+            continue
+        media[indices] = np.mean(matriz, axis=1)
+        desviacion[indices] = np.std(matriz, axis=1, ddof=1)
+        ceros = np.all(matriz == 0, axis=1)
+        codigo_error[indices] = np.where(
+            ceros, ERROR_PESOS_CERO,
+            np.where(desviacion[indices] == 0, ERROR_SIN_VARIACION, 0)
+        )
+
+    validos = codigo_error == 0
+    resultado = evaluar_estadisticos(media, desviacion, lim_inf, lim_sup, k, validos,
+                                     metodo=metodo, n=n)
+    resultado.update({
+        'n': n,
+        'codigo_error': codigo_error,
+        'error': ~validos,
+    })
+    if cribar:
+        resultado.update(_cribar(grupos, num_lotes, pesos, offsets, alfa))
+    return resultado
+
+
+def evaluar_estadisticos(media, desviacion, lim_inf, lim_sup, k, validos=None,
+                         metodo=METODO_NORMAL, n=None):
+    """Regla de decisión de evaluar_lotes a partir de X̄ y S ya calculadas.
+
+    Devuelve 'media', 'desviacion', 'Z_ES', 'Z_EI', 'pi', 'ps', 'p_total',
+    'k' y 'decision'. Las posiciones con `validos` en False quedan en NaN
+    e indeterminadas. METODO_FORMA2 requiere el tamaño de muestra `n`
+    (escalar o por lote).
+    """
+    media = np.asarray(media, dtype=float)
+    desviacion = np.asarray(desviacion, dtype=float)
+    num_lotes = media.shape[0]
+    if validos is None:
+        validos = desviacion > 0
+    lim_inf = np.broadcast_to(np.asarray(lim_inf, dtype=float), (num_lotes,))
+    lim_sup = np.broadcast_to(np.asarray(lim_sup, dtype=float), (num_lotes,))
+    k = np.broadcast_to(np.asarray(k, dtype=float), (num_lotes,))
+
+    # Índices Z (solo en lotes válidos para no dividir entre cero)
+    Z_ES = np.full(num_lotes, np.nan)
+    Z_EI = np.full(num_lotes, np.nan)
+    np.divide(lim_sup - media, desviacion, out=Z_ES, where=validos)
+    np.divide(media - lim_inf, desviacion, out=Z_EI, where=validos)
+
+    # Porcentajes fuera de especificación
+    if metodo == METODO_NORMAL:
+        # Ambas colas en una sola evaluación de erf
+        pi, ps = (1 - normal_cdf_vec(np.stack([Z_EI, Z_ES]))) * 100
+    elif metodo == METODO_FORMA2:
+        if n is None:
+            raise ValueError("El método Forma 2 requiere el tamaño de muestra n")
+        # Ambas colas en una sola evaluación de la tabla
+        pi, ps = porcentaje_forma2(np.stack([Z_EI, Z_ES]), np.asarray(n, dtype=np.int64))
+    else:
+        raise ValueError(f"Método de estimación desconocido: {metodo}")
+    p_total = pi + ps
+
+    # Decisión: p_total <= k acepta; sin k el lote queda indeterminado
+    decision = np.full(num_lotes, DECISION_INDETERMINADA, dtype=np.int8)
+    con_k = validos & ~np.isnan(k)
+    decision[con_k] = np.where(p_total[con_k] <= k[con_k],
+                               DECISION_ACEPTAR, DECISION_RECHAZAR)
+
+    return {
+        'media': media,
+        'desviacion': desviacion,
+        'Z_ES': Z_ES,
+        'Z_EI': Z_EI,
+        'pi': pi,
+        'ps': ps,
+        'p_total': p_total,
+        'k': k,
+        'decision': decision,
+    }
+
+
+def realizar_analisis(pesos, nominal, lim_inf, lim_sup, k, metodo=METODO_NORMAL, cribar=False):
+    """Realiza el análisis estadístico completo.
+
+    Con `cribar` agrega el cribado de normalidad y atípicos ('normalidad',
+    'p_ad', 'p_sf', 'atipicos' y 'aviso_normalidad'); por omisión no se
+    hace, para que la decisión no pague ese costo.
+    """
+    lote = evaluar_lotes(np.asarray(pesos, dtype=float)[None, :], lim_inf, lim_sup, k,
+                         metodo=metodo, cribar=cribar)
+
+    # Verificar datos válidos
+    codigo_error = int(lote['codigo_error'][0])
+    if codigo_error:
+        return {
+            'error': True,
+            'mensaje': MENSAJES_ERROR[codigo_error]
+        }
+
+    # Estadísticas, índices Z y porcentajes fuera de especificación
+    n = int(lote['n'][0])
+    X_bar = lote['media'][0]
+    S = lote['desviacion'][0]
+    Z_ES = lote['Z_ES'][0]
+    Z_EI = lote['Z_EI'][0]
+    pi = lote['pi'][0]
+    ps = lote['ps'][0]
+    p_total = lote['p_total'][0]
+
+    # Determinar decisión
+    if lote['decision'][0] == DECISION_INDETERMINADA:
+        decision = "Indeterminado (valor k no definido)"
+        color = COLORES['warning']
+        icono = "⚠️"
+    elif lote['decision'][0] == DECISION_ACEPTAR:
+        decision = f"ACEPTAR EL LOTE (p={p_total:.2f}% ≤ k={k})"
+        color = COLORES['success']
+        icono = "✅"
+    else:
+        decision = f"RECHAZAR EL LOTE (p={p_total:.2f}% > k={k})"
+        color = COLORES['danger']
+        icono = "❌"
+
+    resultado = {
+        'error': False,
+        'n': n,
+        'media': X_bar,
+        'desviacion': S,
+        'Z_ES': Z_ES,
+        'Z_EI': Z_EI,
+        'pi': pi,
+        'ps': ps,
+        'p_total': p_total,
+        'k': k,
+        'decision': decision,
+        'codigo_decision': int(lote['decision'][0]),
+        'color': color,
+        'icono': icono,
+    }
+    if cribar:
+        # Cribado: acompaña a la decisión, no la modifica
+        resultado.update(resumen_cribado(lote))
+    return resultado
+
+
+def resumen_cribado(cribado, i=0):
+    """Cribado del lote i (de evaluar_lotes(cribar=True) o cribar_lotes) para mostrar"""
+    mascara = np.atleast_2d(cribado['mascara_atipicos'])
+    atipicos = (np.flatnonzero(mascara[i]) + 1).tolist()
+    normalidad = int(cribado['normalidad'][i])
+    p_ad, p_sf = cribado['p_ad'][i], cribado['p_sf'][i]
+    return {
+        'normalidad': normalidad,
+        'p_ad': p_ad,
+        'p_sf': p_sf,
+        'atipicos': atipicos,
+        'aviso_normalidad': aviso_normalidad(normalidad, atipicos, p_ad, p_sf),
+    }
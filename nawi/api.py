@@ -0,0 +1,339 @@
+"""Servicio HTTP/JSON para que la línea (PLC/MES) envíe lotes sin la interfaz.
+
+    python -m nawi api --puerto 8600 --trabajadores 4
+
+Rutas:
+
+- GET  /salud
+- GET  /plan?nivel=II&tam_lote=1000&aql=1
+- POST /planes          {"consultas": [{"nivel", "tam_lote", "aql"}, ...]}
+- POST /evaluar         {"pesos": [...], "lim_inf", "lim_sup", plan o "k", "metodo"}
+- POST /evaluar/lotes   {"lim_inf", "lim_sup", plan o "k", "metodo",
+                         "lotes": [{"id", "pesos", ...}, ...]}
+
+El plan se da como "k" explícito o como "nivel", "tam_lote" y "aql"; en
+/evaluar/lotes cada lote puede traer sus propios límites, k o plan, que
+reemplazan a los del cuerpo. Todos los lotes de una solicitud se evalúan
+en una sola llamada vectorizada a `evaluar_lotes`, con el cribado de
+normalidad y atípicos: cada lote trae "normalidad", "p_ad", "p_sf" y
+"atipicos" (posiciones desde 1 dentro del lote).
+
+Los hilos del servidor solo leen y escriben sockets: el cuerpo crudo se
+envía a un pool de procesos que decodifica el JSON, evalúa y codifica la
+respuesta, de modo que el trabajo de CPU no compite por el GIL del
+servidor. Con `trabajadores=0` todo se procesa en el hilo de la conexión.
+"""
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .analisis import (
+    DECISION_ACEPTAR, DECISION_RECHAZAR, MENSAJES_ERROR, METODO_NORMAL, METODOS, evaluar_lotes
+)
+from .normalidad import ETIQUETAS_NORMALIDAD
+from .planes import AQL_KEYS, NIVELES, buscar_plan
+
+PUERTO_PREDETERMINADO = 8600
+# Con un solo núcleo el viaje al pool solo suma latencia: se calcula en los hilos
+TRABAJADORES_PREDETERMINADOS = (os.cpu_count() or 1) if (os.cpu_count() or 1) > 1 else 0
+MAXIMO_CUERPO = 16 << 20
+MAXIMO_LOTES = 10000
+
+ETIQUETAS_DECISION = {DECISION_ACEPTAR: 'ACEPTAR', DECISION_RECHAZAR: 'RECHAZAR'}
+CAMPOS_ESTADISTICOS = ('media', 'desviacion', 'Z_EI', 'Z_ES', 'pi', 'ps', 'p_total')
+CAMPOS_CRIBADO = ('p_ad', 'p_sf')
+# Cota de los pesos aceptados: más allá, S² desborda y las estadísticas salen NaN
+MAXIMO_PESO = 1e12
+MENSAJE_PESOS = f"Los pesos deben ser números finitos de hasta {MAXIMO_PESO:g}"
+MENSAJE_LIMITES = "Los límites deben ser números finitos"
+# Distingue "el cuerpo no trae plan" de "el plan del cuerpo no tiene k"
+_SIN_BASE = object()
+
+
+class ErrorSolicitud(ValueError):
+    """Solicitud mal formada; se responde con 400"""
+
+
+# ============================================================
+# PROCESAMIENTO (se ejecuta en los procesos del pool)
+# ============================================================
+def _plan(datos):
+    try:
+        nivel, tam_lote, aql = datos['nivel'], int(datos['tam_lote']), str(datos['aql'])
+    except KeyError as error:
+        raise ErrorSolicitud(f"Falta el campo {error.args[0]!r} (o 'k')") from None
+    except (TypeError, ValueError):
+        raise ErrorSolicitud("tam_lote debe ser un entero") from None
+    if nivel not in NIVELES:
+        raise ErrorSolicitud(f"nivel debe ser uno de: {', '.join(NIVELES)}")
+    if aql not in AQL_KEYS:
+        raise ErrorSolicitud(f"aql debe ser uno de: {', '.join(AQL_KEYS)}")
+    plan = buscar_plan(nivel, tam_lote, aql)
+    if plan is None:
+        raise ErrorSolicitud(f"Sin plan para nivel={nivel}, tam_lote={tam_lote}, aql={aql}")
+    return plan
+
+
+def _plan_json(plan):
+    return {'letra': plan.letra, 'n': plan.n, 'k': plan.k, 'nivel': plan.nivel, 'aql': plan.aql}
+
+
+def _es_numero(valor):
+    """Número JSON real: int o float, no bool (que en Python es un int)"""
+    return type(valor) in (int, float)
+
+
+def _a_float(valor):
+    """float de un número JSON; un entero que no cabe en float queda como inf"""
+    try:
+        return float(valor)
+    except OverflowError:
+        return float('inf')
+
+
+def _k(datos, base=_SIN_BASE):
+    """k del lote: explícito, de su plan o el del cuerpo (`base`, que puede ser None)"""
+    if 'k' in datos:
+        valor = datos['k']
+        if valor is None:
+            return None
+        k = _a_float(valor) if _es_numero(valor) else float('nan')
+        if not np.isfinite(k):
+            raise ErrorSolicitud("k debe ser un número finito o null")
+        return k
+    if 'tam_lote' in datos:
+        return _plan(datos).k
+    if base is not _SIN_BASE:
+        return base
+    raise ErrorSolicitud("Indique 'k' o el plan ('nivel', 'tam_lote', 'aql')")
+
+
+def _limite(datos, campo, base=None):
+    valor = datos.get(campo, base)
+    if valor is None:
+        raise ErrorSolicitud(f"Falta el campo {campo!r}")
+    if not _es_numero(valor):
+        raise ErrorSolicitud(MENSAJE_LIMITES)
+    return _a_float(valor)
+
+
+def _pesos(lote):
+    """Lista de pesos del lote; solo números (ni texto ni booleanos)"""
+    pesos = lote['pesos']
+    if not (isinstance(pesos, list) and all(map(_es_numero, pesos))):
+        raise ErrorSolicitud("'pesos' debe ser una lista de números")
+    return pesos
+
+
+def evaluar_solicitud(cuerpo, lote_unico=False):
+    """Evalúa un cuerpo de /evaluar o /evaluar/lotes y devuelve el diccionario de respuesta"""
+    metodo = cuerpo.get('metodo', METODO_NORMAL)
+    if metodo not in METODOS:
+        raise ErrorSolicitud(f"metodo debe ser uno de: {', '.join(METODOS)}")
+    lotes = [cuerpo] if lote_unico else cuerpo.get('lotes')
+    if not isinstance(lotes, list) or not lotes:
+        raise ErrorSolicitud("Falta la lista 'lotes'")
+    if len(lotes) > MAXIMO_LOTES:
+        raise ErrorSolicitud(f"Máximo {MAXIMO_LOTES} lotes por solicitud")
+
+    k_base = (_k(cuerpo) if not lote_unico and ('k' in cuerpo or 'tam_lote' in cuerpo)
+              else _SIN_BASE)
+    inf_base, sup_base = cuerpo.get('lim_inf'), cuerpo.get('lim_sup')
+    try:
+        listas = [_pesos(lote) for lote in lotes]
+        offsets = np.zeros(len(lotes) + 1, dtype=np.int64)
+        np.cumsum([len(lista) for lista in listas], out=offsets[1:])
+        try:
+            pesos = np.fromiter((p for lista in listas for p in lista), dtype=float,
+                                count=int(offsets[-1]))
+        except OverflowError:
+            raise ErrorSolicitud(MENSAJE_PESOS) from None
+        lim_inf = np.array([_limite(lote, 'lim_inf', inf_base) for lote in lotes])
+        lim_sup = np.array([_limite(lote, 'lim_sup', sup_base) for lote in lotes])
+        k = np.array([_k(lote, k_base) for lote in lotes], dtype=float)
+    except (KeyError, TypeError) as error:
+        raise ErrorSolicitud(f"Lote mal formado: {error}") from None
+    # json.loads acepta NaN e Infinity: se rechazan como lo hace la importación
+    if not np.all(np.isfinite(pesos) & (np.abs(pesos) <= MAXIMO_PESO)):
+        raise ErrorSolicitud(MENSAJE_PESOS)
+    if not (np.all(np.isfinite(lim_inf)) and np.all(np.isfinite(lim_sup))):
+        raise ErrorSolicitud(MENSAJE_LIMITES)
+    if np.any(lim_inf >= lim_sup):
+        raise ErrorSolicitud("El límite inferior debe ser menor que el superior")
+
+    res = evaluar_lotes(pesos, lim_inf, lim_sup, k, offsets=offsets, metodo=metodo, cribar=True)
+    # NaN/inf no son JSON válido: se envían como null
+    estadisticos = {campo: np.where(np.isfinite(res[campo]), res[campo], None).tolist()
+                    for campo in CAMPOS_ESTADISTICOS + CAMPOS_CRIBADO}
+    normalidad = res['normalidad'].tolist()
+    atipicos = [[] for _ in lotes]
+    posiciones = np.flatnonzero(res['mascara_atipicos'])
+    de_lote = np.searchsorted(offsets, posiciones, side='right') - 1
+    for i, posicion in zip(de_lote.tolist(), (posiciones - offsets[de_lote] + 1).tolist()):
+        atipicos[i].append(posicion)
+    n, codigos, decisiones = res['n'].tolist(), res['codigo_error'].tolist(), res['decision'].tolist()
+    k = k.tolist()
+    salida = []
+    for i, lote in enumerate(lotes):
+        fila = {'n': n[i]}
+        if 'id' in lote:
+            fila['id'] = lote['id']
+        if codigos[i]:
+            fila['decision'] = 'ERROR'
+            fila['mensaje'] = MENSAJES_ERROR[codigos[i]]
+        else:
+            fila['decision'] = ETIQUETAS_DECISION.get(decisiones[i], 'INDETERMINADO')
+            for campo in CAMPOS_ESTADISTICOS:
+                fila[campo] = estadisticos[campo][i]
+            fila['k'] = None if k[i] != k[i] else k[i]
+            fila['normalidad'] = ETIQUETAS_NORMALIDAD[normalidad[i]]
+            for campo in CAMPOS_CRIBADO:
+                fila[campo] = estadisticos[campo][i]
+            fila['atipicos'] = atipicos[i]
+        salida.append(fila)
+    return salida[0] if lote_unico else {'lotes': salida, 'metodo': metodo}
+
+
+RUTAS = {'/salud': 'GET', '/plan': 'GET', '/planes': 'POST', '/evaluar': 'POST',
+         '/evaluar/lotes': 'POST'}
+
+
+def _cuerpo_json(cuerpo):
+    try:
+        datos = json.loads(cuerpo)
+    except ValueError as error:
+        raise ErrorSolicitud(f"JSON inválido: {error}") from None
+    if not isinstance(datos, dict):
+        raise ErrorSolicitud("El cuerpo debe ser un objeto JSON")
+    return datos
+
+
+def procesar(metodo_http, ruta, cuerpo):
+    """(estado HTTP, bytes JSON) de una solicitud; no depende del servidor"""
+    partes = urlsplit(ruta)
+    ruta = partes.path.rstrip('/') or '/'
+    if ruta not in RUTAS:
+        return 404, _codificar({'error': f"Ruta desconocida: {partes.path}"})
+    if RUTAS[ruta] != metodo_http:
+        return 405, _codificar({'error': f"{ruta} solo acepta {RUTAS[ruta]}"})
+    try:
+        if ruta == '/salud':
+            respuesta = {'estado': 'ok', 'pid': os.getpid()}
+        elif ruta == '/plan':
+            consulta = {clave: valores[-1] for clave, valores in parse_qs(partes.query).items()}
+            respuesta = _plan_json(_plan(consulta))
+        elif ruta == '/planes':
+            consultas = _cuerpo_json(cuerpo).get('consultas')
+            if not isinstance(consultas, list):
+                raise ErrorSolicitud("Falta la lista 'consultas'")
+            respuesta = {'planes': [_plan_json(_plan(c)) for c in consultas]}
+        else:
+            respuesta = evaluar_solicitud(_cuerpo_json(cuerpo), lote_unico=ruta == '/evaluar')
+    except ValueError as error:
+        return 400, _codificar({'error': str(error)})
+    return 200, _codificar(respuesta)
+
+
+def _codificar(datos):
+    return json.dumps(datos, ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+
+def _calentar():
+    """Inicializador de los procesos: importa y ejercita el núcleo una vez"""
+    procesar('POST', '/evaluar', b'{"pesos": [1, 2, 3], "lim_inf": 0, "lim_sup": 4, "k": 1}')
+
+
+# ============================================================
+# SERVIDOR
+# ============================================================
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'NawiKuychi'
+    # Encabezados y cuerpo salen en dos escrituras: sin esto, Nagle y el ACK
+    # diferido del cliente agregan ~40 ms a cada respuesta en keep-alive
+    disable_nagle_algorithm = True
+
+    def _responder(self, estado, datos):
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _atender(self, metodo):
+        try:
+            largo = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            largo = -1
+        if largo < 0:
+            # Sin un largo válido no se sabe dónde termina el cuerpo
+            self.close_connection = True
+            self._responder(400, _codificar({'error': "Content-Length inválido"}))
+            return
+        if largo > MAXIMO_CUERPO:
+            self.close_connection = True
+            self._responder(413, _codificar({'error': "Cuerpo demasiado grande"}))
+            return
+        cuerpo = self.rfile.read(largo) if largo else b''
+        self._responder(*self.server.ejecutar(metodo, self.path, cuerpo))
+
+    def do_GET(self):
+        self._atender('GET')
+
+    def do_POST(self):
+        self._atender('POST')
+
+    def log_message(self, formato, *args):
+        if self.server.registrar_accesos:
+            super().log_message(formato, *args)
+
+
+class ServidorAPI(ThreadingHTTPServer):
+    """Servidor HTTP con un hilo por conexión y un pool de procesos para el cálculo"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', puerto=PUERTO_PREDETERMINADO,
+                 trabajadores=None, registrar_accesos=False):
+        super().__init__((host, puerto), _Manejador)
+        self.registrar_accesos = registrar_accesos
+        self.trabajadores = TRABAJADORES_PREDETERMINADOS if trabajadores is None else trabajadores
+        self.pool = None
+        if self.trabajadores > 0:
+            self.pool = ProcessPoolExecutor(max_workers=self.trabajadores,
+                                            mp_context=get_context('spawn'),
+                                            initializer=_calentar)
+
+    def ejecutar(self, metodo, ruta, cuerpo):
+        try:
+            # Las consultas GET son búsquedas en tablas: no vale la pena el viaje al pool
+            if self.pool is None or metodo == 'GET':
+                return procesar(metodo, ruta, cuerpo)
+            return self.pool.submit(procesar, metodo, ruta, cuerpo).result()
+        except Exception as error:
+            self._informar_error(metodo, ruta, error)
+            return 500, _codificar({'error': "Error interno del servidor"})
+
+    def _informar_error(self, metodo, ruta, error):
+        sys.stderr.write(f"Error en {metodo} {ruta}: {type(error).__name__}: {error}\n")
+
+    def server_close(self):
+        super().server_close()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+
+def iniciar_en_hilo(**opciones):
+    """Levanta el servidor en un hilo de fondo; devuelve (servidor, hilo)"""
+    servidor = ServidorAPI(**opciones)
+    hilo = threading.Thread(target=servidor.serve_forever, name='api-nawi', daemon=True)
+    hilo.start()
+    return servidor, hilo
@@ -0,0 +1,246 @@
+"""Archivo de auditoría de pesajes: columnas binarias de solo agregado.
+
+Un directorio con un archivo por columna, todos de ancho fijo:
+
+- ``pesos.f8``: todos los pesos, lote tras lote (float64).
+- ``offsets.i8``: inicio de cada lote en ``pesos.f8`` (int64).
+- una columna por metadato del lote: id en el historial, fecha
+  (microsegundos desde la época), nominal, límites, k, decisión, y
+  producto y estación como códigos de un diccionario.
+- ``manifiesto.json``: tipos de las columnas, diccionarios y cuántos
+  lotes y pesos están confirmados.
+
+Agregar escribe primero al final de las columnas y recién después
+reemplaza el manifiesto de forma atómica: si el proceso muere a mitad de
+camino, los bytes de más se ignoran y se recortan en el próximo agregado.
+Nunca se reescribe un lote ya confirmado.
+
+La lectura es por `numpy.memmap` hasta lo confirmado: `lotes(desde,
+hasta)` devuelve vistas sin copia, de modo que reanalizar o graficar un
+rango de lotes solo trae a memoria las páginas de ese rango.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+RUTA_PREDETERMINADA = os.environ.get('NAWI_ARCHIVO', 'nawi_archivo')
+
+MANIFIESTO = 'manifiesto.json'
+COLUMNA_PESOS = 'pesos'
+COLUMNA_OFFSETS = 'offsets'
+# Metadatos por lote y su tipo en disco (little-endian)
+COLUMNAS_LOTE = {
+    'lote_id': '<i8',
+    'fecha': '<i8',
+    'producto': '<i4',
+    'estacion': '<i4',
+    'nominal': '<f8',
+    'lim_inf': '<f8',
+    'lim_sup': '<f8',
+    'k': '<f8',
+    'decision': '<i1',
+}
+DICCIONARIOS = ('producto', 'estacion')
+TIPOS = dict(COLUMNAS_LOTE, **{COLUMNA_PESOS: '<f8', COLUMNA_OFFSETS: '<i8'})
+LOTES_POR_TANDA = 5000
+
+
+def _microsegundos(fecha):
+    if isinstance(fecha, str):
+        fecha = datetime.fromisoformat(fecha)
+    return int(round(fecha.timestamp() * 1_000_000))
+
+
+def _numero(valor):
+    return float('nan') if valor is None else float(valor)
+
+
+class ArchivoPesajes:
+    """Archivo columnar de solo agregado; un proceso escribe y cualquiera lee"""
+
+    def __init__(self, directorio=RUTA_PREDETERMINADA):
+        self.directorio = str(directorio)
+        os.makedirs(self.directorio, exist_ok=True)
+        self._candado = threading.RLock()
+        self._mapas = {}
+        self._leer_manifiesto()
+
+    def _ruta(self, columna):
+        return os.path.join(self.directorio, f"{columna}.{TIPOS[columna][1:]}")
+
+    def _leer_manifiesto(self):
+        try:
+            with open(os.path.join(self.directorio, MANIFIESTO), encoding='utf-8') as archivo:
+                manifiesto = json.load(archivo)
+        except FileNotFoundError:
+            manifiesto = {'lotes': 0, 'pesos': 0, 'tipos': TIPOS, 'fechas_crecientes': True,
+                          'diccionarios': {d: [] for d in DICCIONARIOS}}
+        if manifiesto['tipos'] != TIPOS:
+            raise ValueError(f"{self.directorio}: el archivo usa otro formato de columnas")
+        self._manifiesto = manifiesto
+        self._codigos = {d: {v: i for i, v in enumerate(manifiesto['diccionarios'][d])}
+                         for d in DICCIONARIOS}
+
+    def _escribir_manifiesto(self):
+        ruta = os.path.join(self.directorio, MANIFIESTO)
+        temporal = ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(self._manifiesto, archivo, ensure_ascii=False)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+
+    def __len__(self):
+        return self._manifiesto['lotes']
+
+    @property
+    def total_pesos(self):
+        return self._manifiesto['pesos']
+
+    @property
+    def ultimo_id(self):
+        """Id en el historial del último lote archivado (0 si está vacío)"""
+        return int(self.columna('lote_id')[-1]) if len(self) else 0
+
+    def diccionario(self, columna):
+        return list(self._manifiesto['diccionarios'][columna])
+
+    # --------------------------------------------------------
+    # Escritura
+    # --------------------------------------------------------
+    def _codigo(self, columna, valor):
+        codigos = self._codigos[columna]
+        valor = valor or ''
+        if valor not in codigos:
+            codigos[valor] = len(codigos)
+            self._manifiesto['diccionarios'][columna].append(valor)
+        return codigos[valor]
+
+    def _anexar(self, columna, valores, confirmados):
+        with open(self._ruta(columna), 'ab') as archivo:
+            # Descarta lo que haya quedado de un agregado interrumpido
+            archivo.truncate(confirmados * np.dtype(TIPOS[columna]).itemsize)
+            archivo.write(np.ascontiguousarray(valores, dtype=TIPOS[columna]).tobytes())
+            archivo.flush()
+            os.fsync(archivo.fileno())
+
+    def agregar(self, lotes):
+        """Agrega lotes (RegistroLote o diccionarios con los mismos campos y `lote_id`)"""
+        lotes = [lote._asdict() if hasattr(lote, '_asdict') else lote for lote in lotes]
+        if not lotes:
+            return 0
+        with self._candado:
+            n_lotes, n_pesos = len(self), self.total_pesos
+            pesos = [np.asarray(lote['pesos'], dtype='<f8') for lote in lotes]
+            tamanos = np.fromiter((len(p) for p in pesos), dtype=np.int64, count=len(pesos))
+            offsets = n_pesos + np.concatenate([[0], np.cumsum(tamanos[:-1])])
+            ahora = datetime.now()
+            columnas = {
+                'lote_id': [lote.get('lote_id') or 0 for lote in lotes],
+                'fecha': [_microsegundos(lote.get('fecha') or ahora) for lote in lotes],
+                'producto': [self._codigo('producto', lote.get('producto')) for lote in lotes],
+                'estacion': [self._codigo('estacion', lote.get('estacion')) for lote in lotes],
+                'decision': [lote['decision'] for lote in lotes],
+            }
+            for campo in ('nominal', 'lim_inf', 'lim_sup', 'k'):
+                columnas[campo] = [_numero(lote.get(campo)) for lote in lotes]
+
+            fechas = np.array(columnas['fecha'], dtype=np.int64)
+            if n_lotes:
+                fechas = np.concatenate([[int(self.columna('fecha')[-1])], fechas])
+            if np.any(np.diff(fechas) < 0):
+                self._manifiesto['fechas_crecientes'] = False
+
+            self._anexar(COLUMNA_PESOS, np.concatenate(pesos), n_pesos)
+            self._anexar(COLUMNA_OFFSETS, offsets, n_lotes)
+            for columna, valores in columnas.items():
+                self._anexar(columna, valores, n_lotes)
+            self._manifiesto['lotes'] = n_lotes + len(lotes)
+            self._manifiesto['pesos'] = n_pesos + int(tamanos.sum())
+            self._escribir_manifiesto()
+        return len(lotes)
+
+    def sincronizar(self, historial, tamano_tanda=LOTES_POR_TANDA):
+        """Archiva los lotes del historial con id mayor al último archivado.
+
+        Todo bajo el candado: dos sesiones que sincronizan a la vez no leen
+        el mismo último id ni archivan dos veces los mismos lotes.
+        """
+        agregados = 0
+        tanda = []
+        with self._candado:
+            for (lote_id, fecha, producto, estacion, nominal, lim_inf, lim_sup, k, decision,
+                 pesos) in historial.pesajes(despues_de_id=self.ultimo_id):
+                tanda.append({'lote_id': lote_id, 'fecha': fecha, 'producto': producto,
+                              'estacion': estacion, 'nominal': nominal, 'lim_inf': lim_inf,
+                              'lim_sup': lim_sup, 'k': k, 'decision': decision,
+                              'pesos': np.frombuffer(pesos, dtype='<f8')})
+                if len(tanda) >= tamano_tanda:
+                    agregados += self.agregar(tanda)
+                    tanda = []
+            return agregados + self.agregar(tanda)
+
+    # --------------------------------------------------------
+    # Lectura (sin copia)
+    # --------------------------------------------------------
+    def recargar(self):
+        """Relee el manifiesto (para ver lo que agregó otro proceso)"""
+        with self._candado:
+            self._leer_manifiesto()
+
+    def columna(self, nombre):
+        """Columna completa confirmada como memmap de solo lectura"""
+        cantidad = self.total_pesos if nombre == COLUMNA_PESOS else len(self)
+        mapa = self._mapas.get(nombre)
+        if mapa is None or len(mapa) != cantidad:
+            if cantidad == 0:
+                return np.empty(0, dtype=TIPOS[nombre])
+            mapa = np.memmap(self._ruta(nombre), dtype=TIPOS[nombre], mode='r',
+                             shape=(cantidad,))
+            self._mapas[nombre] = mapa
+        return mapa
+
+    def lote(self, i):
+        """Pesos del lote i (posición en el archivo) como vista"""
+        offsets = self.columna(COLUMNA_OFFSETS)
+        fin = offsets[i + 1] if i + 1 < len(self) else self.total_pesos
+        return self.columna(COLUMNA_PESOS)[offsets[i]:fin]
+
+    def lotes(self, desde=0, hasta=None):
+        """(pesos planos, offsets desde 0 con el final incluido, metadatos) de los lotes
+        en [desde, hasta); los pesos y metadatos son vistas del memmap"""
+        hasta = len(self) if hasta is None else min(hasta, len(self))
+        desde = min(desde, hasta)
+        offsets = self.columna(COLUMNA_OFFSETS)
+        inicio = int(offsets[desde]) if desde < len(self) else self.total_pesos
+        fin = int(offsets[hasta]) if hasta < len(self) else self.total_pesos
+        relativos = np.empty(hasta - desde + 1, dtype=np.int64)
+        relativos[:-1] = offsets[desde:hasta] - inicio
+        relativos[-1] = fin - inicio
+        metadatos = {nombre: self.columna(nombre)[desde:hasta] for nombre in COLUMNAS_LOTE}
+        return self.columna(COLUMNA_PESOS)[inicio:fin], relativos, metadatos
+
+    def posiciones(self, desde=None, hasta=None):
+        """Rango [i, j) de lotes con fecha en [desde, hasta) (datetime).
+
+        Con fechas crecientes es una búsqueda binaria; si algún lote se
+        registró con una fecha anterior, es el menor rango que contiene a
+        todos los lotes de ese período.
+        """
+        fechas = self.columna('fecha')
+        inferior = None if desde is None else _microsegundos(desde)
+        superior = None if hasta is None else _microsegundos(hasta)
+        if self._manifiesto['fechas_crecientes']:
+            i = 0 if inferior is None else int(np.searchsorted(fechas, inferior))
+            j = len(self) if superior is None else int(np.searchsorted(fechas, superior))
+            return i, j
+        dentro = np.ones(len(fechas), dtype=bool)
+        if inferior is not None:
+            dentro &= fechas >= inferior
+        if superior is not None:
+            dentro &= fechas < superior
+        indices = np.flatnonzero(dentro)
+        return (int(indices[0]), int(indices[-1]) + 1) if len(indices) else (0, 0)
@@ -0,0 +1,341 @@
+"""Ingesta asíncrona de pesos desde balanzas por puerto serie o TCP.
+
+Las balanzas envían una lectura por línea (protocolo de línea de texto,
+p. ej. ``ST,GS,+00100.25 g``). `ServicioIngesta` ejecuta un bucle asyncio
+en un hilo propio (o en un `BucleIngesta` compartido entre servicios),
+lee de varias balanzas a la vez y va llenando una
+`MuestraEnCurso` que la interfaz consulta en cada rerun. Para probar todo
+sin hardware, `servir_simulador` levanta una balanza TCP local que emite
+pesos con la distribución de `generar_pesos_aleatorios`.
+
+El puerto serie requiere el paquete opcional ``pyserial-asyncio``.
+"""
+import asyncio
+import itertools
+import re
+import threading
+import weakref
+from typing import NamedTuple
+
+import numpy as np
+
+from .simulacion import generar_pesos_aleatorios
+
+# Lecturas inestables que las balanzas marcan con "US" (unstable)
+_PATRON_INESTABLE = re.compile(r'\bUS\b')
+_PATRON_NUMERO = re.compile(r'[-+]?\s*\d+(?:[.,]\d+)?')
+
+ESPERA_RECONEXION_MAX = 10.0
+
+
+def interpretar_linea(linea):
+    """Extrae el peso de una línea de la balanza.
+
+    Devuelve None para líneas vacías, inestables o sin número.
+    """
+    if isinstance(linea, bytes):
+        linea = linea.decode('ascii', errors='ignore')
+    linea = linea.strip()
+    if not linea or _PATRON_INESTABLE.search(linea):
+        return None
+    coincidencia = _PATRON_NUMERO.search(linea)
+    if coincidencia is None:
+        return None
+    return float(coincidencia.group().replace(' ', '').replace(',', '.'))
+
+
+def formatear_linea(peso, estable=True):
+    """Línea en el formato de balanza que emite el simulador"""
+    return f"{'ST' if estable else 'US'},GS,{peso:+09.2f} g\r\n"
+
+
+# ============================================================
+# MUESTRA EN CURSO
+# ============================================================
+# Generaciones únicas en el proceso: una muestra nueva nunca repite la de otra
+_GENERACIONES = itertools.count(1)
+
+
+class MuestraEnCurso:
+    """Muestra de n pesos que se llena a medida que llegan lecturas.
+
+    Es segura entre hilos: el bucle de ingesta escribe y el hilo de
+    Streamlit lee.
+    """
+
+    def __init__(self, n=0):
+        self._candado = threading.Lock()
+        self.reiniciar(n)
+
+    def reiniciar(self, n):
+        """Vacía la muestra para n pesos; `version` sigue creciendo.
+
+        `version` cambia con cada peso; `generacion` solo al reiniciar, así
+        que mientras no cambie los pesos nuevos se agregan al final.
+        """
+        with self._candado:
+            self.n = n
+            self._pesos = []
+            self._fuentes = []
+            self.version = getattr(self, 'version', 0) + 1
+            self.generacion = next(_GENERACIONES)
+
+    def agregar(self, peso, fuente=''):
+        """Agrega un peso; devuelve False si la muestra ya está completa"""
+        with self._candado:
+            if len(self._pesos) >= self.n:
+                return False
+            self._pesos.append(peso)
+            self._fuentes.append(fuente)
+            self.version += 1
+            return True
+
+    def pesos(self, desde=0):
+        """Copia de los pesos recibidos a partir de la posición `desde`"""
+        with self._candado:
+            return self._pesos[desde:]
+
+    def fuentes(self):
+        with self._candado:
+            return list(self._fuentes)
+
+    @property
+    def cantidad(self):
+        with self._candado:
+            return len(self._pesos)
+
+    @property
+    def completa(self):
+        with self._candado:
+            return self.n > 0 and len(self._pesos) >= self.n
+
+
+# ============================================================
+# LECTORES DE BALANZAS
+# ============================================================
+class ConfigBalanza(NamedTuple):
+    """Conexión de una balanza: tipo 'tcp' (host, puerto) o 'serial' (dispositivo, baudios)"""
+    nombre: str
+    tipo: str
+    direccion: str
+    puerto: int
+
+
+async def _abrir(config):
+    """Abre la conexión y devuelve un StreamReader"""
+    if config.tipo == 'tcp':
+        lector, escritor = await asyncio.open_connection(config.direccion, config.puerto)
+        return lector, escritor
+    if config.tipo == 'serial':
+        try:
+            import serial_asyncio
+        except ImportError as exc:
+            raise RuntimeError(
+                "Para leer por puerto serie instale pyserial-asyncio") from exc
+        return await serial_asyncio.open_serial_connection(
+            url=config.direccion, baudrate=config.puerto)
+    raise ValueError(f"Tipo de balanza desconocido: {config.tipo}")
+
+
+async def leer_balanza(config, muestra, estado):
+    """Lee líneas de una balanza y agrega los pesos a la muestra.
+
+    Reintenta la conexión con espera exponencial hasta que se cancele la
+    tarea. `estado` es un diccionario donde se publica la situación de la
+    balanza para la interfaz.
+    """
+    espera = 0.5
+    while True:
+        try:
+            lector, escritor = await _abrir(config)
+        except (OSError, RuntimeError) as exc:
+            estado[config.nombre] = f"sin conexión ({exc})"
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, ESPERA_RECONEXION_MAX)
+            continue
+
+        estado[config.nombre] = "conectada"
+        espera = 0.5
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                peso = interpretar_linea(linea)
+                if peso is not None:
+                    muestra.agregar(peso, config.nombre)
+        except OSError as exc:
+            estado[config.nombre] = f"desconectada ({exc})"
+        else:
+            estado[config.nombre] = "desconectada"
+        finally:
+            escritor.close()
+        await asyncio.sleep(espera)
+
+
+# ============================================================
+# SIMULADOR DE BALANZA
+# ============================================================
+async def servir_simulador(nominal, lim_inf, lim_sup, host='127.0.0.1', puerto=0,
+                           intervalo=0.2, inestables=0.1):
+    """Levanta una balanza TCP simulada y devuelve el asyncio.Server.
+
+    Cada cliente recibe una lectura cada `intervalo` segundos con pesos
+    de `generar_pesos_aleatorios`; una fracción `inestables` de las líneas
+    llega marcada como inestable, como en una balanza real. Con puerto=0
+    el sistema asigna uno libre (ver `server.sockets[0].getsockname()`).
+    """
+    async def atender(_lector, escritor):
+        rng = np.random.default_rng()
+        try:
+            while True:
+                peso = float(generar_pesos_aleatorios(1, nominal, lim_inf, lim_sup,
+                                                      semilla=rng)[0])
+                estable = rng.random() >= inestables
+                escritor.write(formatear_linea(peso, estable).encode('ascii'))
+                await escritor.drain()
+                await asyncio.sleep(intervalo)
+        except (ConnectionError, asyncio.CancelledError):
+            # Terminar sin propagar la cancelación: en Python 3.11 asyncio
+            # registra un error espurio si la tarea del cliente termina cancelada
+            pass
+        finally:
+            escritor.close()
+
+    return await asyncio.start_server(atender, host, puerto)
+
+
+# ============================================================
+# SERVICIO DE INGESTA
+# ============================================================
+class BucleIngesta:
+    """Bucle asyncio en un hilo propio, que pueden compartir varios servicios"""
+
+    def __init__(self):
+        self._bucle = asyncio.new_event_loop()
+        self._hilo = threading.Thread(target=self._bucle.run_forever,
+                                      name='nawi-ingesta', daemon=True)
+        self._hilo.start()
+
+    @property
+    def activo(self):
+        return self._hilo.is_alive()
+
+    def ejecutar(self, corrutina, espera=5.0):
+        """Ejecuta una corrutina en el bucle y espera su resultado"""
+        return asyncio.run_coroutine_threadsafe(corrutina, self._bucle).result(espera)
+
+    def llamar(self, funcion):
+        self._bucle.call_soon_threadsafe(funcion)
+
+    def cerrar(self):
+        """Cancela todo lo pendiente y detiene el hilo"""
+        async def apagar():
+            pendientes = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for tarea in pendientes:
+                tarea.cancel()
+            await asyncio.gather(*pendientes, return_exceptions=True)
+
+        self.ejecutar(apagar())
+        self._bucle.call_soon_threadsafe(self._bucle.stop)
+        self._hilo.join(timeout=5.0)
+        self._bucle.close()
+
+
+class ServicioIngesta:
+    """Lee varias balanzas a la vez y llena una muestra.
+
+    Con `bucle` (un BucleIngesta) usa ese hilo en lugar de crear uno
+    propio: así muchas sesiones de la interfaz comparten un solo hilo.
+    """
+
+    def __init__(self, muestra=None, bucle=None):
+        self.muestra = muestra if muestra is not None else MuestraEnCurso()
+        self.estado = {}
+        self._propio = bucle is None
+        self._bucle = BucleIngesta() if bucle is None else bucle
+        self._tareas = {}
+        self._servidores = {}
+        if not self._propio:
+            # Si el servicio se descarta sin cerrar (la sesión terminó), sus
+            # lecturas no deben quedar vivas en el bucle compartido
+            weakref.finalize(self, _liberar, self._bucle, self._tareas, self._servidores)
+
+    @property
+    def activo(self):
+        return self._bucle.activo
+
+    def conectar(self, config):
+        """Empieza a leer la balanza (reemplaza una anterior con el mismo nombre)"""
+        self.desconectar(config.nombre)
+
+        async def crear():
+            return asyncio.ensure_future(leer_balanza(config, self.muestra, self.estado))
+
+        self.estado[config.nombre] = "conectando"
+        self._tareas[config.nombre] = self._bucle.ejecutar(crear())
+
+    def desconectar(self, nombre):
+        tarea = self._tareas.pop(nombre, None)
+        if tarea is not None:
+            self._bucle.llamar(tarea.cancel)
+        self.estado.pop(nombre, None)
+
+    def iniciar_simulador(self, nominal, lim_inf, lim_sup, intervalo=0.2):
+        """Levanta un simulador local y conecta una balanza a él"""
+        self.detener_simulador()
+        simulador = self._servidores['simulador'] = self._bucle.ejecutar(
+            servir_simulador(nominal, lim_inf, lim_sup, intervalo=intervalo))
+        host, puerto = simulador.sockets[0].getsockname()[:2]
+        config = ConfigBalanza('simulador', 'tcp', host, puerto)
+        self.conectar(config)
+        return config
+
+    def detener_simulador(self):
+        simulador = self._servidores.pop('simulador', None)
+        if simulador is not None:
+            self.desconectar('simulador')
+            self._bucle.llamar(simulador.close)
+
+    def cerrar(self):
+        """Cancela las lecturas de este servicio y su simulador; detiene el bucle si es propio"""
+        if self._propio:
+            self._bucle.cerrar()
+        else:
+            tareas = list(self._tareas.values())
+            servidores = list(self._servidores.values())
+
+            async def apagar():
+                for servidor in servidores:
+                    servidor.close()
+                for tarea in tareas:
+                    tarea.cancel()
+                await asyncio.gather(*tareas, return_exceptions=True)
+
+            self._bucle.ejecutar(apagar())
+        self._tareas.clear()
+        self._servidores.clear()
+        self.estado.clear()
+
+
+def _liberar(bucle, tareas, servidores):
+    """Cancela lecturas y cierra servidores de un servicio descartado"""
+    if not bucle.activo:
+        return
+    for servidor in servidores.values():
+        bucle.llamar(servidor.close)
+    for tarea in tareas.values():
+        bucle.llamar(tarea.cancel)
+
+
+def parsear_balanza(texto, nombre=None):
+    """Interpreta 'host:puerto' (TCP) o 'serial:/dev/ttyUSB0@9600'"""
+    texto = texto.strip()
+    if texto.startswith('serial:'):
+        dispositivo, _, baudios = texto[len('serial:'):].partition('@')
+        return ConfigBalanza(nombre or dispositivo, 'serial', dispositivo, int(baudios or 9600))
+    host, _, puerto = texto.rpartition(':')
+    if not host:
+        raise ValueError(f"Balanza inválida: {texto!r} (use host:puerto o serial:dispositivo@baudios)")
+    return ConfigBalanza(nombre or texto, 'tcp', host, int(puerto))
+
@@ -0,0 +1,170 @@
+"""Catálogo de productos (SKU) con su especificación y plan de muestreo.
+
+Cada SKU guarda peso nominal, límites, nivel de inspección y NCA. El
+catálogo se persiste en la misma base SQLite del historial (tabla
+`productos`) y se mantiene completo en memoria: cambiar de producto en la
+interfaz no consulta la base.
+
+El plan (letra, n, k) se resuelve una sola vez por (SKU, tamaño de lote,
+tipo de inspección) y queda en caché hasta que cambia la especificación
+del SKU.
+"""
+import math
+import sqlite3
+import threading
+from typing import NamedTuple
+
+from .conmutacion import INSPECCION_NORMAL, plan_para_inspeccion
+from .historial import RUTA_PREDETERMINADA
+from .planes import AQL_KEYS, NIVELES
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS productos (
+    sku         TEXT    PRIMARY KEY,
+    descripcion TEXT    NOT NULL DEFAULT '',
+    nominal     REAL    NOT NULL,
+    lim_inf     REAL    NOT NULL,
+    lim_sup     REAL    NOT NULL,
+    nivel       TEXT    NOT NULL,
+    aql         TEXT    NOT NULL
+);
+"""
+
+COLUMNAS_PRODUCTO = ('sku', 'descripcion', 'nominal', 'lim_inf', 'lim_sup', 'nivel', 'aql')
+
+
+class ErrorCatalogo(ValueError):
+    """Especificación de producto inválida"""
+
+
+class Especificacion(NamedTuple):
+    """Especificación de un producto del catálogo"""
+    sku: str
+    nominal: float
+    lim_inf: float
+    lim_sup: float
+    nivel: str = 'II'
+    aql: str = '1'
+    descripcion: str = ''
+
+
+def validar_especificacion(especificacion):
+    """Devuelve la especificación normalizada o lanza ErrorCatalogo"""
+    sku = str(especificacion.sku or '').strip()
+    if not sku:
+        raise ErrorCatalogo("El SKU no puede estar vacío")
+    try:
+        nominal, lim_inf, lim_sup = (float(especificacion.nominal), float(especificacion.lim_inf),
+                                     float(especificacion.lim_sup))
+    except (TypeError, ValueError):
+        raise ErrorCatalogo(f"{sku}: peso nominal y límites deben ser números") from None
+    if not all(math.isfinite(v) for v in (nominal, lim_inf, lim_sup)):
+        raise ErrorCatalogo(f"{sku}: peso nominal y límites deben ser números")
+    if not lim_inf < lim_sup:
+        raise ErrorCatalogo(f"{sku}: el límite inferior debe ser menor que el superior")
+    if especificacion.nivel not in NIVELES:
+        raise ErrorCatalogo(f"{sku}: nivel de inspección desconocido: {especificacion.nivel}")
+    aql = str(especificacion.aql)
+    if aql not in AQL_KEYS:
+        raise ErrorCatalogo(f"{sku}: NCA desconocido: {aql}")
+    return Especificacion(sku, nominal, lim_inf, lim_sup, especificacion.nivel, aql,
+                          str(especificacion.descripcion or '').strip())
+
+
+class CatalogoProductos:
+    """Catálogo en memoria respaldado por SQLite; seguro entre hilos"""
+
+    def __init__(self, ruta=RUTA_PREDETERMINADA):
+        self.ruta = str(ruta)
+        self._candado = threading.Lock()
+        self._planes = {}
+        conexion = self._conectar()
+        try:
+            conexion.executescript(_ESQUEMA)
+            filas = conexion.execute(
+                f"SELECT {', '.join(COLUMNAS_PRODUCTO)} FROM productos ORDER BY sku").fetchall()
+        finally:
+            conexion.close()
+        self._productos = {
+            fila[0]: Especificacion(sku=fila[0], descripcion=fila[1], nominal=fila[2],
+                                    lim_inf=fila[3], lim_sup=fila[4], nivel=fila[5], aql=fila[6])
+            for fila in filas
+        }
+
+    def _conectar(self):
+        # Las escrituras son raras: una conexión corta por operación
+        conexion = sqlite3.connect(self.ruta, timeout=30)
+        conexion.execute('PRAGMA journal_mode=WAL')
+        return conexion
+
+    def __len__(self):
+        return len(self._productos)
+
+    def __contains__(self, sku):
+        return sku in self._productos
+
+    def skus(self):
+        with self._candado:
+            return sorted(self._productos)
+
+    def especificacion(self, sku):
+        return self._productos.get(sku)
+
+    def especificaciones(self):
+        with self._candado:
+            return [self._productos[sku] for sku in sorted(self._productos)]
+
+    def guardar(self, especificaciones):
+        """Inserta o actualiza varios SKU en una sola transacción"""
+        validas = [validar_especificacion(e) for e in especificaciones]
+        with self._candado:
+            conexion = self._conectar()
+            try:
+                with conexion:
+                    conexion.executemany(
+                        f"INSERT OR REPLACE INTO productos ({', '.join(COLUMNAS_PRODUCTO)})"
+                        " VALUES (?,?,?,?,?,?,?)",
+                        [(e.sku, e.descripcion, e.nominal, e.lim_inf, e.lim_sup, e.nivel, e.aql)
+                         for e in validas],
+                    )
+            finally:
+                conexion.close()
+            for e in validas:
+                if self._productos.get(e.sku) != e:
+                    self._productos[e.sku] = e
+                    self._descartar_planes(e.sku)
+        return validas
+
+    def eliminar(self, skus):
+        skus = list(skus)
+        with self._candado:
+            conexion = self._conectar()
+            try:
+                with conexion:
+                    conexion.executemany("DELETE FROM productos WHERE sku = ?",
+                                         [(sku,) for sku in skus])
+            finally:
+                conexion.close()
+            for sku in skus:
+                self._productos.pop(sku, None)
+                self._descartar_planes(sku)
+
+    def _descartar_planes(self, sku):
+        for clave in [c for c in self._planes if c[0] == sku]:
+            del self._planes[clave]
+
+    def plan(self, sku, tam_lote, inspeccion=INSPECCION_NORMAL):
+        """Plan del SKU para el tamaño de lote e inspección (en caché); None si no hay"""
+        clave = (sku, int(tam_lote), inspeccion)
+        try:
+            return self._planes[clave]
+        except KeyError:
+            pass
+        with self._candado:
+            especificacion = self._productos.get(sku)
+            if especificacion is None:
+                raise KeyError(f"SKU no registrado en el catálogo: {sku}")
+            plan = plan_para_inspeccion(inspeccion, especificacion.nivel, int(tam_lote),
+                                        especificacion.aql)
+            self._planes[clave] = plan
+            return plan
@@ -0,0 +1,398 @@
+"""Interfaz de línea de comandos para evaluar lotes sin la interfaz web.
+
+Ejemplos:
+
+    python -m nawi plan --nivel II --tam-lote 1000 --aql 1
+    python -m nawi evaluar lote1.csv lote2.csv --nivel II --tam-lote 1000 \\
+        --aql 1 --lim-inf 98 --lim-sup 102
+    python -m nawi tiempo-importacion --presupuesto-ms 300
+    python -m nawi simular-balanza --puerto 4001
+    python -m nawi simular-lotes --lotes 1000000 --tam-lote 1000 --escenario bimodal \
+        --semilla 7
+    python -m nawi api --puerto 8600 --trabajadores 4
+    python -m nawi archivar --historial nawi_historial.db --archivo nawi_archivo
+    python -m nawi reevaluar --archivo nawi_archivo --desde 2026-01-01 --hasta 2026-02-01
+"""
+import argparse
+import csv
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+# Módulos del núcleo que deben importarse rápido y sin interfaz
+MODULOS_NUCLEO = ('nawi.planes', 'nawi.analisis', 'nawi.exportar', 'nawi.simulacion')
+MODULOS_PROHIBIDOS = ('streamlit', 'matplotlib', 'pandas')
+PRESUPUESTO_IMPORTACION_MS = 300.0
+
+
+def leer_lotes(rutas):
+    """Lee lotes desde archivos de texto o CSV.
+
+    Un archivo con encabezado que incluye la columna `peso` puede traer
+    varios lotes si también tiene la columna `lote`; en cualquier otro
+    caso el archivo es un solo lote con un peso por línea (o separados por
+    comas). Devuelve una lista de (identificador, [pesos]).
+    """
+    lotes = {}
+    for ruta in rutas:
+        ruta = Path(ruta)
+        with open(ruta, newline='', encoding='utf-8') as archivo:
+            filas = [fila for fila in csv.reader(archivo) if any(c.strip() for c in fila)]
+        if not filas:
+            lotes.setdefault(ruta.stem, [])
+            continue
+
+        encabezado = [c.strip().lower() for c in filas[0]]
+        if 'peso' in encabezado:
+            col_peso = encabezado.index('peso')
+            col_lote = encabezado.index('lote') if 'lote' in encabezado else None
+            for fila in filas[1:]:
+                lote = fila[col_lote].strip() if col_lote is not None else ruta.stem
+                lotes.setdefault(lote, []).append(float(fila[col_peso]))
+        else:
+            lotes.setdefault(ruta.stem, []).extend(
+                float(c) for fila in filas for c in fila if c.strip())
+    return list(lotes.items())
+
+
+def _resolver_k(args):
+    """k explícito o el del plan (nivel, tamaño de lote, NCA)"""
+    if args.k is not None:
+        return args.k, None
+    from .planes import buscar_plan
+
+    plan = buscar_plan(args.nivel, args.tam_lote, args.aql)
+    if plan is None:
+        raise SystemExit("No se encontró un rango de lote para esos datos.")
+    return plan.k, plan
+
+
+def comando_plan(args):
+    from .planes import buscar_plan
+
+    plan = buscar_plan(args.nivel, args.tam_lote, args.aql)
+    if plan is None:
+        print("No se encontró un rango de lote para esos datos.", file=sys.stderr)
+        return 1
+    print(json.dumps(plan._asdict(), ensure_ascii=False))
+    return 0
+
+
+def comando_evaluar(args):
+    import numpy as np
+
+    from .analisis import DECISION_ACEPTAR, DECISION_RECHAZAR, MENSAJES_ERROR, evaluar_lotes
+    from .normalidad import ETIQUETAS_NORMALIDAD, NORMALIDAD_RECHAZADA
+
+    k, plan = _resolver_k(args)
+    lotes = leer_lotes(args.archivos)
+    if plan is not None:
+        for lote, pesos in lotes:
+            if len(pesos) != plan.n:
+                print(f"Aviso: el lote {lote} tiene {len(pesos)} pesos y el plan "
+                      f"{plan.letra} pide n={plan.n}", file=sys.stderr)
+
+    offsets = np.cumsum([0] + [len(pesos) for _, pesos in lotes])
+    planos = np.fromiter((p for _, pesos in lotes for p in pesos), dtype=float,
+                         count=int(offsets[-1]))
+    res = evaluar_lotes(planos, args.lim_inf, args.lim_sup, k, offsets=offsets,
+                        metodo=args.metodo, cribar=True)
+
+    etiquetas = {DECISION_ACEPTAR: 'ACEPTAR', DECISION_RECHAZAR: 'RECHAZAR'}
+    rechazados = 0
+    for i, (lote, _) in enumerate(lotes):
+        codigo = int(res['codigo_error'][i])
+        decision = 'ERROR' if codigo else etiquetas.get(int(res['decision'][i]), 'INDETERMINADO')
+        rechazados += decision == 'RECHAZAR'
+        fila = {'lote': lote, 'n': int(res['n'][i]), 'decision': decision}
+        if codigo:
+            fila['mensaje'] = MENSAJES_ERROR[codigo]
+        else:
+            for clave in ('media', 'desviacion', 'Z_EI', 'Z_ES', 'pi', 'ps', 'p_total'):
+                fila[clave] = float(res[clave][i])
+            fila['k'] = k
+            fila['normalidad'] = ETIQUETAS_NORMALIDAD[int(res['normalidad'][i])]
+            fila['atipicos'] = int(res['atipicos'][i])
+
+        if args.formato == 'json':
+            print(json.dumps(fila, ensure_ascii=False))
+        else:
+            detalle = fila.get('mensaje') or f"p={fila['p_total']:.3f}% k={k}"
+            if not codigo and res['normalidad'][i] == NORMALIDAD_RECHAZADA:
+                detalle += " (no normal)"
+            if fila.get('atipicos'):
+                detalle += f" ({fila['atipicos']} atípicos)"
+            print(f"{lote}\t{fila['n']}\t{decision}\t{detalle}")
+
+    return 1 if args.estricto and rechazados else 0
+
+
+def medir_importacion(modulos=MODULOS_NUCLEO):
+    """Mide en un proceso nuevo el tiempo de importación con -X importtime.
+
+    Devuelve (milisegundos, módulos prohibidos que se llegaron a importar).
+    """
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + ', '.join(modulos)],
+        capture_output=True, text=True, check=True,
+        cwd=Path(__file__).resolve().parent.parent,
+    )
+    total_us = 0
+    cargados = set()
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _, acumulado, nombre = linea[len('import time:'):].split('|')
+        cargados.add(nombre.strip().split('.')[0])
+        # Solo las entradas de primer nivel: las anidadas ya están en su padre
+        if not nombre.startswith('  '):
+            total_us += int(acumulado)
+    return total_us / 1000, sorted(cargados & set(MODULOS_PROHIBIDOS))
+
+
+def comando_tiempo_importacion(args):
+    milisegundos, prohibidos = medir_importacion()
+    print(f"Importación del núcleo: {milisegundos:.1f} ms "
+          f"(presupuesto {args.presupuesto_ms:.0f} ms)")
+    if prohibidos:
+        print(f"Módulos de interfaz importados: {', '.join(prohibidos)}")
+    return 0 if milisegundos <= args.presupuesto_ms and not prohibidos else 1
+
+
+def comando_simular_balanza(args):
+    import asyncio
+
+    from .balanzas import servir_simulador
+
+    async def servir():
+        servidor = await servir_simulador(args.nominal, args.lim_inf, args.lim_sup,
+                                          host=args.host, puerto=args.puerto,
+                                          intervalo=args.intervalo)
+        host, puerto = servidor.sockets[0].getsockname()[:2]
+        print(f"Balanza simulada escuchando en {host}:{puerto}", flush=True)
+        async with servidor:
+            await servidor.serve_forever()
+
+    try:
+        asyncio.run(servir())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def comando_simular_lotes(args):
+    import time
+
+    import numpy as np
+
+    from .analisis import DECISION_ACEPTAR, DECISION_RECHAZAR, evaluar_lotes
+    from .simulacion import Escenario, generar_lotes_por_bloques
+
+    k, plan = _resolver_k(args)
+    n = args.n or (plan.n if plan is not None else None)
+    if n is None:
+        raise SystemExit("Indique --n cuando da --k explícito.")
+    escenario = Escenario(args.escenario, args.sigma, args.desplazamiento, args.separacion,
+                          args.proporcion)
+    salida = None
+    if args.salida is not None:
+        salida = np.lib.format.open_memmap(args.salida, mode='w+', dtype=np.float32,
+                                           shape=(args.lotes, n))
+
+    conteo = {DECISION_ACEPTAR: 0, DECISION_RECHAZAR: 0}
+    hechos = 0
+    generacion = evaluacion = 0.0
+    bloques = generar_lotes_por_bloques(args.lotes, n, args.nominal, args.lim_inf, args.lim_sup,
+                                        escenario, args.semilla)
+    while True:
+        inicio = time.perf_counter()
+        pesos = next(bloques, None)
+        generacion += time.perf_counter() - inicio
+        if pesos is None:
+            break
+        if salida is not None:
+            salida[hechos:hechos + len(pesos)] = pesos
+        inicio = time.perf_counter()
+        decision = evaluar_lotes(pesos, args.lim_inf, args.lim_sup, k,
+                                 metodo=args.metodo)['decision']
+        evaluacion += time.perf_counter() - inicio
+        for codigo in conteo:
+            conteo[codigo] += int(np.count_nonzero(decision == codigo))
+        hechos += len(pesos)
+    if salida is not None:
+        salida.flush()
+
+    resumen = {
+        'lotes': hechos, 'n': n, 'k': k, 'escenario': escenario._asdict(), 'semilla': args.semilla,
+        'aceptados': conteo[DECISION_ACEPTAR], 'rechazados': conteo[DECISION_RECHAZAR],
+        'tasa_aceptacion': conteo[DECISION_ACEPTAR] / hechos if hechos else float('nan'),
+        'generacion_lotes_s': hechos / generacion if generacion else None,
+        'evaluacion_lotes_s': hechos / evaluacion if evaluacion else None,
+    }
+    print(json.dumps(resumen, ensure_ascii=False))
+    return 0
+
+
+def comando_archivar(args):
+    from .archivo import RUTA_PREDETERMINADA, ArchivoPesajes
+    from .historial import RUTA_PREDETERMINADA as RUTA_HISTORIAL, HistorialLotes
+
+    archivo = ArchivoPesajes(args.archivo or RUTA_PREDETERMINADA)
+    historial = HistorialLotes(args.historial or RUTA_HISTORIAL)
+    try:
+        agregados = archivo.sincronizar(historial)
+    finally:
+        historial.cerrar()
+    print(json.dumps({'agregados': agregados, 'lotes': len(archivo),
+                      'pesos': archivo.total_pesos}))
+    return 0
+
+
+def comando_reevaluar(args):
+    from datetime import datetime
+
+    import numpy as np
+
+    from .analisis import evaluar_lotes
+    from .archivo import RUTA_PREDETERMINADA, ArchivoPesajes
+    from .normalidad import NORMALIDAD_RECHAZADA
+
+    archivo = ArchivoPesajes(args.archivo or RUTA_PREDETERMINADA)
+    desde = datetime.fromisoformat(args.desde) if args.desde else None
+    hasta = datetime.fromisoformat(args.hasta) if args.hasta else None
+    inicio, fin = archivo.posiciones(desde, hasta)
+    # Pesos y metadatos son vistas del memmap: solo se leen las páginas del rango
+    pesos, offsets, lotes = archivo.lotes(inicio, fin)
+    res = evaluar_lotes(pesos, lotes['lim_inf'], lotes['lim_sup'], lotes['k'],
+                        offsets=offsets, metodo=args.metodo, cribar=True)
+    distintos = np.flatnonzero(res['decision'] != lotes['decision'])
+    for i in distintos.tolist():
+        print(json.dumps({'lote_id': int(lotes['lote_id'][i]),
+                          'registrada': int(lotes['decision'][i]),
+                          'reevaluada': int(res['decision'][i])}))
+    print(json.dumps({'lotes': int(fin - inicio), 'pesos': int(len(pesos)),
+                      'distintos': int(len(distintos)),
+                      'no_normales': int(np.sum(res['normalidad'] == NORMALIDAD_RECHAZADA)),
+                      'con_atipicos': int(np.count_nonzero(res['atipicos']))}), file=sys.stderr)
+    return 1 if args.estricto and len(distintos) else 0
+
+
+def comando_api(args):
+    from .api import ServidorAPI
+
+    servidor = ServidorAPI(args.host, args.puerto, args.trabajadores,
+                           registrar_accesos=args.registrar_accesos)
+    host, puerto = servidor.server_address[:2]
+    print(f"API NAWI escuchando en http://{host}:{puerto} "
+          f"({servidor.trabajadores} proceso(s) de cálculo)", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+def _agregar_plan(parser, requerido):
+    parser.add_argument('--nivel', default='II', help="Nivel de inspección (I-V)")
+    parser.add_argument('--tam-lote', type=int, required=requerido, help="Tamaño del lote")
+    parser.add_argument('--aql', default='1', help="NCA (AQL), p. ej. 0.65 o 1")
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m nawi',
+        description="Muestreo MIL-STD-414 por variables para pesaje de ovillos",
+    )
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_plan = sub.add_parser('plan', help="Muestra el plan (letra, n, k)")
+    _agregar_plan(p_plan, requerido=True)
+    p_plan.set_defaults(funcion=comando_plan)
+
+    p_eval = sub.add_parser('evaluar', help="Evalúa lotes desde archivos")
+    p_eval.add_argument('archivos', nargs='+', help="Archivos de pesos (texto o CSV)")
+    _agregar_plan(p_eval, requerido=False)
+    p_eval.add_argument('--k', type=float, help="Valor k explícito (omite el plan)")
+    p_eval.add_argument('--lim-inf', type=float, required=True, help="Límite inferior")
+    p_eval.add_argument('--lim-sup', type=float, required=True, help="Límite superior")
+    p_eval.add_argument('--metodo', choices=['normal', 'forma2'], default='normal',
+                        help="Estimador del porcentaje defectuoso (forma2 = MIL-STD-414 Forma 2)")
+    p_eval.add_argument('--formato', choices=['tabla', 'json'], default='tabla')
+    p_eval.add_argument('--estricto', action='store_true',
+                        help="Código de salida 1 si algún lote se rechaza")
+    p_eval.set_defaults(funcion=comando_evaluar)
+
+    p_imp = sub.add_parser('tiempo-importacion',
+                           help="Verifica el presupuesto de tiempo de importación")
+    p_imp.add_argument('--presupuesto-ms', type=float, default=PRESUPUESTO_IMPORTACION_MS)
+    p_imp.set_defaults(funcion=comando_tiempo_importacion)
+
+    p_sim = sub.add_parser('simular-balanza', help="Levanta una balanza TCP simulada")
+    p_sim.add_argument('--host', default='127.0.0.1')
+    p_sim.add_argument('--puerto', type=int, default=4001)
+    p_sim.add_argument('--nominal', type=float, default=100.0)
+    p_sim.add_argument('--lim-inf', type=float, default=98.0)
+    p_sim.add_argument('--lim-sup', type=float, default=102.0)
+    p_sim.add_argument('--intervalo', type=float, default=0.2,
+                       help="Segundos entre lecturas")
+    p_sim.set_defaults(funcion=comando_simular_balanza)
+
+    p_lotes = sub.add_parser('simular-lotes',
+                             help="Genera y evalúa lotes sintéticos (prueba de carga)")
+    _agregar_plan(p_lotes, requerido=False)
+    p_lotes.add_argument('--k', type=float, help="Valor k explícito (omite el plan)")
+    p_lotes.add_argument('--n', type=int, help="Tamaño de muestra (por defecto, el del plan)")
+    p_lotes.add_argument('--lotes', type=int, default=100_000)
+    p_lotes.add_argument('--nominal', type=float, default=100.0)
+    p_lotes.add_argument('--lim-inf', type=float, default=98.0)
+    p_lotes.add_argument('--lim-sup', type=float, default=102.0)
+    p_lotes.add_argument('--escenario', choices=['normal', 'desplazado', 'bimodal'],
+                         default='normal')
+    p_lotes.add_argument('--sigma', type=float, help="σ de cada máquina (por defecto, (LS-LI)/6)")
+    p_lotes.add_argument('--desplazamiento', type=float, default=0.0,
+                         help="Corrimiento de la media, en σ")
+    p_lotes.add_argument('--separacion', type=float, default=3.0,
+                         help="Distancia entre las medias de las dos máquinas, en σ")
+    p_lotes.add_argument('--proporcion', type=float, default=0.5,
+                         help="Fracción de pesos de la primera máquina")
+    p_lotes.add_argument('--semilla', type=int, default=0)
+    p_lotes.add_argument('--metodo', choices=['normal', 'forma2'], default='normal')
+    p_lotes.add_argument('--salida', type=Path, help="Guarda los pesos en un .npy (float32)")
+    p_lotes.set_defaults(funcion=comando_simular_lotes)
+
+    p_api = sub.add_parser('api', help="Levanta el servicio HTTP/JSON de evaluación")
+    p_api.add_argument('--host', default='127.0.0.1')
+    p_api.add_argument('--puerto', type=int, default=8600)
+    p_api.add_argument('--trabajadores', type=int, default=None,
+                       help="Procesos de cálculo (0 = en los hilos del servidor; "
+                            "por defecto uno por núcleo si hay más de uno)")
+    p_api.add_argument('--registrar-accesos', action='store_true',
+                       help="Escribe una línea por solicitud en stderr")
+    p_api.set_defaults(funcion=comando_api)
+
+    p_arch = sub.add_parser('archivar',
+                            help="Agrega al archivo de auditoría los lotes nuevos del historial")
+    p_arch.add_argument('--historial', help="Base SQLite del historial (o $NAWI_HISTORIAL)")
+    p_arch.add_argument('--archivo', help="Directorio del archivo de pesajes (o $NAWI_ARCHIVO)")
+    p_arch.set_defaults(funcion=comando_archivar)
+
+    p_reev = sub.add_parser('reevaluar',
+                            help="Reevalúa lotes archivados y lista las decisiones que cambian")
+    p_reev.add_argument('--archivo', help="Directorio del archivo de pesajes (o $NAWI_ARCHIVO)")
+    p_reev.add_argument('--desde', help="Fecha inicial (ISO, inclusive)")
+    p_reev.add_argument('--hasta', help="Fecha final (ISO, exclusiva)")
+    p_reev.add_argument('--metodo', choices=['normal', 'forma2'], default='normal')
+    p_reev.add_argument('--estricto', action='store_true',
+                        help="Código de salida 1 si alguna decisión cambia")
+    p_reev.set_defaults(funcion=comando_reevaluar)
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    if args.comando in ('evaluar', 'simular-lotes') and args.k is None and args.tam_lote is None:
+        crear_parser().error(f"{args.comando} requiere --tam-lote o --k")
+    return args.funcion(args)
@@ -0,0 +1,196 @@
+"""Reglas de conmutación normal / rigurosa / reducida por producto.
+
+Máquina de estados que consume, por producto, la secuencia de decisiones
+de lote y elige el tipo de inspección del lote siguiente:
+
+- Normal → rigurosa: 2 lotes rechazados entre 5 consecutivos.
+- Rigurosa → normal: 5 lotes consecutivos aceptados.
+- Rigurosa → suspendida: 5 lotes rechazados acumulados en rigurosa.
+- Normal → reducida: 10 lotes consecutivos aceptados (si se permite).
+- Reducida → normal: un lote rechazado.
+
+Las ventanas se mantienen de forma incremental (O(1) por lote): una cola
+de los últimos 5 resultados con su cuenta de rechazos y contadores de
+rachas, sin volver a recorrer el historial.
+
+Planes: la inspección rigurosa usa la misma letra con la NCA inmediata
+más exigente (como la fila de rigurosa de la Tabla B-3 de MIL-STD-414);
+en la NCA más baja, que no tiene otra más exigente, pasa a la letra
+siguiente (muestra mayor). La reducida usa dos letras menos con la misma NCA, si esa combinación
+tiene plan. Una vez suspendida, no se propone plan hasta reanudar; las
+reanudaciones se guardan en el historial para que el estado reconstruido
+después de reiniciar sea el mismo.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+from .analisis import DECISION_ACEPTAR, DECISION_RECHAZAR
+from .planes import INDICE, PlanMuestreo
+
+INSPECCION_NORMAL = 'normal'
+INSPECCION_RIGUROSA = 'rigurosa'
+INSPECCION_REDUCIDA = 'reducida'
+INSPECCION_SUSPENDIDA = 'suspendida'
+
+VENTANA_RIGUROSA = 5
+RECHAZOS_PARA_RIGUROSA = 2
+ACEPTADOS_PARA_NORMAL = 5
+RECHAZOS_PARA_SUSPENDER = 5
+ACEPTADOS_PARA_REDUCIDA = 10
+LETRAS_MENOS_REDUCIDA = 2
+
+
+class EstadoConmutacion:
+    """Estado de inspección de un producto"""
+
+    def __init__(self, permitir_reducida=True):
+        self.permitir_reducida = permitir_reducida
+        self.inspeccion = INSPECCION_NORMAL
+        self.lotes = 0
+        self._ventana = deque(maxlen=VENTANA_RIGUROSA)
+        self._rechazos_ventana = 0
+        self._aceptados_seguidos = 0
+        self._rechazos_rigurosa = 0
+
+    def _reiniciar_rachas(self):
+        self._ventana.clear()
+        self._rechazos_ventana = 0
+        self._aceptados_seguidos = 0
+        self._rechazos_rigurosa = 0
+
+    def registrar(self, aceptado):
+        """Incorpora la decisión de un lote; devuelve la nueva inspección si cambió"""
+        self.lotes += 1
+        if self.inspeccion == INSPECCION_SUSPENDIDA:
+            return None
+
+        # Ventana de los últimos 5 lotes con su cuenta de rechazos
+        if len(self._ventana) == self._ventana.maxlen and not self._ventana[0]:
+            self._rechazos_ventana -= 1
+        self._ventana.append(aceptado)
+        if not aceptado:
+            self._rechazos_ventana += 1
+        self._aceptados_seguidos = self._aceptados_seguidos + 1 if aceptado else 0
+
+        anterior = self.inspeccion
+        if self.inspeccion == INSPECCION_NORMAL:
+            if self._rechazos_ventana >= RECHAZOS_PARA_RIGUROSA:
+                self.inspeccion = INSPECCION_RIGUROSA
+            elif self.permitir_reducida and self._aceptados_seguidos >= ACEPTADOS_PARA_REDUCIDA:
+                self.inspeccion = INSPECCION_REDUCIDA
+        elif self.inspeccion == INSPECCION_RIGUROSA:
+            if not aceptado:
+                self._rechazos_rigurosa += 1
+            if self._rechazos_rigurosa >= RECHAZOS_PARA_SUSPENDER:
+                self.inspeccion = INSPECCION_SUSPENDIDA
+            elif self._aceptados_seguidos >= ACEPTADOS_PARA_NORMAL:
+                self.inspeccion = INSPECCION_NORMAL
+        elif self.inspeccion == INSPECCION_REDUCIDA and not aceptado:
+            self.inspeccion = INSPECCION_NORMAL
+
+        if self.inspeccion != anterior:
+            self._reiniciar_rachas()
+            return self.inspeccion
+        return None
+
+    def reanudar(self):
+        """Vuelve a inspección rigurosa tras una suspensión (acción correctiva).
+
+        Devuelve True si el producto estaba suspendido.
+        """
+        if self.inspeccion != INSPECCION_SUSPENDIDA:
+            return False
+        self.inspeccion = INSPECCION_RIGUROSA
+        self._reiniciar_rachas()
+        return True
+
+
+def plan_para_inspeccion(inspeccion, nivel, tam_lote, aql):
+    """Plan normal, riguroso o reducido; None si no hay plan aplicable"""
+    plan = INDICE.plan(nivel, tam_lote, aql)
+    if plan is None or inspeccion == INSPECCION_NORMAL:
+        return plan
+    if inspeccion == INSPECCION_SUSPENDIDA:
+        return None
+
+    fila = INDICE.letras.index(plan.letra)
+    columna = INDICE.posicion_aql(plan.aql)
+    if inspeccion == INSPECCION_RIGUROSA:
+        if columna > 0:
+            columna -= 1
+        elif fila + 1 < len(INDICE.letras):
+            # No hay NCA más exigente: como la tabla rigurosa, se pasa a la
+            # letra siguiente (muestra mayor) con la misma NCA
+            fila += 1
+        else:
+            return None
+    elif inspeccion == INSPECCION_REDUCIDA:
+        fila = max(fila - LETRAS_MENOS_REDUCIDA, 0)
+    else:
+        raise ValueError(f"Inspección desconocida: {inspeccion}")
+
+    k = INDICE.matriz_k[fila, columna]
+    if np.isnan(k):
+        # Sin plan en la tabla: en reducida se mantiene el normal,
+        # en rigurosa no hay plan más exigente disponible
+        return plan if inspeccion == INSPECCION_REDUCIDA else None
+    return PlanMuestreo(
+        letra=INDICE.letras[fila],
+        n=int(INDICE.muestra[fila]),
+        k=float(k),
+        nivel=nivel,
+        aql=INDICE.aqls[columna],
+    )
+
+
+class MotorConmutacion:
+    """Estados de inspección de todos los productos; seguro entre hilos"""
+
+    def __init__(self, permitir_reducida=True):
+        self.permitir_reducida = permitir_reducida
+        self._estados = {}
+        self._candado = threading.Lock()
+
+    @classmethod
+    def desde_historial(cls, historial, permitir_reducida=True):
+        """Reconstruye los estados recorriendo una vez el historial guardado"""
+        motor = cls(permitir_reducida)
+        for producto, decision in historial.eventos_conmutacion():
+            if decision is None:
+                motor.reanudar(producto)
+            else:
+                motor.registrar(producto, decision)
+        return motor
+
+    def _estado(self, producto):
+        estado = self._estados.get(producto)
+        if estado is None:
+            estado = self._estados[producto] = EstadoConmutacion(self.permitir_reducida)
+        return estado
+
+    def registrar(self, producto, decision):
+        """Registra un código DECISION_* (los indeterminados se ignoran)"""
+        if decision not in (DECISION_ACEPTAR, DECISION_RECHAZAR):
+            return None
+        with self._candado:
+            return self._estado(producto).registrar(decision == DECISION_ACEPTAR)
+
+    def inspeccion(self, producto):
+        with self._candado:
+            estado = self._estados.get(producto)
+            return INSPECCION_NORMAL if estado is None else estado.inspeccion
+
+    def reanudar(self, producto, historial=None):
+        """Reanuda un producto suspendido; con `historial` guarda la reanudación"""
+        with self._candado:
+            reanudado = self._estado(producto).reanudar()
+            if reanudado and historial is not None:
+                historial.registrar_reanudacion(producto)
+        return reanudado
+
+    def plan_siguiente(self, producto, nivel, tam_lote, aql):
+        """(inspección, plan) que corresponde al próximo lote del producto"""
+        inspeccion = self.inspeccion(producto)
+        return inspeccion, plan_para_inspeccion(inspeccion, nivel, tam_lote, aql)
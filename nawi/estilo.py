@@ -0,0 +1,14 @@
+"""Colores corporativos de NAWI KUYCHI."""
+
+# Configuración de colores
+COLORES = {
+    'primary': '#800000',
+    'secondary': '#E9C46A',
+    'accent1': '#2A9D8F',
+    'accent2': '#E76F51',
+    'success': '#28a745',
+    'warning': '#ffc107',
+    'danger': '#dc3545',
+    'light': '#f8f9fa',
+    'dark': '#343a40'
+}
@@ -0,0 +1,176 @@
+"""Exportación de resultados del análisis (sin dependencias de interfaz).
+
+Los archivos se arman solo cuando se piden (`carga_exportacion`, pensada
+para el `data` diferido de st.download_button) y quedan en una caché LRU
+pequeña direccionada por el hash de los pesos, los resultados y el
+contexto, de modo que volver a descargar un análisis sin cambios no
+repite el trabajo.
+"""
+import csv
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+FORMATO_CSV_DATOS = 'csv_datos'
+FORMATO_CSV_RESUMEN = 'csv_resumen'
+FORMATO_JSON = 'json'
+FORMATO_PARQUET = 'parquet'
+
+# Extensión y tipo MIME de cada formato de exportación
+FORMATOS_EXPORTACION = {
+    FORMATO_CSV_DATOS: ('csv', 'text/csv'),
+    FORMATO_CSV_RESUMEN: ('csv', 'text/csv'),
+    FORMATO_JSON: ('json', 'application/json'),
+    FORMATO_PARQUET: ('parquet', 'application/vnd.apache.parquet'),
+}
+CAMPOS_RESUMEN = ('n', 'media', 'desviacion', 'Z_EI', 'Z_ES', 'pi', 'ps', 'p_total', 'k',
+                  'decision', 'codigo_decision')
+MAXIMO_CACHE = 32
+
+
+def filas_datos(pesos, resultados):
+    """Tabla de datos por muestra: encabezados y filas"""
+    encabezados = ['Muestra', 'Peso', 'Desviacion_Media']
+    filas = [
+        (i, p, p - resultados['media'])
+        for i, p in enumerate(pesos, 1)
+    ]
+    return encabezados, filas
+
+
+def filas_resumen(resultados):
+    """Tabla de resumen de la decisión: encabezados y filas"""
+    encabezados = ['Parámetro', 'Valor']
+    filas = [
+        ('Decisión', resultados['decision']),
+        ('p Total (%)', f"{resultados['p_total']:.3f}"),
+        ('Valor k', f"{resultados['k'] if resultados['k'] else 'N/A'}"),
+        ('Media', f"{resultados['media']:.3f}"),
+        ('Desviación', f"{resultados['desviacion']:.3f}"),
+        ('Z Inferior', f"{resultados['Z_EI']:.3f}"),
+        ('Z Superior', f"{resultados['Z_ES']:.3f}"),
+    ]
+    return encabezados, filas
+
+
+def a_csv(encabezados, filas):
+    """Codifica una tabla como CSV UTF-8"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    escritor.writerow(encabezados)
+    escritor.writerows(filas)
+    return buffer.getvalue().encode('utf-8')
+
+
+def csv_datos(pesos, resultados):
+    """CSV con los pesos de la muestra y su desviación respecto a la media"""
+    return a_csv(*filas_datos(pesos, resultados))
+
+
+def csv_resumen(resultados):
+    """CSV con el resumen de la decisión"""
+    return a_csv(*filas_resumen(resultados))
+
+
+def nombre_archivo(prefijo, extension, fecha=None):
+    """Nombre de archivo con marca de tiempo, p. ej. datos_nawi_20240101_120000.csv"""
+    fecha = fecha or datetime.now()
+    return f"{prefijo}_nawi_{fecha.strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+
+def _valor_json(valor):
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and not np.isfinite(valor):
+        return None
+    return valor
+
+
+def resumen_analisis(resultados):
+    """Campos numéricos y decisión del análisis como tipos de Python"""
+    return {campo: _valor_json(resultados.get(campo)) for campo in CAMPOS_RESUMEN}
+
+
+def json_analisis(pesos, resultados, contexto=None):
+    """JSON con el contexto (plan, especificación), el resumen y los pesos"""
+    documento = {
+        'contexto': {clave: _valor_json(valor) for clave, valor in (contexto or {}).items()},
+        'resumen': resumen_analisis(resultados),
+        'pesos': np.asarray(pesos, dtype=float).tolist(),
+    }
+    return json.dumps(documento, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def parquet_datos(pesos, resultados, contexto=None):
+    """Parquet con los datos por muestra; resumen y contexto van en los metadatos"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pesos = np.asarray(pesos, dtype=float)
+    tabla = pa.table({
+        'Muestra': np.arange(1, len(pesos) + 1, dtype=np.int32),
+        'Peso': pesos,
+        'Desviacion_Media': pesos - resultados['media'],
+    })
+    metadatos = json.loads(json_analisis([], resultados, contexto))
+    del metadatos['pesos']
+    tabla = tabla.replace_schema_metadata({'nawi': json.dumps(metadatos, ensure_ascii=False)})
+    buffer = io.BytesIO()
+    pq.write_table(tabla, buffer)
+    return buffer.getvalue()
+
+
+_GENERADORES = {
+    FORMATO_CSV_DATOS: lambda pesos, resultados, contexto: csv_datos(pesos, resultados),
+    FORMATO_CSV_RESUMEN: lambda pesos, resultados, contexto: csv_resumen(resultados),
+    FORMATO_JSON: json_analisis,
+    FORMATO_PARQUET: parquet_datos,
+}
+
+
+def clave_exportacion(formato, pesos, resultados, contexto=None):
+    """Hash de todo lo que determina el contenido del archivo"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(formato.encode())
+    h.update(np.ascontiguousarray(pesos, dtype='<f8').tobytes())
+    h.update(json.dumps([resumen_analisis(resultados), contexto], sort_keys=True,
+                        default=_valor_json).encode())
+    return h.hexdigest()
+
+
+class CacheExportacion:
+    """LRU de archivos ya generados, compartida entre sesiones y segura entre hilos"""
+
+    def __init__(self, maximo=MAXIMO_CACHE):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._candado = threading.Lock()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def obtener(self, clave, generar):
+        with self._candado:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                return self._datos[clave]
+        datos = generar()
+        with self._candado:
+            self._datos[clave] = datos
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+        return datos
+
+
+CACHE_EXPORTACION = CacheExportacion()
+
+
+def carga_exportacion(formato, pesos, resultados, contexto=None, cache=CACHE_EXPORTACION):
+    """Bytes del archivo en `formato`, generados una vez por contenido distinto"""
+    clave = clave_exportacion(formato, pesos, resultados, contexto)
+    return cache.obtener(clave, lambda: _GENERADORES[formato](pesos, resultados, contexto))
@@ -0,0 +1,112 @@
+"""Estimador de la Forma 2 de MIL-STD-414 (variabilidad desconocida, método S).
+
+El porcentaje defectuoso se estima con el estimador insesgado de varianza
+mínima: para el índice de calidad Q = (LS - X̄)/S (o (X̄ - LI)/S),
+
+    p = I_x(a, a),  a = (n - 2)/2,  x = max(0, 1/2 - Q·√n / (2(n - 1)))
+
+donde I_x es la beta incompleta regularizada. Para no evaluarla en cada
+lote, la primera vez que aparece un tamaño n se tabula en una malla
+uniforme de x ∈ [0, 1/2] el residuo log I_x - a·log x, que es suave y
+finito incluso en x = 0, y luego se interpola linealmente; el término
+a·log x se suma de forma exacta. Para x > 1/2 se usa la simetría
+I_x(a, a) = 1 - I_{1-x}(a, a).
+
+La beta incompleta se calcula con la fracción continua de Lentz,
+vectorizada sobre toda la malla, sin depender de SciPy.
+"""
+import math
+from functools import lru_cache
+
+import numpy as np
+
+PUNTOS_TABLA = 4097
+ITERACIONES_MAXIMAS = 1000
+_EPS = 1e-15
+_MINIMO = 1e-300
+
+
+def _fraccion_continua(a, b, x):
+    """Fracción continua de I_x(a, b) (Lentz modificado), vectorizada en x"""
+    qab, qap, qam = a + b, a + 1, a - 1
+    c = np.ones_like(x)
+    d = 1 - qab * x / qap
+    d = 1 / np.where(np.abs(d) < _MINIMO, _MINIMO, d)
+    h = d.copy()
+    for m in range(1, ITERACIONES_MAXIMAS + 1):
+        m2 = 2 * m
+        for aa in (m * (b - m) * x / ((qam + m2) * (a + m2)),
+                   -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))):
+            d = 1 + aa * d
+            d = 1 / np.where(np.abs(d) < _MINIMO, _MINIMO, d)
+            c = 1 + aa / c
+            c = np.where(np.abs(c) < _MINIMO, _MINIMO, c)
+            delta = d * c
+            h *= delta
+        if np.all(np.abs(delta - 1) < _EPS):
+            break
+    return h
+
+
+def _residuo_log(a, x):
+    """log I_x(a, a) - a·log x, suave y finita en [0, 1/2] (incluido x = 0)"""
+    x = np.asarray(x, dtype=float)
+    return (a * np.log1p(-x) - (2 * math.lgamma(a) - math.lgamma(2 * a)) - math.log(a)
+            + np.log(_fraccion_continua(a, a, x)))
+
+
+def beta_incompleta_simetrica(a, x):
+    """I_x(a, a) exacta (sin tabla) para x ∈ [0, 1]"""
+    x = np.asarray(x, dtype=float)
+    espejo = x > 0.5
+    base = np.where(espejo, 1 - x, x)
+    with np.errstate(divide='ignore'):
+        cola = np.exp(a * np.log(base) + _residuo_log(a, base))
+    return np.where(espejo, 1 - cola, cola)
+
+
+@lru_cache(maxsize=None)
+def tabla_forma2(n):
+    """(malla x, residuo log I_x - a·log x) del tamaño de muestra n, calculada una sola vez"""
+    if n < 3:
+        raise ValueError("La Forma 2 requiere n ≥ 3")
+    malla = np.linspace(0.0, 0.5, PUNTOS_TABLA)
+    residuo = _residuo_log((n - 2) / 2, malla)
+    malla.setflags(write=False)
+    residuo.setflags(write=False)
+    return malla, residuo
+
+
+def _porcentaje_tamano(Q, tamano):
+    """Porcentaje de la Forma 2 para índices Q con un mismo tamaño de muestra"""
+    x = np.clip(0.5 - 0.5 * Q * math.sqrt(tamano) / (tamano - 1), 0.0, 1.0)
+    if tamano == 2:
+        return np.where(x <= 0, 0.0, np.where(x >= 1, 100.0, 50.0))
+    malla, residuo = tabla_forma2(tamano)
+    espejo = x > 0.5
+    base = np.where(espejo, 1 - x, x)
+    with np.errstate(divide='ignore'):
+        cola = np.exp((tamano - 2) / 2 * np.log(base) + np.interp(base, malla, residuo))
+    return np.where(espejo, 1 - cola, cola) * 100
+
+
+def porcentaje_forma2(Q, n):
+    """Porcentaje estimado fuera de un límite a partir de Q y n (arreglos o escalares).
+
+    Q NaN da NaN; para n = 2 se usa el límite a → 0 (50 % si x > 0).
+    """
+    Q = np.asarray(Q, dtype=float)
+    n = np.asarray(n, dtype=np.int64)
+    if n.ndim == 0 or n.min() == n.max():
+        tamano = int(n.flat[0]) if n.size else 3
+        if tamano < 2:
+            return np.full(np.broadcast(Q, n).shape, np.nan)
+        return _porcentaje_tamano(Q, tamano) + np.zeros(n.shape)
+
+    Q, n = np.broadcast_arrays(Q, n)
+    p = np.full(Q.shape, np.nan)
+    for tamano in np.unique(n).tolist():
+        if tamano >= 2:
+            sel = n == tamano
+            p[sel] = _porcentaje_tamano(Q[sel], tamano)
+    return p
@@ -0,0 +1,275 @@
+"""Gráficos de la muestra con caché de imágenes ya renderizadas.
+
+Cada rerun de Streamlit pedía de nuevo el gráfico de dos paneles y lo
+redibujaba desde cero. `renderizar_grafico` guarda los bytes PNG/SVG ya
+codificados en una caché LRU acotada por tamaño, compartida por todas las
+sesiones del proceso y direccionada por el hash de (pesos, nominal,
+límites, media, S). Las figuras se crean con la API orientada a objetos
+(`Figure`), así que no quedan registradas en pyplot y se liberan al
+terminar de codificarse.
+"""
+import hashlib
+import struct
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.ticker import MaxNLocator
+
+from .estilo import COLORES
+
+# Mismos parámetros con los que st.pyplot codificaba la figura
+OPCIONES_GUARDADO = {'bbox_inches': 'tight', 'dpi': 200}
+TAMANO_MAXIMO_CACHE = 32 * 1024 * 1024
+
+# Modos de dibujo del gráfico de dispersión
+MODO_AUTOMATICO = 'auto'
+MODO_DETALLADO = 'detallado'
+MODO_RAPIDO = 'rapido'
+UMBRAL_MODO_RAPIDO = 50
+MAX_MARCAS_EJE_X = 20
+
+
+# ============================================================
+# GRÁFICO DE LA MUESTRA
+# ============================================================
+def colores_por_limite(pesos, lim_inf, lim_sup):
+    """Color de cada punto según su posición relativa a los límites"""
+    pesos = np.asarray(pesos, dtype=float)
+    return np.where(
+        pesos < lim_inf, COLORES['danger'],
+        np.where(pesos > lim_sup, COLORES['warning'], COLORES['success'])
+    )
+
+
+def resolver_modo(n, modo=MODO_AUTOMATICO):
+    """Modo efectivo de dibujo: el automático pasa a rápido en muestras grandes"""
+    if modo == MODO_AUTOMATICO:
+        return MODO_RAPIDO if n > UMBRAL_MODO_RAPIDO else MODO_DETALLADO
+    return modo
+
+
+def crear_grafico_matplotlib(pesos, nominal, lim_inf, lim_sup, media, desviacion,
+                             modo=MODO_AUTOMATICO):
+    """Crea un gráfico de calidad profesional con Matplotlib
+
+    En modo rápido (por defecto con más de UMBRAL_MODO_RAPIDO muestras) no
+    se dibuja una etiqueta por punto y se reduce el número de marcas del
+    eje X, que es lo que hacía lento e ilegible el gráfico con n=150-200.
+    """
+    fig = Figure(figsize=(14, 6))
+    ax1, ax2 = fig.subplots(1, 2)
+    dibujar_grafico(ax1, ax2, pesos, nominal, lim_inf, lim_sup, media, desviacion, modo)
+    fig.tight_layout()
+    return fig
+
+
+def dibujar_grafico(ax1, ax2, pesos, nominal, lim_inf, lim_sup, media, desviacion,
+                    modo=MODO_AUTOMATICO):
+    """Dibuja la dispersión (ax1) y el histograma (ax2) de la muestra en ejes dados"""
+    # Gráfico 1: Distribución de puntos
+    n = len(pesos)
+    rapido = resolver_modo(n, modo) == MODO_RAPIDO
+    x_positions = np.arange(1, n + 1)
+    
+    # Colores según posición relativa a límites
+    colors = colores_por_limite(pesos, lim_inf, lim_sup)
+    
+    if rapido:
+        ax1.scatter(x_positions, pesos, c=colors, s=30, linewidths=0, alpha=0.8)
+    else:
+        ax1.scatter(x_positions, pesos, c=colors, s=100, edgecolors='black', alpha=0.7)
+    
+    # Líneas de referencia
+    ax1.axhline(y=nominal, color=COLORES['accent1'], linestyle='--', linewidth=2, label='Nominal')
+    ax1.axhline(y=lim_inf, color=COLORES['danger'], linestyle='-', linewidth=1.5, label='Lím. Inferior')
+    ax1.axhline(y=lim_sup, color=COLORES['danger'], linestyle='-', linewidth=1.5, label='Lím. Superior')
+    ax1.axhline(y=media, color=COLORES['primary'], linestyle='-', linewidth=2, label='Media')
+    
+    # Área de especificación
+    ax1.fill_between([0, n+1], lim_inf, lim_sup, alpha=0.1, color=COLORES['accent1'])
+    
+    # Configuración del gráfico 1
+    ax1.set_title('Distribución de Pesos de la Muestra', fontsize=14, fontweight='bold', pad=15)
+    ax1.set_xlabel('Número de Muestra', fontsize=12)
+    ax1.set_ylabel('Peso', fontsize=12)
+    if rapido:
+        ax1.xaxis.set_major_locator(MaxNLocator(nbins=MAX_MARCAS_EJE_X, integer=True))
+    else:
+        ax1.set_xticks(x_positions)
+    ax1.set_xlim(0.5, n + 0.5)
+    ax1.grid(True, alpha=0.3)
+    ax1.legend(loc='upper right')
+    
+    # Añadir etiquetas de valores
+    if not rapido:
+        for i, peso in enumerate(pesos, 1):
+            ax1.annotate(f'{peso:.2f}', (i, peso), textcoords="offset points", 
+                        xytext=(0,10), ha='center', fontsize=9, fontweight='bold')
+    
+    # Gráfico 2: Histograma y distribución normal
+    if n > 1 and desviacion > 0:
+        # Histograma
+        ax2.hist(pesos, bins=min(10, n), alpha=0.7, color=COLORES['accent1'], 
+                edgecolor='black', density=True, label='Distribución Muestral')
+        
+        # Curva normal teórica
+        x_min = min(pesos) - desviacion
+        x_max = max(pesos) + desviacion
+        x = np.linspace(x_min, x_max, 100)
+        y = (1/(desviacion * np.sqrt(2 * np.pi))) * np.exp(-0.5 * ((x - media)/desviacion)**2)
+        ax2.plot(x, y, color=COLORES['primary'], linewidth=2, label='Distribución Normal')
+        
+        # Líneas de límites en histograma
+        ax2.axvline(x=lim_inf, color=COLORES['danger'], linestyle='--', linewidth=2, label='Límites')
+        ax2.axvline(x=lim_sup, color=COLORES['danger'], linestyle='--', linewidth=2)
+        ax2.axvline(x=nominal, color=COLORES['accent1'], linestyle='-', linewidth=2, label='Nominal')
+        
+        ax2.set_title('Distribución de Frecuencias', fontsize=14, fontweight='bold', pad=15)
+        ax2.set_xlabel('Peso', fontsize=12)
+        ax2.set_ylabel('Densidad', fontsize=12)
+        ax2.legend()
+        ax2.grid(True, alpha=0.3)
+    else:
+        ax2.text(0.5, 0.5, 'No hay suficientes datos\npara el histograma', 
+                ha='center', va='center', transform=ax2.transAxes, fontsize=12)
+        ax2.set_title('Distribución de Frecuencias', fontsize=14, fontweight='bold', pad=15)
+
+
+# ============================================================
+# CACHÉ DE GRÁFICOS RENDERIZADOS
+# ============================================================
+def clave_grafico(pesos, nominal, lim_inf, lim_sup, media, desviacion, formato='png',
+                  modo=MODO_AUTOMATICO):
+    """Hash del contenido que determina el gráfico"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(pesos, dtype=float).tobytes())
+    h.update(struct.pack('<5d', nominal, lim_inf, lim_sup, media, desviacion))
+    h.update(f"{formato}|{resolver_modo(len(pesos), modo)}".encode())
+    return h.hexdigest()
+
+
+class CacheGraficos:
+    """Caché LRU de imágenes codificadas, acotada por bytes y segura entre hilos"""
+
+    def __init__(self, tamano_maximo=TAMANO_MAXIMO_CACHE):
+        self.tamano_maximo = tamano_maximo
+        self.tamano_actual = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas = OrderedDict()
+        self._candado = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obtener(self, clave):
+        """Bytes guardados para la clave (y la marca como reciente) o None"""
+        with self._candado:
+            datos = self._entradas.get(clave)
+            if datos is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return datos
+
+    def guardar(self, clave, datos):
+        """Guarda los bytes y expulsa las entradas menos usadas si no caben"""
+        if len(datos) > self.tamano_maximo:
+            return
+        with self._candado:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self.tamano_actual -= len(anterior)
+            self._entradas[clave] = datos
+            self.tamano_actual += len(datos)
+            while self.tamano_actual > self.tamano_maximo:
+                _, expulsado = self._entradas.popitem(last=False)
+                self.tamano_actual -= len(expulsado)
+
+    def limpiar(self):
+        with self._candado:
+            self._entradas.clear()
+            self.tamano_actual = 0
+
+
+CACHE_GRAFICOS = CacheGraficos()
+
+
+def codificar_figura(fig, formato='png'):
+    """Codifica la figura a bytes y la libera"""
+    buffer = BytesIO()
+    try:
+        fig.savefig(buffer, format=formato, **OPCIONES_GUARDADO)
+    finally:
+        fig.clear()
+    return buffer.getvalue()
+
+
+def renderizar_grafico(pesos, nominal, lim_inf, lim_sup, media, desviacion,
+                       formato='png', modo=MODO_AUTOMATICO, cache=CACHE_GRAFICOS):
+    """Bytes PNG/SVG del gráfico de la muestra, servidos desde caché si existen"""
+    clave = clave_grafico(pesos, nominal, lim_inf, lim_sup, media, desviacion, formato, modo)
+    datos = cache.obtener(clave)
+    if datos is None:
+        fig = crear_grafico_matplotlib(pesos, nominal, lim_inf, lim_sup, media, desviacion,
+                                       modo)
+        datos = codificar_figura(fig, formato)
+        cache.guardar(clave, datos)
+    return datos
+
+
+# ============================================================
+# GRÁFICO LIGERO (VEGA-LITE)
+# ============================================================
+def especificacion_vega(pesos, nominal, lim_inf, lim_sup, media):
+    """Especificación Vega-Lite del gráfico de dispersión para st.vega_lite_chart.
+
+    No usa Matplotlib: el navegador dibuja los puntos, así que es la opción
+    más liviana para muestras grandes y además es interactiva.
+    """
+    pesos = np.asarray(pesos, dtype=float)
+    estado = np.where(pesos < lim_inf, 'Bajo límite',
+                      np.where(pesos > lim_sup, 'Sobre límite', 'Conforme'))
+    puntos = [
+        {'Muestra': i, 'Peso': p, 'Estado': e}
+        for i, (p, e) in enumerate(zip(pesos.tolist(), estado.tolist()), 1)
+    ]
+    referencias = [
+        {'Referencia': 'Nominal', 'Peso': nominal},
+        {'Referencia': 'Lím. Inferior', 'Peso': lim_inf},
+        {'Referencia': 'Lím. Superior', 'Peso': lim_sup},
+        {'Referencia': 'Media', 'Peso': float(media)},
+    ]
+    return {
+        'layer': [
+            {
+                'data': {'values': puntos},
+                'mark': {'type': 'circle', 'size': 60, 'opacity': 0.8, 'tooltip': True},
+                'encoding': {
+                    'x': {'field': 'Muestra', 'type': 'quantitative'},
+                    'y': {'field': 'Peso', 'type': 'quantitative', 'scale': {'zero': False}},
+                    'color': {
+                        'field': 'Estado', 'type': 'nominal',
+                        'scale': {
+                            'domain': ['Conforme', 'Bajo límite', 'Sobre límite'],
+                            'range': [COLORES['success'], COLORES['danger'], COLORES['warning']],
+                        },
+                    },
+                },
+            },
+            {
+                'data': {'values': referencias},
+                'mark': {'type': 'rule', 'strokeWidth': 2},
+                'encoding': {
+                    'y': {'field': 'Peso', 'type': 'quantitative'},
+                    'color': {'field': 'Referencia', 'type': 'nominal',
+                              'legend': {'title': None}},
+                },
+            },
+        ],
+        'resolve': {'scale': {'color': 'independent'}},
+    }
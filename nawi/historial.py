@@ -0,0 +1,267 @@
+"""Historial persistente de lotes en SQLite.
+
+Guarda por lote el plan (nivel, tamaño, NCA, letra, n, k), la
+especificación, las estadísticas, la decisión y los pesos crudos. La base
+usa WAL para que las lecturas de la interfaz no esperen a las escrituras,
+las escrituras se hacen por lotes en una sola transacción y las consultas
+se paginan por cursor (fecha, id) sobre índices, de modo que el costo de
+una página no crece con el tamaño del historial.
+
+Los pesos de cada lote se guardan como un BLOB de float64 en su propia
+tabla: la tabla de lotes queda liviana para filtrar y paginar, y un lote
+se recupera sin reconstruir miles de filas.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+RUTA_PREDETERMINADA = os.environ.get('NAWI_HISTORIAL', 'nawi_historial.db')
+TAMANO_PAGINA = 50
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS lotes (
+    id          INTEGER PRIMARY KEY,
+    fecha       TEXT    NOT NULL,
+    producto    TEXT    NOT NULL DEFAULT '',
+    estacion    TEXT    NOT NULL DEFAULT '',
+    nivel       TEXT,
+    tam_lote    INTEGER,
+    aql         TEXT,
+    letra       TEXT,
+    n           INTEGER NOT NULL,
+    k           REAL,
+    nominal     REAL,
+    lim_inf     REAL    NOT NULL,
+    lim_sup     REAL    NOT NULL,
+    media       REAL,
+    desviacion  REAL,
+    p_total     REAL,
+    decision    INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pesos_lote (
+    lote_id     INTEGER PRIMARY KEY REFERENCES lotes(id) ON DELETE CASCADE,
+    pesos       BLOB    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reanudaciones (
+    id          INTEGER PRIMARY KEY,
+    fecha       TEXT    NOT NULL,
+    producto    TEXT    NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_lotes_fecha ON lotes(fecha, id);
+CREATE INDEX IF NOT EXISTS idx_lotes_producto ON lotes(producto, fecha, id);
+CREATE INDEX IF NOT EXISTS idx_lotes_decision ON lotes(decision, fecha, id);
+CREATE INDEX IF NOT EXISTS idx_lotes_producto_decision ON lotes(producto, decision, fecha, id);
+"""
+
+COLUMNAS_LOTE = ('id', 'fecha', 'producto', 'estacion', 'nivel', 'tam_lote', 'aql',
+                 'letra', 'n', 'k', 'nominal', 'lim_inf', 'lim_sup', 'media',
+                 'desviacion', 'p_total', 'decision')
+
+
+class RegistroLote(NamedTuple):
+    """Lote evaluado listo para guardarse"""
+    producto: str
+    pesos: np.ndarray
+    lim_inf: float
+    lim_sup: float
+    decision: int
+    media: Optional[float] = None
+    desviacion: Optional[float] = None
+    p_total: Optional[float] = None
+    k: Optional[float] = None
+    nominal: Optional[float] = None
+    nivel: Optional[str] = None
+    tam_lote: Optional[int] = None
+    aql: Optional[str] = None
+    letra: Optional[str] = None
+    estacion: str = ''
+    fecha: Optional[datetime] = None
+
+
+def _nulo_si_nan(valor):
+    if valor is None:
+        return None
+    valor = float(valor)
+    return None if np.isnan(valor) else valor
+
+
+class HistorialLotes:
+    """Almacén de lotes; una conexión por hilo sobre la misma base WAL"""
+
+    def __init__(self, ruta=RUTA_PREDETERMINADA):
+        self.ruta = str(ruta)
+        self._local = threading.local()
+        self._pendientes = []
+        self._candado = threading.Lock()
+        with self._conexion() as conexion:
+            conexion.executescript(_ESQUEMA)
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.execute('PRAGMA foreign_keys=ON')
+            self._local.conexion = conexion
+        return conexion
+
+    # --------------------------------------------------------
+    # Escritura
+    # --------------------------------------------------------
+    def registrar(self, registros):
+        """Guarda varios lotes en una sola transacción; devuelve sus ids"""
+        ahora = datetime.now()
+        conexion = self._conexion()
+        ids = []
+        with conexion:
+            cursor = conexion.cursor()
+            for r in registros:
+                cursor.execute(
+                    "INSERT INTO lotes (fecha, producto, estacion, nivel, tam_lote, aql,"
+                    " letra, n, k, nominal, lim_inf, lim_sup, media, desviacion,"
+                    " p_total, decision) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                    ((r.fecha or ahora).isoformat(timespec='microseconds'),
+                     r.producto, r.estacion, r.nivel, r.tam_lote, r.aql, r.letra,
+                     len(r.pesos), _nulo_si_nan(r.k), _nulo_si_nan(r.nominal),
+                     float(r.lim_inf), float(r.lim_sup), _nulo_si_nan(r.media),
+                     _nulo_si_nan(r.desviacion), _nulo_si_nan(r.p_total), int(r.decision)),
+                )
+                ids.append(cursor.lastrowid)
+            cursor.executemany(
+                "INSERT INTO pesos_lote (lote_id, pesos) VALUES (?, ?)",
+                ((i, np.ascontiguousarray(r.pesos, dtype='<f8').tobytes())
+                 for i, r in zip(ids, registros)),
+            )
+        return ids
+
+    def registrar_reanudacion(self, producto, fecha=None):
+        """Guarda que se reanudó la inspección suspendida de un producto"""
+        with self._conexion() as conexion:
+            conexion.execute(
+                "INSERT INTO reanudaciones (fecha, producto) VALUES (?, ?)",
+                ((fecha or datetime.now()).isoformat(timespec='microseconds'), producto))
+
+    def agregar(self, registro, tamano_tanda=500):
+        """Encola un lote y escribe la tanda al llegar a `tamano_tanda`"""
+        with self._candado:
+            self._pendientes.append(registro)
+            if len(self._pendientes) < tamano_tanda:
+                return
+            tanda, self._pendientes = self._pendientes, []
+        self.registrar(tanda)
+
+    def vaciar(self):
+        """Escribe los lotes encolados con `agregar`"""
+        with self._candado:
+            tanda, self._pendientes = self._pendientes, []
+        if tanda:
+            self.registrar(tanda)
+
+    # --------------------------------------------------------
+    # Consulta
+    # --------------------------------------------------------
+    @staticmethod
+    def _filtros(producto=None, decision=None, desde=None, hasta=None):
+        """Condiciones WHERE y parámetros comunes a consultar y contar"""
+        condiciones, parametros = [], []
+        if producto is not None:
+            condiciones.append("producto = ?")
+            parametros.append(producto)
+        if decision is not None:
+            condiciones.append("decision = ?")
+            parametros.append(int(decision))
+        if desde is not None:
+            condiciones.append("fecha >= ?")
+            parametros.append(desde.isoformat())
+        if hasta is not None:
+            condiciones.append("fecha < ?")
+            parametros.append(hasta.isoformat())
+        return condiciones, parametros
+
+    def consultar(self, producto=None, decision=None, desde=None, hasta=None,
+                  despues_de=None, tamano_pagina=TAMANO_PAGINA):
+        """Una página de lotes, del más reciente al más antiguo.
+
+        `despues_de` es el cursor devuelto por la página anterior. Devuelve
+        (filas como diccionarios, cursor de la página siguiente o None).
+        """
+        condiciones, parametros = self._filtros(producto, decision, desde, hasta)
+        if despues_de is not None:
+            condiciones.append("(fecha, id) < (?, ?)")
+            parametros.extend(despues_de)
+
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        filas = self._conexion().execute(
+            f"SELECT {', '.join(COLUMNAS_LOTE)} FROM lotes {where} "
+            "ORDER BY fecha DESC, id DESC LIMIT ?",
+            (*parametros, tamano_pagina + 1),
+        ).fetchall()
+
+        siguiente = None
+        if len(filas) > tamano_pagina:
+            filas = filas[:tamano_pagina]
+            siguiente = (filas[-1][1], filas[-1][0])
+        return [dict(zip(COLUMNAS_LOTE, fila)) for fila in filas], siguiente
+
+    def contar(self, producto=None, decision=None, desde=None, hasta=None):
+        condiciones, parametros = self._filtros(producto, decision, desde, hasta)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        return self._conexion().execute(
+            f"SELECT COUNT(*) FROM lotes {where}", parametros).fetchone()[0]
+
+    def productos(self):
+        """Productos con lotes registrados"""
+        return [fila[0] for fila in self._conexion().execute(
+            "SELECT DISTINCT producto FROM lotes ORDER BY producto")]
+
+    def decisiones(self):
+        """(producto, decisión) de todos los lotes en orden cronológico"""
+        return self._conexion().execute(
+            "SELECT producto, decision FROM lotes ORDER BY fecha, id")
+
+    def eventos_conmutacion(self):
+        """(producto, decisión) de lotes y reanudaciones en orden cronológico.
+
+        Las reanudaciones llegan con decisión None; a igual fecha van
+        después de los lotes.
+        """
+        return self._conexion().execute(
+            "SELECT producto, decision FROM ("
+            " SELECT fecha, 0 AS tipo, id, producto, decision FROM lotes"
+            " UNION ALL"
+            " SELECT fecha, 1, id, producto, NULL FROM reanudaciones"
+            ") ORDER BY fecha, tipo, id")
+
+    def subgrupos(self, despues_de_id=0):
+        """(id, fecha, producto, estación, n, media, S, LI, LS) de los lotes
+        con id mayor a `despues_de_id`, en orden de registro"""
+        return self._conexion().execute(
+            "SELECT id, fecha, producto, estacion, n, media, desviacion, lim_inf, lim_sup"
+            " FROM lotes WHERE id > ? ORDER BY id", (despues_de_id,))
+
+    def pesajes(self, despues_de_id=0):
+        """(id, fecha, producto, estación, nominal, LI, LS, k, decisión, BLOB de pesos)
+        de los lotes con id mayor a `despues_de_id`, en orden de registro"""
+        return self._conexion().execute(
+            "SELECT l.id, l.fecha, l.producto, l.estacion, l.nominal, l.lim_inf, l.lim_sup,"
+            " l.k, l.decision, p.pesos"
+            " FROM lotes l JOIN pesos_lote p ON p.lote_id = l.id WHERE l.id > ? ORDER BY l.id",
+            (despues_de_id,))
+
+    def pesos(self, lote_id):
+        """Pesos crudos de un lote como arreglo float64"""
+        fila = self._conexion().execute(
+            "SELECT pesos FROM pesos_lote WHERE lote_id = ?", (lote_id,)).fetchone()
+        return None if fila is None else np.frombuffer(fila[0], dtype='<f8')
+
+    def cerrar(self):
+        self.vaciar()
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is not None:
+            conexion.close()
+            self._local.conexion = None
@@ -0,0 +1,238 @@
+"""Importación masiva de pesajes desde CSV, XLSX o Parquet.
+
+El archivo trae una fila por pesaje con las columnas `peso` y,
+opcionalmente, `lote`, `producto` y `fecha` (se aceptan algunos alias y
+mayúsculas). Los CSV y Parquet se leen por bloques con pyarrow y tipos
+explícitos, sin pasar por objetos Python fila a fila; el identificador de
+lote se codifica como diccionario y los pesos se agrupan por lote con un
+ordenamiento estable, de modo que el resultado entra directo en
+`evaluar_lotes` con `offsets`.
+
+XLSX se lee con pandas y openpyxl (dependencia opcional), en un solo bloque.
+"""
+import math
+import re
+from io import BytesIO
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from .analisis import METODO_NORMAL, evaluar_lotes
+
+# Bytes por bloque de lectura del CSV
+TAMANO_BLOQUE = 4 << 20
+FILAS_POR_LOTE_PARQUET = 256 * 1024
+
+ALIAS_COLUMNAS = {
+    'lote': ('lote', 'lote_id', 'id_lote', 'lot', 'lot_id'),
+    'producto': ('producto', 'sku', 'product', 'articulo'),
+    'peso': ('peso', 'peso_g', 'weight', 'valor'),
+    'fecha': ('fecha', 'fecha_hora', 'timestamp', 'hora'),
+}
+EXTENSIONES = ('csv', 'txt', 'xlsx', 'parquet')
+
+
+class ErrorImportacion(ValueError):
+    """Archivo sin las columnas necesarias o en un formato no soportado"""
+
+
+class Pesajes(NamedTuple):
+    """Pesajes agrupados por lote, en el orden de primera aparición del lote"""
+    lotes: np.ndarray
+    productos: np.ndarray
+    fechas: np.ndarray
+    pesos: np.ndarray
+    offsets: np.ndarray
+    filas: int
+    descartadas: int
+
+    def tamanos(self):
+        return np.diff(self.offsets)
+
+    def pesos_lote(self, i):
+        return self.pesos[self.offsets[i]:self.offsets[i + 1]]
+
+
+def _mapa_columnas(nombres):
+    """{nombre canónico: nombre en el archivo} para las columnas reconocidas"""
+    normalizados = {str(nombre).strip().lower(): nombre for nombre in nombres}
+    mapa = {}
+    for canonico, alias in ALIAS_COLUMNAS.items():
+        for a in alias:
+            if a in normalizados:
+                mapa[canonico] = normalizados[a]
+                break
+    if 'peso' not in mapa:
+        raise ErrorImportacion(
+            f"No se encontró la columna de peso (se espera una de: {', '.join(ALIAS_COLUMNAS['peso'])})")
+    return mapa
+
+
+def _abrir_binario(fuente):
+    if isinstance(fuente, (str, Path)):
+        return open(fuente, 'rb')
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        return BytesIO(fuente)
+    fuente.seek(0)
+    return fuente
+
+
+def _leer_csv(fuente, tamano_bloque):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    archivo = _abrir_binario(fuente)
+    encabezado = archivo.readline().decode('utf-8-sig')
+    archivo.seek(0)
+    # Exportaciones en configuración regional latina: ';' y coma decimal
+    separador = ';' if encabezado.count(';') > encabezado.count(',') else ','
+    nombres = [c.strip().strip('"') for c in encabezado.rstrip('\r\n').split(separador)]
+    mapa = _mapa_columnas(nombres)
+
+    tipos = {mapa['peso']: pa.float64()}
+    for columna in ('lote', 'producto'):
+        if columna in mapa:
+            tipos[mapa[columna]] = pa.string()
+    lector = pacsv.open_csv(
+        archivo,
+        read_options=pacsv.ReadOptions(block_size=tamano_bloque),
+        parse_options=pacsv.ParseOptions(delimiter=separador),
+        convert_options=pacsv.ConvertOptions(
+            column_types=tipos,
+            include_columns=list(mapa.values()),
+            decimal_point=',' if separador == ';' else '.',
+        ),
+    )
+    return pa.Table.from_batches(list(lector), schema=lector.schema), mapa
+
+
+def _leer_parquet(fuente):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    archivo = pq.ParquetFile(_abrir_binario(fuente))
+    mapa = _mapa_columnas(archivo.schema_arrow.names)
+    columnas = list(mapa.values())
+    bloques = list(archivo.iter_batches(batch_size=FILAS_POR_LOTE_PARQUET, columns=columnas))
+    if not bloques:
+        return archivo.schema_arrow.empty_table().select(columnas), mapa
+    return pa.Table.from_batches(bloques), mapa
+
+
+def _leer_xlsx(fuente):
+    import pandas as pd
+    import pyarrow as pa
+
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError as error:
+        raise ErrorImportacion("Leer XLSX requiere openpyxl (pip install openpyxl)") from error
+
+    encabezado = pd.read_excel(_abrir_binario(fuente), nrows=0, engine='openpyxl')
+    mapa = _mapa_columnas(encabezado.columns)
+    tipos = {mapa[c]: 'string' for c in ('lote', 'producto') if c in mapa}
+    datos = pd.read_excel(_abrir_binario(fuente), usecols=list(mapa.values()), dtype=tipos,
+                          engine='openpyxl')
+    datos[mapa['peso']] = pd.to_numeric(datos[mapa['peso']], errors='coerce')
+    return pa.Table.from_pandas(datos, preserve_index=False), mapa
+
+
+def _columna_numpy(tabla, nombre, tipo):
+    columna = tabla.column(nombre).combine_chunks()
+    return columna.to_numpy(zero_copy_only=False).astype(tipo, copy=False)
+
+
+def leer_pesajes(fuente, nombre=None, rango=None, tamano_bloque=TAMANO_BLOQUE):
+    """Lee un archivo de pesajes y los agrupa por lote.
+
+    `fuente` es una ruta, bytes o un archivo binario (p. ej. el de
+    st.file_uploader); el formato sale de la extensión de `nombre` (o de
+    la ruta). Las filas con peso vacío, no numérico, no positivo o fuera
+    de `rango` = (mínimo, máximo) se descartan y se cuentan en
+    `descartadas`. Sin columna de lote todo el archivo es un solo lote.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    nombre = str(nombre if nombre is not None else getattr(fuente, 'name', fuente))
+    extension = Path(nombre).suffix.lower().lstrip('.')
+    if extension in ('csv', 'txt'):
+        tabla, mapa = _leer_csv(fuente, tamano_bloque)
+    elif extension == 'parquet':
+        tabla, mapa = _leer_parquet(fuente)
+    elif extension == 'xlsx':
+        tabla, mapa = _leer_xlsx(fuente)
+    else:
+        raise ErrorImportacion(f"Formato no soportado: .{extension} (use {', '.join(EXTENSIONES)})")
+
+    filas = tabla.num_rows
+    pesos = _columna_numpy(tabla, mapa['peso'], np.float64)
+    validos = np.isfinite(pesos) & (pesos > 0)
+    if rango is not None:
+        validos &= (pesos >= rango[0]) & (pesos <= rango[1])
+
+    if 'lote' in mapa:
+        lotes = tabla.column(mapa['lote']).combine_chunks().fill_null('')
+        codificado = lotes.dictionary_encode()
+        codigos = codificado.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+        etiquetas = np.asarray(codificado.dictionary.to_pylist(), dtype=object)
+    else:
+        codigos = np.zeros(filas, dtype=np.int64)
+        etiquetas = np.array([Path(nombre).stem], dtype=object)
+
+    # Producto y fecha del lote: los de su primera fila / su último pesaje
+    _, primeras = np.unique(codigos, return_index=True)
+    if 'producto' in mapa:
+        productos = pc.take(tabla.column(mapa['producto']).combine_chunks().fill_null(''),
+                            pa.array(primeras)).to_numpy(zero_copy_only=False).astype(object)
+    else:
+        productos = np.full(len(etiquetas), '', dtype=object)
+    fechas = np.full(len(etiquetas), np.datetime64('NaT'), dtype='datetime64[us]')
+    if 'fecha' in mapa:
+        columna = tabla.column(mapa['fecha']).combine_chunks()
+        if not pa.types.is_timestamp(columna.type):
+            columna = pc.strptime(columna.cast(pa.string()), format='%Y-%m-%d %H:%M:%S',
+                                  unit='us', error_is_null=True)
+        instantes = columna.cast(pa.timestamp('us')).to_numpy(zero_copy_only=False)
+        instantes = instantes.astype('datetime64[us]').view(np.int64)
+        ultimos = np.full(len(etiquetas), np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(ultimos, codigos, instantes)
+        fechas = ultimos.view('datetime64[us]')
+
+    # Agrupar: orden estable por código conserva el orden de los pesajes
+    codigos_validos = codigos[validos]
+    orden = np.argsort(codigos_validos, kind='stable')
+    agrupados = np.ascontiguousarray(pesos[validos][orden])
+    offsets = np.zeros(len(etiquetas) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codigos_validos, minlength=len(etiquetas)), out=offsets[1:])
+
+    return Pesajes(etiquetas, productos, fechas, agrupados, offsets,
+                   filas, int(filas - np.count_nonzero(validos)))
+
+
+def pesos_desde_texto(texto):
+    """Pesos pegados desde una planilla o una lista de texto.
+
+    Separadores: saltos de línea, espacios, tabulaciones o ';'. Si el texto
+    no tiene puntos, la coma se toma como separador decimal (100,25);
+    si los tiene, la coma también separa valores.
+    """
+    texto = texto.strip()
+    if not texto:
+        return np.zeros(0)
+    if '.' not in texto and not re.search(r',\d*,', texto):
+        texto = texto.replace(',', '.')
+    partes = [p for p in re.split(r'[\s;,]+', texto) if p]
+    try:
+        return np.array([float(p) for p in partes], dtype=float)
+    except ValueError as error:
+        raise ValueError(f"Valor no numérico en la lista pegada: {error}") from None
+
+
+def evaluar_pesajes(pesajes, lim_inf, lim_sup, k, metodo=METODO_NORMAL):
+    """Evalúa todos los lotes importados en una sola llamada a `evaluar_lotes`"""
+    if not (math.isfinite(lim_inf) and math.isfinite(lim_sup)) or lim_inf >= lim_sup:
+        raise ErrorImportacion("El límite inferior debe ser menor que el superior")
+    return evaluar_lotes(pesajes.pesos, lim_inf, lim_sup, k, offsets=pesajes.offsets,
+                         metodo=metodo)
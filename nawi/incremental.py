@@ -0,0 +1,182 @@
+"""Estadísticas incrementales (Welford) y decisión provisional en vivo.
+
+`EvaluacionIncremental` actualiza X̄, S, Z_EI/Z_ES y p_total en O(1) por
+cada peso que llega, sin recorrer de nuevo la muestra, y además indica
+cuándo el resultado del lote ya no puede cambiar:
+
+- Rechazo seguro: al agregar pesos la suma de cuadrados de desviaciones
+  nunca disminuye, así que S final ≥ sqrt(M2 / (n - 1)). Con esa S mínima
+  y la media en el centro de la especificación (donde p_total es mínimo)
+  el p_total más bajo alcanzable ya supera k. No requiere supuestos.
+- Aceptación segura: solo si se conoce el rango físico [a, b] en el que
+  caerán los pesos restantes. Con él se acotan la media final y S final,
+  y el p_total más alto alcanzable sigue siendo ≤ k.
+
+Las cotas valen para ambos estimadores (normal y Forma 2): los dos
+crecen con S y con la distancia de la media al centro. Las cotas del
+resultado final usan n = n_plan; el p_total provisional, los pesos
+recibidos.
+
+La decisión oficial del lote la sigue dando `realizar_analisis` con la
+muestra completa.
+"""
+import math
+
+from .analisis import METODO_NORMAL, evaluar_estadisticos
+
+# Estados de la evaluación en vivo
+ESTADO_INSUFICIENTE = 'insuficiente'
+ESTADO_INDETERMINADO = 'indeterminado'
+ESTADO_PROVISIONAL_ACEPTAR = 'provisional_aceptar'
+ESTADO_PROVISIONAL_RECHAZAR = 'provisional_rechazar'
+ESTADO_SEGURO_ACEPTAR = 'seguro_aceptar'
+ESTADO_SEGURO_RECHAZAR = 'seguro_rechazar'
+ESTADO_ACEPTAR = 'aceptar'
+ESTADO_RECHAZAR = 'rechazar'
+
+
+def porcentaje_fuera(media, desviacion, lim_inf, lim_sup, metodo=METODO_NORMAL, n=None):
+    """p_total (%) para una media y desviación, como en realizar_analisis.
+
+    METODO_FORMA2 requiere el tamaño de muestra `n`.
+    """
+    if desviacion == 0:
+        # Sin variación todo el lote está dentro o (al menos la mitad) fuera
+        return 0.0 if lim_inf < media < lim_sup else 100.0
+    estadisticos = evaluar_estadisticos([media], [desviacion], lim_inf, lim_sup, math.nan,
+                                        metodo=metodo, n=n)
+    return float(estadisticos['p_total'][0])
+
+
+class EvaluacionIncremental:
+    """Acumulador de Welford para una muestra de tamaño n_plan"""
+
+    def __init__(self, n_plan, lim_inf, lim_sup, k, rango=None, metodo=METODO_NORMAL):
+        self.n_plan = n_plan
+        self.lim_inf = lim_inf
+        self.lim_sup = lim_sup
+        self.k = k
+        self.rango = rango
+        self.metodo = metodo
+        self.cantidad = 0
+        self.media = 0.0
+        self._m2 = 0.0
+
+    @classmethod
+    def desde_pesos(cls, pesos, n_plan, lim_inf, lim_sup, k, rango=None, metodo=METODO_NORMAL):
+        evaluacion = cls(n_plan, lim_inf, lim_sup, k, rango, metodo)
+        for peso in pesos:
+            evaluacion.agregar(peso)
+        return evaluacion
+
+    def agregar(self, peso):
+        """Incorpora un peso en O(1)"""
+        self.cantidad += 1
+        delta = peso - self.media
+        self.media += delta / self.cantidad
+        self._m2 += delta * (peso - self.media)
+
+    @property
+    def desviacion(self):
+        """S con ddof=1 sobre los pesos recibidos"""
+        if self.cantidad < 2:
+            return float('nan')
+        return math.sqrt(self._m2 / (self.cantidad - 1))
+
+    @property
+    def Z_EI(self):
+        return (self.media - self.lim_inf) / self.desviacion
+
+    @property
+    def Z_ES(self):
+        return (self.lim_sup - self.media) / self.desviacion
+
+    @property
+    def p_total(self):
+        """p_total (%) provisional con los pesos recibidos"""
+        if self.cantidad < 2 or self.desviacion == 0:
+            return float('nan')
+        return porcentaje_fuera(self.media, self.desviacion, self.lim_inf, self.lim_sup,
+                                self.metodo, self.cantidad)
+
+    # --------------------------------------------------------
+    # Cotas sobre el resultado final
+    # --------------------------------------------------------
+    def _restantes(self):
+        return max(self.n_plan - self.cantidad, 0)
+
+    def _intervalo_media(self):
+        """Media final mínima y máxima alcanzable (None si no hay rango)"""
+        m = self._restantes()
+        if m == 0:
+            return self.media, self.media
+        if self.rango is None:
+            return None
+        a, b = self.rango
+        suma = self.media * self.cantidad
+        total = self.cantidad + m
+        return (suma + m * a) / total, (suma + m * b) / total
+
+    def _desviacion_minima(self):
+        """Cota inferior de S final: M2 no disminuye al agregar pesos"""
+        return math.sqrt(self._m2 / (max(self.n_plan, self.cantidad) - 1))
+
+    def _desviacion_maxima(self):
+        """Cota superior de S final con los pesos restantes dentro del rango"""
+        m = self._restantes()
+        if m == 0:
+            return self.desviacion
+        a, b = self.rango
+        centro = (a + b) / 2
+        # M2 final ≤ Σ (x - c)² para cualquier c
+        cuadrados = self._m2 + self.cantidad * (self.media - centro) ** 2
+        cuadrados += m * ((b - a) / 2) ** 2
+        return math.sqrt(cuadrados / (self.cantidad + m - 1))
+
+    def p_total_minimo(self):
+        """Cota inferior del p_total final"""
+        centro = (self.lim_inf + self.lim_sup) / 2
+        intervalo = self._intervalo_media()
+        media = centro if intervalo is None else min(max(centro, intervalo[0]), intervalo[1])
+        if not self.lim_inf < media < self.lim_sup:
+            # La media queda fuera de especificación: al menos la mitad del lote
+            return 50.0
+        return porcentaje_fuera(media, self._desviacion_minima(), self.lim_inf, self.lim_sup,
+                                self.metodo, max(self.n_plan, self.cantidad))
+
+    def p_total_maximo(self):
+        """Cota superior del p_total final (inf si no se puede acotar)"""
+        intervalo = self._intervalo_media()
+        if intervalo is None:
+            return float('inf')
+        bajo, alto = intervalo
+        if bajo <= self.lim_inf or alto >= self.lim_sup:
+            return float('inf')
+        # Dentro de la especificación p_total crece con S y con la
+        # distancia de la media al centro: el peor caso es una esquina
+        centro = (self.lim_inf + self.lim_sup) / 2
+        media = bajo if centro - bajo >= alto - centro else alto
+        return porcentaje_fuera(media, self._desviacion_maxima(), self.lim_inf, self.lim_sup,
+                                self.metodo, max(self.n_plan, self.cantidad))
+
+    def estado(self):
+        """Estado provisional o definitivo (constantes ESTADO_*)"""
+        if self.k is None:
+            return ESTADO_INDETERMINADO
+        if self.cantidad < 2:
+            return ESTADO_INSUFICIENTE
+
+        if self.cantidad >= self.n_plan:
+            p_total = self.p_total
+            if math.isnan(p_total):
+                return ESTADO_INDETERMINADO
+            return ESTADO_ACEPTAR if p_total <= self.k else ESTADO_RECHAZAR
+
+        if self.p_total_minimo() > self.k:
+            return ESTADO_SEGURO_RECHAZAR
+        if self.p_total_maximo() <= self.k:
+            return ESTADO_SEGURO_ACEPTAR
+        p_total = self.p_total
+        if math.isnan(p_total):
+            return ESTADO_INSUFICIENTE
+        return ESTADO_PROVISIONAL_ACEPTAR if p_total <= self.k else ESTADO_PROVISIONAL_RECHAZAR
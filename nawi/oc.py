@@ -0,0 +1,155 @@
+"""Curvas características de operación (OC) por simulación Monte Carlo.
+
+La curva OC de un plan (letra, NCA) da la probabilidad de aceptar el lote
+en función del porcentaje defectuoso real del proceso. Se estima
+simulando muestras de un proceso normal y aplicando la misma regla de
+decisión que `realizar_analisis` (p_total ≤ k, vía `evaluar_estadisticos`).
+
+Para cada muestra simulada solo hacen falta X̄ y S, que en un proceso
+normal son independientes: X̄ ~ N(μ, σ²/n) y (n-1)S²/σ² ~ χ²(n-1). Con
+`metodo='suficiente'` (por defecto) se generan directamente, en O(1) por
+muestra en vez de O(n); `metodo='muestras'` genera los n pesos de cada
+muestra y pasa por `evaluar_lotes`, como referencia. `estimador` elige
+el estimador del porcentaje defectuoso (normal o Forma 2).
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from statistics import NormalDist
+from typing import NamedTuple
+
+import numpy as np
+
+from .analisis import DECISION_ACEPTAR, METODO_NORMAL, evaluar_estadisticos, evaluar_lotes
+from .planes import INDICE
+
+# Especificación normalizada: la curva OC no depende de la escala
+LIM_INF, LIM_SUP = -1.0, 1.0
+TAMANO_BLOQUE = 200_000
+
+_NORMAL = NormalDist()
+
+
+class CurvaOC(NamedTuple):
+    """Curva OC estimada de un plan"""
+    letra: str
+    aql: str
+    n: int
+    k: float
+    porcentaje_defectuoso: np.ndarray
+    prob_aceptacion: np.ndarray
+    error_estandar: np.ndarray
+    simulaciones: int
+
+
+def parametros_proceso(porcentaje_defectuoso, fraccion_inferior=0.5):
+    """(μ, σ) de un proceso normal con ese porcentaje fuera de [-1, 1].
+
+    `fraccion_inferior` es la parte de los defectuosos que cae bajo el
+    límite inferior: 0.5 es un proceso centrado y valores cercanos a 1
+    un proceso desplazado hacia el límite inferior.
+    """
+    p = porcentaje_defectuoso / 100
+    if not 0 < p < 1 or not 0 < fraccion_inferior < 1:
+        raise ValueError("Se requiere 0 < porcentaje < 100 y 0 < fraccion_inferior < 1")
+    # Φ((L-μ)/σ) = r·p  y  Φ((μ-U)/σ) = (1-r)·p
+    z_inf = _NORMAL.inv_cdf(fraccion_inferior * p)
+    z_sup = _NORMAL.inv_cdf((1 - fraccion_inferior) * p)
+    sigma = (LIM_SUP - LIM_INF) / -(z_inf + z_sup)
+    return LIM_INF - z_inf * sigma, sigma
+
+
+def _aceptados(n, k, mu, sigma, simulaciones, semilla, metodo, estimador=METODO_NORMAL):
+    """Cantidad de muestras aceptadas entre `simulaciones` simuladas"""
+    rng = np.random.default_rng(semilla)
+    aceptados = 0
+    restantes = simulaciones
+    while restantes > 0:
+        bloque = min(restantes, TAMANO_BLOQUE)
+        if metodo == 'suficiente':
+            media = mu + sigma / np.sqrt(n) * rng.standard_normal(bloque)
+            desviacion = sigma * np.sqrt(rng.chisquare(n - 1, bloque) / (n - 1))
+            decision = evaluar_estadisticos(media, desviacion, LIM_INF, LIM_SUP, k,
+                                            metodo=estimador, n=n)['decision']
+        elif metodo == 'muestras':
+            pesos = rng.normal(mu, sigma, (bloque, n))
+            decision = evaluar_lotes(pesos, LIM_INF, LIM_SUP, k, metodo=estimador)['decision']
+        else:
+            raise ValueError(f"Método de simulación desconocido: {metodo}")
+        aceptados += int(np.count_nonzero(decision == DECISION_ACEPTAR))
+        restantes -= bloque
+    return aceptados
+
+
+def simular_aceptacion(n, k, porcentajes, simulaciones=20_000, fraccion_inferior=0.5,
+                       semilla=0, procesos=None, metodo='suficiente', estimador=METODO_NORMAL,
+                       progreso=None):
+    """Probabilidad de aceptación para cada porcentaje defectuoso.
+
+    Devuelve (probabilidades, errores estándar). Con `procesos` > 1 los
+    puntos de la curva se reparten en un ProcessPoolExecutor; cada punto
+    usa su propia semilla derivada de `semilla`, así que el resultado es
+    el mismo con o sin procesos. `progreso` (ver nawi.trabajos) recibe
+    `informar(hechos, total)` al terminar cada punto.
+    """
+    porcentajes = np.asarray(porcentajes, dtype=float)
+    semillas = np.random.SeedSequence(semilla).spawn(len(porcentajes))
+
+    tareas = []
+    for p, semilla_punto in zip(porcentajes, semillas):
+        if p <= 0:
+            tareas.append(None)
+        else:
+            mu, sigma = parametros_proceso(p, fraccion_inferior)
+            tareas.append((n, k, mu, sigma, simulaciones, semilla_punto, metodo, estimador))
+
+    calculables = [t for t in tareas if t is not None]
+    conteos = []
+    if procesos and procesos > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            for conteo in pool.map(_aceptados, *zip(*calculables)):
+                conteos.append(conteo)
+                if progreso is not None:
+                    progreso.informar(len(conteos), len(calculables))
+    else:
+        for t in calculables:
+            conteos.append(_aceptados(*t))
+            if progreso is not None:
+                progreso.informar(len(conteos), len(calculables))
+
+    # Sin defectuosos el proceso no tiene variación fuera de los límites
+    conteos = iter(conteos)
+    aceptados = np.array([simulaciones if t is None else next(conteos) for t in tareas],
+                         dtype=float)
+    prob = aceptados / simulaciones
+    return prob, np.sqrt(prob * (1 - prob) / simulaciones)
+
+
+@lru_cache(maxsize=128)
+def curva_oc(letra, aql, simulaciones=20_000, puntos=41, porcentaje_maximo=None,
+             fraccion_inferior=0.5, semilla=0, procesos=None, estimador=METODO_NORMAL):
+    """Curva OC del plan (letra, NCA), calculada una vez por combinación de argumentos"""
+    return calcular_curva_oc(letra, aql, simulaciones, puntos, porcentaje_maximo,
+                             fraccion_inferior, semilla, procesos, estimador)
+
+
+def calcular_curva_oc(letra, aql, simulaciones=20_000, puntos=41, porcentaje_maximo=None,
+                      fraccion_inferior=0.5, semilla=0, procesos=None, estimador=METODO_NORMAL,
+                      progreso=None):
+    """Curva OC sin caché; con `progreso` informa el avance punto a punto"""
+    fila = INDICE.letras.index(letra)
+    n = int(INDICE.muestra[fila])
+    k = float(INDICE.matriz_k[fila, INDICE.posicion_aql(aql)])
+    if np.isnan(k):
+        raise ValueError(f"La letra {letra} no tiene plan para la NCA {aql}")
+
+    if porcentaje_maximo is None:
+        porcentaje_maximo = min(100.0, max(4 * k, 1.0))
+    porcentajes = np.linspace(0, porcentaje_maximo, puntos)
+    porcentajes = porcentajes[porcentajes < 100]
+    prob, error = simular_aceptacion(n, k, porcentajes, simulaciones, fraccion_inferior,
+                                     semilla, procesos, estimador=estimador,
+                                     progreso=progreso)
+    for arreglo in (porcentajes, prob, error):
+        arreglo.setflags(write=False)
+    return CurvaOC(letra, INDICE.aqls[INDICE.posicion_aql(aql)], n, k,
+                   porcentajes, prob, error, simulaciones)
@@ -0,0 +1,224 @@
+"""Perfilado de cada rerun de la interfaz por fases.
+
+Uso en el script de Streamlit:
+
+    perfil = iniciar_rerun()
+    with fase('header'):
+        mostrar_header()
+    ...
+    terminar_rerun(perfil)
+
+`fase` mide tiempo de reloj y la variación de memoria residente (RSS)
+de cada bloque; las fases pueden anidarse ('analisis/grafico'). Si
+tracemalloc está activo (`iniciar_rerun(memoria_detallada=True)`) también
+se registra el pico de memoria asignada por Python dentro de la fase
+(tracemalloc es global al proceso y hace más lento todo el código
+mientras está activo; solo para diagnóstico).
+
+El perfil en curso se guarda por hilo: Streamlit ejecuta cada sesión en
+su propio hilo, así que las sesiones no se mezclan. Sin un rerun
+iniciado, `fase` no hace nada y casi no cuesta.
+
+Al terminar cada rerun las métricas se acumulan en un registro del
+proceso que puede escribirse como líneas JSON (una por rerun) y como un
+archivo de texto Prometheus (formato textfile collector de node_exporter):
+
+- NAWI_METRICAS_JSONL: ruta del archivo .jsonl.
+- NAWI_METRICAS_PROM: ruta del archivo .prom (se reemplaza atómicamente).
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+RUTA_JSONL = os.environ.get('NAWI_METRICAS_JSONL')
+RUTA_PROMETHEUS = os.environ.get('NAWI_METRICAS_PROM')
+# Límites (s) del histograma de duración del rerun
+LIMITES_HISTOGRAMA = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_PAGINA = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_local = threading.local()
+
+
+def memoria_residente():
+    """RSS actual en bytes (en Linux vía /proc; si no, el máximo del proceso)"""
+    try:
+        with open('/proc/self/statm', 'rb') as archivo:
+            return int(archivo.read().split()[1]) * _PAGINA
+    except OSError:
+        import resource
+
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maximo if sys.platform == 'darwin' else maximo * 1024
+
+
+class PerfilRerun:
+    """Fases medidas de un rerun"""
+
+    def __init__(self, memoria_detallada=False):
+        self.inicio = time.perf_counter()
+        self.fecha = datetime.now()
+        self.memoria_detallada = memoria_detallada
+        self.fases = []
+        self.duracion = None
+        self.rss_final = None
+        self._pila = []
+
+    def registrar(self, nombre, segundos, delta_rss, pico_python):
+        self.fases.append({
+            'fase': nombre,
+            'segundos': segundos,
+            'delta_rss': delta_rss,
+            'pico_python': pico_python,
+        })
+
+    def como_dict(self):
+        return {
+            'fecha': self.fecha.isoformat(timespec='milliseconds'),
+            'duracion': self.duracion,
+            'rss': self.rss_final,
+            'fases': self.fases,
+        }
+
+
+def perfil_actual():
+    return getattr(_local, 'perfil', None)
+
+
+def iniciar_rerun(memoria_detallada=False):
+    """Abre el perfil del rerun del hilo actual"""
+    if memoria_detallada and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    perfil = PerfilRerun(memoria_detallada)
+    _local.perfil = perfil
+    return perfil
+
+
+def detener_memoria_detallada():
+    """Apaga tracemalloc (afecta a todo el proceso)"""
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@contextmanager
+def fase(nombre):
+    """Mide el bloque como una fase del rerun en curso (no hace nada sin rerun)"""
+    perfil = perfil_actual()
+    if perfil is None:
+        yield
+        return
+    perfil._pila.append(nombre)
+    nombre_completo = '/'.join(perfil._pila)
+    rss_antes = memoria_residente()
+    if perfil.memoria_detallada and tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        base_python = tracemalloc.get_traced_memory()[0]
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        pico = None
+        if perfil.memoria_detallada and tracemalloc.is_tracing():
+            pico = max(tracemalloc.get_traced_memory()[1] - base_python, 0)
+        perfil.registrar(nombre_completo, segundos, memoria_residente() - rss_antes, pico)
+        perfil._pila.pop()
+
+
+class RegistroMetricas:
+    """Acumulado de todos los reruns del proceso, seguro entre hilos"""
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self.reruns = 0
+        self.suma_reruns = 0.0
+        self.cubetas = [0] * len(LIMITES_HISTOGRAMA)
+        self.por_fase = {}
+        self.rss = 0
+
+    def agregar(self, perfil):
+        with self._candado:
+            self.reruns += 1
+            self.suma_reruns += perfil.duracion
+            for i, limite in enumerate(LIMITES_HISTOGRAMA):
+                if perfil.duracion <= limite:
+                    self.cubetas[i] += 1
+            for f in perfil.fases:
+                acumulado = self.por_fase.setdefault(f['fase'], [0, 0.0, 0.0])
+                acumulado[0] += 1
+                acumulado[1] += f['segundos']
+                acumulado[2] = f['segundos']
+            self.rss = perfil.rss_final
+
+    def prometheus(self):
+        """Texto en formato de exposición de Prometheus"""
+        with self._candado:
+            lineas = [
+                '# HELP nawi_rerun_segundos Duración de cada rerun de la interfaz.',
+                '# TYPE nawi_rerun_segundos histogram',
+            ]
+            for limite, cuenta in zip(LIMITES_HISTOGRAMA, self.cubetas):
+                lineas.append(f'nawi_rerun_segundos_bucket{{le="{limite}"}} {cuenta}')
+            lineas += [
+                f'nawi_rerun_segundos_bucket{{le="+Inf"}} {self.reruns}',
+                f'nawi_rerun_segundos_sum {self.suma_reruns:.6f}',
+                f'nawi_rerun_segundos_count {self.reruns}',
+                '# HELP nawi_fase_segundos_total Tiempo acumulado por fase.',
+                '# TYPE nawi_fase_segundos_total counter',
+            ]
+            for nombre, (_, suma, _) in sorted(self.por_fase.items()):
+                lineas.append(f'nawi_fase_segundos_total{{fase="{nombre}"}} {suma:.6f}')
+            lineas += [
+                '# HELP nawi_fase_ejecuciones_total Veces que se ejecutó cada fase.',
+                '# TYPE nawi_fase_ejecuciones_total counter',
+            ]
+            for nombre, (cuenta, _, _) in sorted(self.por_fase.items()):
+                lineas.append(f'nawi_fase_ejecuciones_total{{fase="{nombre}"}} {cuenta}')
+            lineas += [
+                '# HELP nawi_fase_ultima_segundos Duración de la fase en el último rerun.',
+                '# TYPE nawi_fase_ultima_segundos gauge',
+            ]
+            for nombre, (_, _, ultima) in sorted(self.por_fase.items()):
+                lineas.append(f'nawi_fase_ultima_segundos{{fase="{nombre}"}} {ultima:.6f}')
+            lineas += [
+                '# HELP nawi_memoria_residente_bytes Memoria residente del proceso.',
+                '# TYPE nawi_memoria_residente_bytes gauge',
+                f'nawi_memoria_residente_bytes {self.rss}',
+            ]
+        return '\n'.join(lineas) + '\n'
+
+
+METRICAS = RegistroMetricas()
+_candado_archivos = threading.Lock()
+
+
+def escribir_jsonl(perfil, ruta):
+    with _candado_archivos, open(ruta, 'a', encoding='utf-8') as archivo:
+        archivo.write(json.dumps(perfil.como_dict(), ensure_ascii=False) + '\n')
+
+
+def escribir_prometheus(ruta, registro=METRICAS):
+    """Reemplaza el archivo de forma atómica para que el recolector no lea uno a medias"""
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with _candado_archivos:
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            archivo.write(registro.prometheus())
+        os.replace(temporal, ruta)
+
+
+def terminar_rerun(perfil, ruta_jsonl=RUTA_JSONL, ruta_prometheus=RUTA_PROMETHEUS):
+    """Cierra el perfil, lo acumula en METRICAS y lo exporta si hay rutas configuradas"""
+    perfil.duracion = time.perf_counter() - perfil.inicio
+    perfil.rss_final = memoria_residente()
+    if perfil_actual() is perfil:
+        _local.perfil = None
+    METRICAS.agregar(perfil)
+    if ruta_jsonl:
+        escribir_jsonl(perfil, ruta_jsonl)
+    if ruta_prometheus:
+        escribir_prometheus(ruta_prometheus)
+    return perfil
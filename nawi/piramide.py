@@ -0,0 +1,290 @@
+"""Historia de todos los pesajes con una pirámide de resúmenes min/máx.
+
+Millones de pesos no se pueden dibujar uno por uno. Cada producto guarda
+sus pesajes en orden de registro y una pirámide de niveles: el nivel k
+resume bloques de FACTOR**k pesos consecutivos con su mínimo, máximo,
+cantidad de pesos bajo y sobre los límites de su lote, y el peor valor
+fuera de cada límite. La pirámide se construye una vez y crece con cada
+lote nuevo recalculando solo los bloques del final.
+
+Para una ventana de tiempo se elige el nivel más fino que entrega a lo
+sumo `puntos` bloques: se dibuja la banda min–máx y, como puntos, el peor
+peso fuera de límites de cada bloque, así que ninguna violación
+desaparece al alejarse. Con pocos pesos en la ventana (nivel 0) se
+dibujan los pesos reales.
+
+Los pesos de un lote comparten la fecha del lote. Si un lote llega con
+una fecha anterior a la del último, se ubica en la fecha del último para
+que el eje de tiempo siga ordenado.
+"""
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from .estilo import COLORES
+
+FACTOR = 8
+PUNTOS_VENTANA = 2000
+CAPACIDAD_INICIAL = 1024
+
+ESTADO_BAJO, ESTADO_DENTRO, ESTADO_SOBRE = -1, 0, 1
+_CAMPOS_NIVEL = ('minimo', 'maximo', 'peor_bajo', 'peor_sobre', 'bajo', 'sobre')
+
+
+class _Arreglo:
+    """Arreglo que crece por duplicación (agregar en O(1) amortizado)"""
+
+    def __init__(self, dtype):
+        self._datos = np.empty(CAPACIDAD_INICIAL, dtype=dtype)
+        self.cantidad = 0
+
+    def extender(self, valores):
+        fin = self.cantidad + len(valores)
+        if fin > len(self._datos):
+            nuevo = np.empty(max(fin, 2 * len(self._datos)), dtype=self._datos.dtype)
+            nuevo[:self.cantidad] = self._datos[:self.cantidad]
+            self._datos = nuevo
+        self._datos[self.cantidad:fin] = valores
+        self.cantidad = fin
+
+    def truncar(self, cantidad):
+        self.cantidad = min(self.cantidad, cantidad)
+
+    @property
+    def vista(self):
+        return self._datos[:self.cantidad]
+
+
+def _resumir(nivel):
+    """Bloques de FACTOR elementos consecutivos de cada columna de `nivel`"""
+    restos = -len(nivel['minimo']) % FACTOR
+    resumen = {}
+    for campo, reducir, relleno in (('minimo', np.fmin, np.nan), ('maximo', np.fmax, np.nan),
+                                    ('peor_bajo', np.fmin, np.nan),
+                                    ('peor_sobre', np.fmax, np.nan),
+                                    ('bajo', np.add, 0), ('sobre', np.add, 0)):
+        valores = nivel[campo]
+        if restos:
+            valores = np.concatenate([valores, np.full(restos, relleno, dtype=valores.dtype)])
+        resumen[campo] = reducir.reduce(valores.reshape(-1, FACTOR), axis=1)
+    return resumen
+
+
+class PiramidePesos:
+    """Pesajes de un producto y su pirámide de resúmenes"""
+
+    def __init__(self):
+        self._pesos = _Arreglo(np.float32)
+        self._estado = _Arreglo(np.int8)
+        self._fechas = _Arreglo(np.float64)      # por lote, segundos desde la época
+        self._offsets = _Arreglo(np.int64)        # inicio de cada lote en los pesos
+        self._limites = _Arreglo(np.float64)      # (LI, LS) intercalados por lote
+        self._niveles = []                        # niveles 1.. como diccionarios de _Arreglo
+
+    def __len__(self):
+        return self._pesos.cantidad
+
+    @property
+    def lotes(self):
+        return self._fechas.cantidad
+
+    @property
+    def limites(self):
+        """(LI, LS) del último lote"""
+        if not self.lotes:
+            return float('nan'), float('nan')
+        return tuple(self._limites.vista[-2:])
+
+    def agregar_lote(self, fecha, pesos, lim_inf, lim_sup):
+        """Agrega los pesos de un lote; `fecha` en segundos desde la época"""
+        self.agregar_lotes([fecha], [pesos], [lim_inf], [lim_sup])
+
+    def agregar_lotes(self, fechas, pesos, lim_inf, lim_sup):
+        """Agrega varios lotes (listas paralelas) con una sola copia de los pesos"""
+        if not len(fechas):
+            return
+        fechas = np.asarray(fechas, dtype=np.float64)
+        if self.lotes:
+            fechas = np.maximum(fechas, self._fechas.vista[-1])
+        np.maximum.accumulate(fechas, out=fechas)
+        tamanos = np.fromiter((len(p) for p in pesos), dtype=np.int64, count=len(fechas))
+        inicios = np.empty(len(fechas), dtype=np.int64)
+        inicios[0] = len(self)
+        np.cumsum(tamanos[:-1], out=inicios[1:])
+        inicios[1:] += len(self)
+        planos = np.concatenate(pesos).astype(np.float32, copy=False)
+        # Límites de cada lote repetidos para cada uno de sus pesos
+        inferior = np.repeat(np.asarray(lim_inf, dtype=np.float32), tamanos)
+        superior = np.repeat(np.asarray(lim_sup, dtype=np.float32), tamanos)
+        estado = np.zeros(len(planos), dtype=np.int8)
+        estado[planos < inferior] = ESTADO_BAJO
+        estado[planos > superior] = ESTADO_SOBRE
+
+        self._fechas.extender(fechas)
+        self._offsets.extender(inicios)
+        self._limites.extender(np.column_stack([lim_inf, lim_sup]).ravel())
+        self._pesos.extender(planos)
+        self._estado.extender(estado)
+
+    def _nivel_base(self, desde):
+        pesos, estado = self._pesos.vista[desde:], self._estado.vista[desde:]
+        bajo, sobre = estado == ESTADO_BAJO, estado == ESTADO_SOBRE
+        return {'minimo': pesos, 'maximo': pesos,
+                'peor_bajo': np.where(bajo, pesos, np.float32(np.nan)),
+                'peor_sobre': np.where(sobre, pesos, np.float32(np.nan)),
+                'bajo': bajo.astype(np.int32), 'sobre': sobre.astype(np.int32)}
+
+    def construir(self, desde=0):
+        """Recalcula los bloques de todos los niveles que contienen pesos desde `desde`"""
+        largo = len(self)
+        nivel_k = 0
+        # Cada nivel se recalcula desde el primer bloque afectado, no desde el principio
+        bloque = desde // FACTOR
+        anterior = self._nivel_base(bloque * FACTOR)
+        while largo > 1:
+            nivel_k += 1
+            if len(self._niveles) < nivel_k:
+                self._niveles.append({c: _Arreglo(anterior[c].dtype) for c in _CAMPOS_NIVEL})
+            nivel = self._niveles[nivel_k - 1]
+            resumen = _resumir(anterior)
+            for campo in _CAMPOS_NIVEL:
+                nivel[campo].truncar(bloque)
+                nivel[campo].extender(resumen[campo])
+            largo = nivel['minimo'].cantidad
+            bloque //= FACTOR
+            anterior = {c: nivel[c].vista[bloque * FACTOR:] for c in _CAMPOS_NIVEL}
+
+    # --------------------------------------------------------
+    # Consulta
+    # --------------------------------------------------------
+    def rango_fechas(self):
+        if not self.lotes:
+            return None
+        return float(self._fechas.vista[0]), float(self._fechas.vista[-1])
+
+    def _fecha_de(self, indices):
+        lote = np.searchsorted(self._offsets.vista, indices, side='right') - 1
+        return self._fechas.vista[lote]
+
+    def ventana(self, desde=None, hasta=None, puntos=PUNTOS_VENTANA):
+        """Resumen de los pesos registrados entre `desde` y `hasta` (segundos, inclusive).
+
+        Devuelve un diccionario con 'nivel' y 'tamano_bloque'; en el nivel 0
+        las columnas 'fecha', 'peso' y 'estado', y en los demás 'fecha'
+        (inicio del bloque), 'minimo', 'maximo', 'peor_bajo', 'peor_sobre',
+        'bajo' y 'sobre'.
+        """
+        fechas, offsets = self._fechas.vista, self._offsets.vista
+        primer_lote = 0 if desde is None else int(np.searchsorted(fechas, desde, side='left'))
+        fin_lote = self.lotes if hasta is None else int(np.searchsorted(fechas, hasta,
+                                                                        side='right'))
+        inicio = int(offsets[primer_lote]) if primer_lote < self.lotes else len(self)
+        fin = int(offsets[fin_lote]) if fin_lote < self.lotes else len(self)
+
+        nivel_k = 0
+        while -(-(fin - inicio) // FACTOR ** nivel_k) > puntos and nivel_k < len(self._niveles):
+            nivel_k += 1
+        if nivel_k == 0:
+            return {'nivel': 0, 'tamano_bloque': 1,
+                    'fecha': self._fecha_de(np.arange(inicio, fin)),
+                    'peso': self._pesos.vista[inicio:fin],
+                    'estado': self._estado.vista[inicio:fin]}
+
+        tamano = FACTOR ** nivel_k
+        primero, ultimo = inicio // tamano, -(-fin // tamano)
+        nivel = self._niveles[nivel_k - 1]
+        salida = {c: nivel[c].vista[primero:ultimo] for c in _CAMPOS_NIVEL}
+        salida.update(nivel=nivel_k, tamano_bloque=tamano,
+                      fecha=self._fecha_de(np.arange(primero, ultimo) * tamano))
+        return salida
+
+
+def _segundos(fecha):
+    return datetime.fromisoformat(fecha).timestamp()
+
+
+class HistoriaPesos:
+    """Pirámides de todos los productos, alimentadas desde el historial"""
+
+    def __init__(self):
+        self._piramides = {}
+        self._ultimo_id = 0
+        self._candado = threading.RLock()
+
+    def actualizar(self, historial):
+        """Incorpora solo los lotes guardados desde la última actualización"""
+        with self._candado:
+            nuevos = {}
+            for (lote_id, fecha, producto, _estacion, _nominal, lim_inf, lim_sup, _k, _decision,
+                 pesos) in historial.pesajes(despues_de_id=self._ultimo_id):
+                columnas = nuevos.setdefault(producto, ([], [], [], []))
+                columnas[0].append(_segundos(fecha))
+                columnas[1].append(np.frombuffer(pesos, dtype='<f8'))
+                columnas[2].append(lim_inf)
+                columnas[3].append(lim_sup)
+                self._ultimo_id = lote_id
+            for producto, columnas in nuevos.items():
+                piramide = self._piramides.get(producto)
+                if piramide is None:
+                    piramide = self._piramides[producto] = PiramidePesos()
+                inicio = len(piramide)
+                piramide.agregar_lotes(*columnas)
+                piramide.construir(inicio)
+
+    def productos(self):
+        with self._candado:
+            return sorted(p for p, piramide in self._piramides.items() if len(piramide))
+
+    def piramide(self, producto):
+        with self._candado:
+            return self._piramides.get(producto)
+
+
+def especificacion_historia(ventana, lim_inf, lim_sup):
+    """Especificación Vega-Lite de la ventana, con selección de intervalo para acercar"""
+    eje_x = {'field': 'Fecha', 'type': 'temporal', 'title': None}
+    eje_y = {'type': 'quantitative', 'scale': {'zero': False}, 'title': 'Peso'}
+    fechas = (np.asarray(ventana['fecha']) * 1000).tolist()
+    if ventana['nivel'] == 0:
+        datos = [{'Fecha': f, 'Peso': p, 'Fuera': e != ESTADO_DENTRO}
+                 for f, p, e in zip(fechas, ventana['peso'].tolist(),
+                                    ventana['estado'].tolist())]
+        capas = [{
+            'mark': {'type': 'point', 'filled': True, 'size': 18, 'tooltip': True},
+            'encoding': {
+                'x': eje_x, 'y': dict(eje_y, field='Peso'),
+                'color': {'field': 'Fuera', 'type': 'nominal', 'legend': None,
+                          'scale': {'domain': [False, True],
+                                    'range': [COLORES['primary'], COLORES['danger']]}},
+            },
+        }]
+    else:
+        datos = [{'Fecha': f, 'Mínimo': a, 'Máximo': b, 'Bajo': nb, 'Sobre': ns}
+                 for f, a, b, nb, ns in zip(fechas, ventana['minimo'].tolist(),
+                                            ventana['maximo'].tolist(),
+                                            ventana['bajo'].tolist(), ventana['sobre'].tolist())]
+        for fila, peor_bajo, peor_sobre in zip(datos, ventana['peor_bajo'].tolist(),
+                                               ventana['peor_sobre'].tolist()):
+            # Solo los bloques con violaciones llevan el peor valor (NaN no es JSON)
+            if peor_bajo == peor_bajo:
+                fila['Peor bajo'] = peor_bajo
+            if peor_sobre == peor_sobre:
+                fila['Peor sobre'] = peor_sobre
+        capas = [{
+            'mark': {'type': 'area', 'opacity': 0.5, 'color': COLORES['primary'],
+                     'interpolate': 'step-after'},
+            'encoding': {'x': eje_x, 'y': dict(eje_y, field='Mínimo'),
+                         'y2': {'field': 'Máximo'}},
+        }]
+        capas += [{
+            'mark': {'type': 'point', 'filled': True, 'size': 30, 'color': COLORES['danger'],
+                     'tooltip': True},
+            'encoding': {'x': eje_x, 'y': dict(eje_y, field=campo)},
+        } for campo in ('Peor bajo', 'Peor sobre')]
+    capas[0]['params'] = [{'name': 'zoom', 'select': {'type': 'interval', 'encodings': ['x']}}]
+    capas += [{
+        'mark': {'type': 'rule', 'strokeDash': [4, 3], 'color': COLORES['danger']},
+        'encoding': {'y': {'datum': limite, 'type': 'quantitative'}},
+    } for limite in (lim_inf, lim_sup) if limite == limite]
+    return {'data': {'values': datos}, 'layer': capas, 'height': 320}
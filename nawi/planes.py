@@ -0,0 +1,275 @@
+"""Planes de muestreo MIL-STD-414: tablas e índice compilado.
+
+Las tablas se validan y se compilan una sola vez al importar el módulo en
+un índice inmutable respaldado por arreglos: búsqueda binaria sobre los
+límites de tamaño de lote y una matriz (letra × NCA) para k y n.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# ============================================================
+# TABLAS DE DATOS MIL-STD-414
+# ============================================================
+NIVELES = ("I", "II", "III", "IV", "V")
+
+RANGOS_LOTE = [
+    (3, 8,     {'I': 'B', 'II': 'B', 'III': 'B', 'IV': 'B', 'V': 'C'}),
+    (9, 15,    {'I': 'B', 'II': 'B', 'III': 'B', 'IV': 'B', 'V': 'D'}),
+    (16, 25,   {'I': 'B', 'II': 'B', 'III': 'B', 'IV': 'C', 'V': 'E'}),
+    (26, 40,   {'I': 'B', 'II': 'B', 'III': 'B', 'IV': 'D', 'V': 'F'}),
+    (41, 65,   {'I': 'B', 'II': 'B', 'III': 'C', 'IV': 'E', 'V': 'G'}),
+    (66, 110,  {'I': 'B', 'II': 'B', 'III': 'D', 'IV': 'F', 'V': 'H'}),
+    (111, 180, {'I': 'B', 'II': 'C', 'III': 'E', 'IV': 'G', 'V': 'I'}),
+    (181, 300, {'I': 'B', 'II': 'D', 'III': 'F', 'IV': 'H', 'V': 'J'}),
+    (301, 500, {'I': 'C', 'II': 'E', 'III': 'G', 'IV': 'I', 'V': 'K'}),
+    (501, 800, {'I': 'D', 'II': 'F', 'III': 'H', 'IV': 'J', 'V': 'L'}),
+    (801, 1300,{'I': 'E', 'II': 'G', 'III': 'I', 'IV': 'K', 'V': 'L'}),
+    (1301, 3200,{'I': 'F', 'II': 'H', 'III': 'J', 'IV': 'L', 'V': 'M'}),
+    (3201, 8000,{'I': 'G', 'II': 'I', 'III': 'L', 'IV': 'M', 'V': 'N'}),
+    (8001, 22000,{'I': 'H', 'II': 'J', 'III': 'M', 'IV': 'N', 'V': 'O'}),
+    (22001, 110000,{'I': 'I', 'II': 'K', 'III': 'N', 'IV': 'O', 'V': 'P'}),
+    (110001, 550000,{'I': 'I', 'II': 'K', 'III': 'O', 'IV': 'P', 'V': 'Q'}),
+    (550001, float('inf'),{'I': 'I', 'II': 'K', 'III': 'P', 'IV': 'Q', 'V': 'Q'}),
+]
+
+AQL_KEYS = ["0.04", "0.065", "0.1", "0.15", "0.25", "0.4", "0.65", "1",
+            "1.5", "2.5", "4", "6.5", "10", "15"]
+
+TABLA_K = {
+    "B": {"muestra": 3, "0.04": None, "0.065": None, "0.1": None, "0.15": None,
+          "0.25": None, "0.4": None, "0.65": None, "1": None, "1.5": None,
+          "2.5": 7.59, "4": 18.86, "6.5": 26.94, "10": 33.69, "15": 40.47},
+    "C": {"muestra": 4, "0.04": None, "0.065": None, "0.1": None, "0.15": None,
+          "0.25": None, "0.4": None, "0.65": None, "1": 1.53, "1.5": 5.5,
+          "2.5": 10.92, "4": 16.45, "6.5": 22.86, "10": 29.45, "15": 36.9},
+    "D": {"muestra": 5, "0.04": None, "0.065": None, "0.1": None, "0.15": None,
+          "0.25": None, "0.4": None, "0.65": None, "1": 1.33, "1.5": 5.83,
+          "2.5": 9.8, "4": 14.39, "6.5": 20.19, "10": 26.56, "15": 33.99},
+    "E": {"muestra": 7, "0.04": None, "0.065": None, "0.1": None, "0.15": None,
+          "0.25": 0.422, "0.4": 1.06, "0.65": 2.14, "1": 3.55, "1.5": 5.35,
+          "2.5": 8.4, "4": 12.2, "6.5": 17.35, "10": 23.29, "15": 30.5},
+    "F": {"muestra": 10, "0.04": None, "0.065": None, "0.1": None,
+          "0.15": 0.349, "0.25": 0.716, "0.4": 1.3, "0.65": 2.17, "1": 3.26,
+          "1.5": 4.77, "2.5": 7.29, "4": 10.54, "6.5": 15.17, "10": 20.74, "15": 27.57},
+    "G": {"muestra": 15, "0.04": 0.099, "0.065": 0.099, "0.1": 0.312,
+          "0.15": 0.503, "0.25": 0.818, "0.4": 1.31, "0.65": 2.11, "1": 3.05,
+          "1.5": 4.31, "2.5": 6.56, "4": 9.46, "6.5": 13.71, "10": 18.94, "15": 25.61},
+    "H": {"muestra": 20, "0.04": 0.135, "0.065": 0.135, "0.1": 0.365,
+          "0.15": 0.544, "0.25": 0.846, "0.4": 1.29, "0.65": 2.05, "1": 2.95,
+          "1.5": 4.09, "2.5": 6.17, "4": 8.92, "6.5": 12.99, "10": 18.03, "15": 24.53},
+    "I": {"muestra": 25, "0.04": 0.155, "0.065": 0.156, "0.1": 0.38,
+          "0.15": 0.551, "0.25": 0.877, "0.4": 1.29, "0.65": 2, "1": 2.86,
+          "1.5": 3.97, "2.5": 5.97, "4": 8.63, "6.5": 12.57, "10": 17.51, "15": 23.97},
+    "J": {"muestra": 30, "0.04": 0.179, "0.065": 0.179, "0.1": 0.413,
+          "0.15": 0.581, "0.25": 0.879, "0.4": 1.29, "0.65": 1.98, "1": 2.83,
+          "1.5": 3.91, "2.5": 5.86, "4": 8.47, "6.5": 12.36, "10": 17.24, "15": 23.58},
+    "K": {"muestra": 35, "0.04": 0.17, "0.065": 0.17, "0.1": 0.388,
+          "0.15": 0.535, "0.25": 0.847, "0.4": 1.23, "0.65": 1.87, "1": 2.68,
+          "1.5": 3.7, "2.5": 5.57, "4": 8.1, "6.5": 11.87, "10": 16.65, "15": 22.91},
+    "L": {"muestra": 40, "0.04": 0.179, "0.065": 0.179, "0.1": 0.401,
+          "0.15": 0.566, "0.25": 0.873, "0.4": 1.26, "0.65": 1.88, "1": 2.71,
+          "1.5": 3.72, "2.5": 5.58, "4": 8.09, "6.5": 11.85, "10": 16.61, "15": 22.86},
+    "M": {"muestra": 50, "0.04": 0.163, "0.065": 0.163, "0.1": 0.363,
+          "0.15": 0.503, "0.25": 0.789, "0.4": 1.17, "0.65": 1.71, "1": 2.49,
+          "1.5": 3.45, "2.5": 5.2, "4": 7.61, "6.5": 11.23, "10": 15.87, "15": 22},
+    "N": {"muestra": 75, "0.04": 0.147, "0.065": 0.147, "0.1": 0.33,
+          "0.15": 0.467, "0.25": 0.72, "0.4": 1.07, "0.65": 1.6, "1": 2.29,
+          "1.5": 3.2, "2.5": 4.87, "4": 7.15, "6.5": 10.63, "10": 15.13, "15": 21.11},
+    "O": {"muestra": 100, "0.04": 0.145, "0.065": 0.145, "0.1": 0.317,
+          "0.15": 0.447, "0.25": 0.689, "0.4": 1.02, "0.65": 1.53, "1": 2.2,
+          "1.5": 3.07, "2.5": 4.69, "4": 6.91, "6.5": 10.32, "10": 14.75, "15": 20.66},
+    "P": {"muestra": 150, "0.04": 0.134, "0.065": 0.134, "0.1": 0.293,
+          "0.15": 0.413, "0.25": 0.638, "0.4": 0.949, "0.65": 1.43, "1": 2.05,
+          "1.5": 2.89, "2.5": 4.43, "4": 6.57, "6.5": 9.88, "10": 14.2, "15": 20.02},
+    "Q": {"muestra": 200, "0.04": 0.135, "0.065": 0.135, "0.1": 0.294,
+          "0.15": 0.414, "0.25": 0.637, "0.4": 0.945, "0.65": 1.42, "1": 2.04,
+          "1.5": 2.87, "2.5": 4.4, "4": 6.53, "6.5": 9.81, "10": 14.12, "15": 19.92}
+}
+
+# ============================================================
+# ÍNDICE COMPILADO
+# ============================================================
+class ErrorTablaPlanes(ValueError):
+    """Anomalía detectada al compilar las tablas de planes"""
+
+
+class PlanMuestreo(NamedTuple):
+    """Plan resuelto para un (nivel, tamaño de lote, NCA)"""
+    letra: str
+    n: int
+    k: Optional[float]
+    nivel: str
+    aql: str
+
+
+@dataclass(frozen=True)
+class IndicePlanes:
+    """Índice inmutable de los planes de muestreo.
+
+    - `limites_inf` / `limites_sup`: límites de cada rango de lote.
+    - `letra_por_rango`: matriz (rango × nivel) con el índice de la letra.
+    - `muestra`: tamaño de muestra n por letra.
+    - `matriz_k`: matriz (letra × NCA) con k; NaN donde no hay plan.
+    """
+    niveles: tuple
+    letras: tuple
+    aqls: tuple
+    limites_inf: tuple
+    limites_sup: tuple
+    letra_por_rango: np.ndarray
+    muestra: np.ndarray
+    matriz_k: np.ndarray
+
+    def posicion_nivel(self, nivel):
+        """Índice del nivel de inspección (ValueError si no existe)"""
+        return self.niveles.index(nivel)
+
+    def posicion_aql(self, aql):
+        """Índice de la NCA; acepta la clave de texto o un número"""
+        if not isinstance(aql, str):
+            aql = f"{float(aql):g}"
+        return self.aqls.index(aql)
+
+    def posicion_rango(self, tam_lote):
+        """Índice del rango que contiene al lote, o None; O(log n)"""
+        pos = bisect_right(self.limites_inf, tam_lote) - 1
+        if pos < 0 or tam_lote > self.limites_sup[pos]:
+            return None
+        return pos
+
+    def letra(self, nivel, tam_lote):
+        """Letra del plan para el nivel y tamaño de lote, o None"""
+        pos = self.posicion_rango(tam_lote)
+        if pos is None:
+            return None
+        return self.letras[self.letra_por_rango[pos, self.posicion_nivel(nivel)]]
+
+    def plan(self, nivel, tam_lote, aql):
+        """Plan completo (letra, n, k) o None si el lote está fuera de rango"""
+        pos = self.posicion_rango(tam_lote)
+        if pos is None:
+            return None
+        fila = self.letra_por_rango[pos, self.posicion_nivel(nivel)]
+        k = self.matriz_k[fila, self.posicion_aql(aql)]
+        return PlanMuestreo(
+            letra=self.letras[fila],
+            n=int(self.muestra[fila]),
+            k=None if np.isnan(k) else float(k),
+            nivel=nivel,
+            aql=self.aqls[self.posicion_aql(aql)],
+        )
+
+    def planes(self, niveles, tam_lotes, aqls):
+        """Resuelve muchos planes a la vez.
+
+        Devuelve un diccionario de arreglos: 'letra' (índice en `letras`,
+        -1 si el lote está fuera de rango), 'n' y 'k' (NaN sin plan).
+        """
+        tam_lotes = np.asarray(tam_lotes, dtype=float)
+        forma = tam_lotes.shape
+        pos_nivel = np.broadcast_to(
+            np.vectorize(self.posicion_nivel, otypes=[np.intp])(niveles), forma)
+        pos_aql = np.broadcast_to(
+            np.vectorize(self.posicion_aql, otypes=[np.intp])(aqls), forma)
+
+        pos_rango = np.searchsorted(self.limites_inf, tam_lotes, side='right') - 1
+        validos = (pos_rango >= 0) & (
+            tam_lotes <= np.asarray(self.limites_sup)[np.maximum(pos_rango, 0)])
+        pos_rango = np.where(validos, pos_rango, 0)
+
+        letra = np.where(validos, self.letra_por_rango[pos_rango, pos_nivel], -1)
+        fila = np.maximum(letra, 0)
+        return {
+            'letra': letra,
+            'n': np.where(validos, self.muestra[fila], 0),
+            'k': np.where(validos, self.matriz_k[fila, pos_aql], np.nan),
+        }
+
+
+def _validar_tablas(rangos, tabla, aqls):
+    """Verifica la consistencia de las tablas; lanza ErrorTablaPlanes"""
+    anterior = None
+    for minimo, maximo, letras in rangos:
+        if minimo > maximo:
+            raise ErrorTablaPlanes(f"Rango de lote invertido: {minimo}-{maximo}")
+        if anterior is not None and minimo != anterior + 1:
+            raise ErrorTablaPlanes(
+                f"Rangos de lote no contiguos: {anterior} seguido de {minimo}")
+        anterior = maximo
+        if set(letras) != set(NIVELES):
+            raise ErrorTablaPlanes(f"Niveles incompletos en el rango {minimo}-{maximo}")
+        for letra in letras.values():
+            if letra not in tabla:
+                raise ErrorTablaPlanes(f"Letra {letra} no está definida en la tabla")
+
+    muestra_anterior = 0
+    for letra, fila in sorted(tabla.items()):
+        faltantes = set(aqls) - set(fila)
+        if faltantes:
+            raise ErrorTablaPlanes(f"Letra {letra}: faltan las NCA {sorted(faltantes)}")
+        if fila["muestra"] <= muestra_anterior:
+            raise ErrorTablaPlanes(f"Letra {letra}: el tamaño de muestra no crece")
+        muestra_anterior = fila["muestra"]
+
+        # k debe ser positivo y no decreciente al aumentar la NCA;
+        # las NCA sin plan (None) solo pueden estar al inicio de la fila
+        k_anterior = None
+        for aql in aqls:
+            k = fila[aql]
+            if k is None:
+                if k_anterior is not None:
+                    raise ErrorTablaPlanes(f"Letra {letra}: NCA {aql} sin plan tras valores definidos")
+                continue
+            if k <= 0:
+                raise ErrorTablaPlanes(f"Letra {letra}: k no positivo en NCA {aql} ({k})")
+            if k_anterior is not None and k < k_anterior:
+                raise ErrorTablaPlanes(
+                    f"Letra {letra}: k={k} en NCA {aql} es menor que {k_anterior} "
+                    "de la NCA anterior")
+            k_anterior = k
+
+
+def compilar_indice(rangos=RANGOS_LOTE, tabla=TABLA_K, aqls=AQL_KEYS):
+    """Valida las tablas y construye el índice inmutable de planes"""
+    _validar_tablas(rangos, tabla, aqls)
+
+    letras = tuple(sorted(tabla))
+    letra_por_rango = np.array(
+        [[letras.index(fila[nivel]) for nivel in NIVELES] for _, _, fila in rangos],
+        dtype=np.intp,
+    )
+    muestra = np.array([tabla[letra]["muestra"] for letra in letras], dtype=np.int64)
+    matriz_k = np.array(
+        [[np.nan if tabla[letra][aql] is None else tabla[letra][aql] for aql in aqls]
+         for letra in letras],
+        dtype=float,
+    )
+    for arreglo in (letra_por_rango, muestra, matriz_k):
+        arreglo.setflags(write=False)
+
+    return IndicePlanes(
+        niveles=NIVELES,
+        letras=letras,
+        aqls=tuple(aqls),
+        limites_inf=tuple(minimo for minimo, _, _ in rangos),
+        limites_sup=tuple(maximo for _, maximo, _ in rangos),
+        letra_por_rango=letra_por_rango,
+        muestra=muestra,
+        matriz_k=matriz_k,
+    )
+
+
+INDICE = compilar_indice()
+
+
+def obtener_letra_muestreo(nivel, tam_lote):
+    """Obtiene la letra del plan según nivel y tamaño de lote"""
+    return INDICE.letra(nivel, tam_lote)
+
+
+def buscar_plan(nivel, tam_lote, aql):
+    """Obtiene el plan (letra, n, k) para nivel, tamaño de lote y NCA"""
+    return INDICE.plan(nivel, tam_lote, aql)
@@ -0,0 +1,347 @@
+"""Reportes de muchos lotes del historial en PDF o XLSX, en segundo plano.
+
+`iniciar_reporte` lanza un hilo que recorre el historial por páginas (nunca
+carga todos los lotes a la vez) y escribe el archivo a medida que avanza:
+
+- PDF: una página por lote con su gráfico, plan, estadísticas y decisión,
+  y al final un resumen por producto. Cada página se dibuja en vectorial
+  directamente en la figura de la página, se escribe con PdfPages y se
+  libera. Dibujar aparte en un pool de procesos y pegar PNG no compensa:
+  incrustar la imagen en la página cuesta casi lo mismo que dibujarla, y
+  el PDF queda unas 20 veces más pesado.
+- XLSX: libro de openpyxl en modo solo escritura con las hojas «Lotes»,
+  «Pesos» (una fila por pesaje) y «Resumen», volcadas fila por fila.
+
+La sesión que inicia el reporte solo consulta `TareaReporte` (progreso,
+estado, error) y puede cancelarlo; el archivo parcial de un reporte
+cancelado o fallido se borra. `reporte_en_trabajo` hace lo mismo dentro
+de un trabajo de `nawi.trabajos` (en otro proceso).
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from .analisis import DECISION_ACEPTAR, DECISION_INDETERMINADA, DECISION_RECHAZAR
+from .estilo import COLORES
+from .trabajos import TrabajoCancelado
+
+FORMATO_PDF = 'pdf'
+FORMATO_XLSX = 'xlsx'
+FORMATOS = (FORMATO_PDF, FORMATO_XLSX)
+
+ESTADO_PENDIENTE = 'pendiente'
+ESTADO_EN_CURSO = 'en_curso'
+ESTADO_TERMINADO = 'terminado'
+ESTADO_CANCELADO = 'cancelado'
+ESTADO_ERROR = 'error'
+
+NOMBRES_DECISION = {
+    DECISION_ACEPTAR: 'Aceptado',
+    DECISION_RECHAZAR: 'Rechazado',
+    DECISION_INDETERMINADA: 'Indeterminado',
+}
+COLORES_DECISION = {
+    DECISION_ACEPTAR: COLORES['success'],
+    DECISION_RECHAZAR: COLORES['danger'],
+    DECISION_INDETERMINADA: COLORES['warning'],
+}
+
+LOTES_POR_CONSULTA = 200
+TAMANO_A4_HORIZONTAL = (11.69, 8.27)
+FILAS_RESUMEN_POR_PAGINA = 25
+
+ENCABEZADOS_LOTES = ['Lote', 'Fecha', 'Producto', 'Estación', 'Nivel', 'Tamaño lote', 'NCA',
+                     'Letra', 'n', 'k', 'Nominal', 'Lím. inferior', 'Lím. superior', 'Media',
+                     'Desviación', 'p total (%)', 'Decisión']
+ENCABEZADOS_RESUMEN = ['Producto', 'Lotes', 'Aceptados', 'Rechazados', 'Indeterminados',
+                       'Aceptación (%)']
+
+
+class TareaReporte:
+    """Reporte en curso; el progreso se lee desde cualquier hilo"""
+
+    def __init__(self, ruta, formato, total):
+        self.ruta = str(ruta)
+        self.formato = formato
+        self.total = total
+        self.hechos = 0
+        self.estado = ESTADO_PENDIENTE
+        self.error = None
+        self.inicio = self.fin = None
+        self._cancelar = threading.Event()
+        self._hilo = None
+        # Progreso de nawi.trabajos, si el reporte corre como trabajo del pool
+        self.progreso = None
+
+    @property
+    def fraccion(self):
+        return min(self.hechos / self.total, 1.0) if self.total else 1.0
+
+    @property
+    def activa(self):
+        return self.estado in (ESTADO_PENDIENTE, ESTADO_EN_CURSO)
+
+    @property
+    def cancelada(self):
+        return self._cancelar.is_set()
+
+    @property
+    def segundos(self):
+        if self.inicio is None:
+            return 0.0
+        return (self.fin or time.perf_counter()) - self.inicio
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    def avanzar(self):
+        """Cuenta un lote escrito"""
+        self.hechos += 1
+        if self.progreso is not None:
+            try:
+                self.progreso.informar(self.hechos, self.total)
+            except TrabajoCancelado:
+                self.cancelar()
+
+    def esperar(self, timeout=None):
+        """Espera a que termine; devuelve True si ya no está activa"""
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+        return not self.activa
+
+
+def recorrer_lotes(historial, producto=None, desde=None, hasta=None,
+                   tamano_pagina=LOTES_POR_CONSULTA):
+    """Lotes que cumplen los filtros, del más reciente al más antiguo, por páginas"""
+    cursor = None
+    while True:
+        filas, cursor = historial.consultar(producto=producto, desde=desde, hasta=hasta,
+                                            despues_de=cursor, tamano_pagina=tamano_pagina)
+        yield from filas
+        if cursor is None:
+            return
+
+
+def _argumentos_grafico(fila, pesos):
+    pesos = np.zeros(0) if pesos is None else pesos
+    nominal = fila['nominal']
+    if nominal is None:
+        nominal = (fila['lim_inf'] + fila['lim_sup']) / 2
+    media = fila['media']
+    if media is None:
+        media = float(np.mean(pesos)) if len(pesos) else nominal
+    return pesos, nominal, fila['lim_inf'], fila['lim_sup'], media, fila['desviacion'] or 0.0
+
+
+def _fila_lote(fila):
+    return [
+        fila['id'], datetime.fromisoformat(fila['fecha']), fila['producto'], fila['estacion'],
+        fila['nivel'], fila['tam_lote'], fila['aql'], fila['letra'], fila['n'], fila['k'],
+        fila['nominal'], fila['lim_inf'], fila['lim_sup'], fila['media'], fila['desviacion'],
+        fila['p_total'], NOMBRES_DECISION.get(fila['decision'], ''),
+    ]
+
+
+def _contar(resumen, fila):
+    conteo = resumen.setdefault(fila['producto'] or 'sin producto', [0, 0, 0])
+    conteo[{DECISION_ACEPTAR: 0, DECISION_RECHAZAR: 1}.get(fila['decision'], 2)] += 1
+
+
+def filas_resumen(resumen):
+    """Filas de la tabla de resumen por producto"""
+    filas = []
+    for producto, (aceptados, rechazados, indeterminados) in sorted(resumen.items()):
+        total = aceptados + rechazados + indeterminados
+        filas.append([producto, total, aceptados, rechazados, indeterminados,
+                      round(100 * aceptados / total, 1)])
+    return filas
+
+
+def _formato(valor, decimales=3):
+    return '—' if valor is None else f"{valor:.{decimales}f}"
+
+
+def _pagina_lote(fila, pesos):
+    from matplotlib.figure import Figure
+
+    from .graficos import MODO_RAPIDO, dibujar_grafico
+
+    fig = Figure(figsize=TAMANO_A4_HORIZONTAL)
+    fig.text(0.04, 0.95, f"Lote {fila['id']} · {fila['producto'] or 'sin producto'}",
+             fontsize=16, fontweight='bold', va='top')
+    fig.text(0.04, 0.905, f"{fila['fecha'][:19].replace('T', ' ')}"
+             f"{' · estación ' + fila['estacion'] if fila['estacion'] else ''}",
+             fontsize=10, color='gray', va='top')
+    fig.text(0.96, 0.95, NOMBRES_DECISION.get(fila['decision'], ''), fontsize=16,
+             fontweight='bold', ha='right', va='top',
+             color=COLORES_DECISION.get(fila['decision'], 'black'))
+
+    dispersion = fig.add_axes([0.06, 0.32, 0.52, 0.52])
+    histograma = fig.add_axes([0.65, 0.32, 0.31, 0.52])
+    dibujar_grafico(dispersion, histograma, *_argumentos_grafico(fila, pesos), modo=MODO_RAPIDO)
+
+    tabla = fig.add_axes([0.04, 0.04, 0.92, 0.18])
+    tabla.axis('off')
+    tabla.table(
+        colLabels=['Nivel', 'NCA', 'Letra', 'n', 'k', 'Nominal', 'LI', 'LS', 'Media', 'S',
+                   'p total (%)'],
+        cellText=[[fila['nivel'] or '—', fila['aql'] or '—', fila['letra'] or '—', fila['n'],
+                   _formato(fila['k'], 2), _formato(fila['nominal'], 2),
+                   _formato(fila['lim_inf'], 2), _formato(fila['lim_sup'], 2),
+                   _formato(fila['media']), _formato(fila['desviacion']),
+                   _formato(fila['p_total'])]],
+        loc='center', cellLoc='center',
+    ).scale(1, 1.8)
+    return fig
+
+
+def _paginas_resumen(resumen, pie):
+    from matplotlib.figure import Figure
+
+    filas = filas_resumen(resumen) or [['(sin lotes)', 0, 0, 0, 0, 0.0]]
+    for inicio in range(0, len(filas), FILAS_RESUMEN_POR_PAGINA):
+        fig = Figure(figsize=TAMANO_A4_HORIZONTAL)
+        fig.text(0.04, 0.95, "Resumen por producto", fontsize=16, fontweight='bold', va='top')
+        fig.text(0.04, 0.905, pie, fontsize=10, color='gray', va='top')
+        ax = fig.add_axes([0.04, 0.05, 0.92, 0.8])
+        ax.axis('off')
+        ax.table(colLabels=ENCABEZADOS_RESUMEN,
+                 cellText=filas[inicio:inicio + FILAS_RESUMEN_POR_PAGINA],
+                 loc='upper center', cellLoc='center').scale(1, 1.5)
+        yield fig
+
+
+def _escribir_pdf(tarea, historial, lotes, pie):
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    resumen = {}
+    with PdfPages(tarea.ruta, metadata={'Title': 'Reporte de lotes NAWI KUYCHI'}) as pdf:
+        for fila in lotes:
+            if tarea.cancelada:
+                return
+            fig = _pagina_lote(fila, historial.pesos(fila['id']))
+            pdf.savefig(fig)
+            fig.clear()
+            _contar(resumen, fila)
+            tarea.avanzar()
+        for fig in _paginas_resumen(resumen, pie):
+            pdf.savefig(fig)
+            fig.clear()
+
+
+def _escribir_xlsx(tarea, historial, lotes, pie):
+    try:
+        from openpyxl import Workbook
+    except ImportError as error:
+        raise ValueError("El reporte XLSX requiere openpyxl (pip install openpyxl)") from error
+
+    libro = Workbook(write_only=True)
+    hoja_lotes = libro.create_sheet('Lotes')
+    hoja_pesos = libro.create_sheet('Pesos')
+    hoja_lotes.append(ENCABEZADOS_LOTES)
+    hoja_pesos.append(['Lote', 'Muestra', 'Peso'])
+    resumen = {}
+    for fila in lotes:
+        if tarea.cancelada:
+            return
+        hoja_lotes.append(_fila_lote(fila))
+        lote_id = fila['id']
+        pesos = historial.pesos(lote_id)
+        if pesos is not None:
+            for i, peso in enumerate(pesos.tolist(), 1):
+                hoja_pesos.append([lote_id, i, peso])
+        _contar(resumen, fila)
+        tarea.avanzar()
+
+    hoja_resumen = libro.create_sheet('Resumen')
+    hoja_resumen.append([pie])
+    hoja_resumen.append(ENCABEZADOS_RESUMEN)
+    for fila in filas_resumen(resumen):
+        hoja_resumen.append(fila)
+    libro.save(tarea.ruta)
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def descripcion_filtros(producto=None, desde=None, hasta=None):
+    partes = [f"Producto: {producto}" if producto is not None else "Todos los productos"]
+    if desde is not None:
+        partes.append(f"desde {desde:%Y-%m-%d}")
+    if hasta is not None:
+        partes.append(f"hasta {hasta:%Y-%m-%d}")
+    return ' · '.join(partes)
+
+
+def generar_reporte(tarea, historial, producto=None, desde=None, hasta=None):
+    """Escribe el reporte en el hilo actual, actualizando `tarea`"""
+    tarea.estado = ESTADO_EN_CURSO
+    tarea.inicio = time.perf_counter()
+    pie = (f"{descripcion_filtros(producto, desde, hasta)} · "
+           f"generado {datetime.now():%Y-%m-%d %H:%M}")
+    try:
+        lotes = recorrer_lotes(historial, producto, desde, hasta)
+        if tarea.formato == FORMATO_PDF:
+            _escribir_pdf(tarea, historial, lotes, pie)
+        else:
+            _escribir_xlsx(tarea, historial, lotes, pie)
+    except Exception as error:
+        tarea.error = str(error) or type(error).__name__
+        tarea.estado = ESTADO_ERROR
+        _borrar(tarea.ruta)
+    else:
+        if tarea.cancelada:
+            tarea.estado = ESTADO_CANCELADO
+            _borrar(tarea.ruta)
+        else:
+            tarea.estado = ESTADO_TERMINADO
+    finally:
+        tarea.fin = time.perf_counter()
+    return tarea
+
+
+def iniciar_reporte(historial, ruta, formato=FORMATO_PDF, producto=None, desde=None,
+                    hasta=None):
+    """Lanza el reporte en un hilo propio y devuelve su TareaReporte de inmediato.
+
+    `desde` y `hasta` (datetime) filtran por fecha de registro, `hasta`
+    exclusivo, igual que en `HistorialLotes.consultar`.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de reporte no soportado: {formato} (use {', '.join(FORMATOS)})")
+    tarea = TareaReporte(ruta, formato,
+                         historial.contar(producto=producto, desde=desde, hasta=hasta))
+    tarea._hilo = threading.Thread(
+        target=generar_reporte, args=(tarea, historial, producto, desde, hasta),
+        name=f'reporte-{formato}', daemon=True,
+    )
+    tarea._hilo.start()
+    return tarea
+
+
+def reporte_en_trabajo(ruta_historial, ruta, formato=FORMATO_PDF, producto=None, desde=None,
+                       hasta=None, progreso=None):
+    """Genera el reporte como trabajo de `PoolTrabajos`; devuelve un resumen serializable"""
+    from .historial import HistorialLotes
+
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de reporte no soportado: {formato} (use {', '.join(FORMATOS)})")
+    historial = HistorialLotes(ruta_historial)
+    try:
+        tarea = TareaReporte(ruta, formato,
+                             historial.contar(producto=producto, desde=desde, hasta=hasta))
+        tarea.progreso = progreso
+        generar_reporte(tarea, historial, producto, desde, hasta)
+    finally:
+        historial.cerrar()
+    if tarea.estado == ESTADO_ERROR:
+        raise RuntimeError(tarea.error)
+    return {'ruta': tarea.ruta, 'formato': formato, 'total': tarea.total,
+            'segundos': tarea.segundos}
@@ -0,0 +1,112 @@
+"""Generación de pesos y lotes sintéticos para simulaciones.
+
+Todo sale de un `numpy.random.Generator` con semilla explícita: la misma
+semilla reproduce exactamente los mismos lotes. Los lotes se generan como
+una matriz (lotes × n) de una vez, así que millones de lotes para probar
+`evaluar_lotes` o entrenar operadores cuestan lo que cuesta la memoria
+(`generar_lotes_por_bloques` la acota).
+
+Escenarios (σ es la variabilidad de cada máquina):
+
+- normal: proceso centrado en el nominal, normal truncada a ±`truncar`·σ.
+- desplazado: la media se corre `desplazamiento`·σ (llenadora descalibrada).
+- bimodal: dos máquinas que alimentan el mismo lote, con medias separadas
+  `separacion`·σ; cada peso viene de la primera con probabilidad
+  `proporcion`.
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+ESCENARIO_NORMAL = 'normal'
+ESCENARIO_DESPLAZADO = 'desplazado'
+ESCENARIO_BIMODAL = 'bimodal'
+ESCENARIOS = (ESCENARIO_NORMAL, ESCENARIO_DESPLAZADO, ESCENARIO_BIMODAL)
+
+LOTES_POR_BLOQUE = 100_000
+
+
+class Escenario(NamedTuple):
+    """Proceso simulado; desplazamiento, separación y truncado van en unidades de σ"""
+    tipo: str = ESCENARIO_NORMAL
+    sigma: Optional[float] = None
+    desplazamiento: float = 0.0
+    separacion: float = 3.0
+    proporcion: float = 0.5
+    truncar: Optional[float] = 3.0
+    decimales: Optional[int] = 2
+
+
+def sigma_predeterminada(nominal, lim_inf, lim_sup):
+    """σ que ocupa el intervalo de especificación con ±3σ"""
+    if lim_sup > lim_inf:
+        return (lim_sup - lim_inf) / 6.0
+    return max(0.1, abs(nominal) * 0.01)
+
+
+def _normal_truncada(rng, forma, truncar, dtype):
+    """Normal estándar truncada a [-truncar, truncar] por rechazo (exacta)"""
+    z = rng.standard_normal(forma, dtype=dtype)
+    if truncar is None:
+        return z
+    plano = z.reshape(-1)
+    fuera = np.flatnonzero(np.abs(plano) > truncar)
+    # A ±3σ se rechaza el 0,27 %: cada vuelta solo regenera esos valores
+    while fuera.size:
+        plano[fuera] = rng.standard_normal(fuera.size, dtype=dtype)
+        fuera = fuera[np.abs(plano[fuera]) > truncar]
+    return z
+
+
+def generar_lotes(lotes, n, nominal, lim_inf, lim_sup, escenario=Escenario(), semilla=None,
+                  dtype=np.float64):
+    """Matriz (lotes × n) de pesos del escenario.
+
+    `semilla` puede ser un entero, una SeedSequence o un Generator ya
+    creado; None toma entropía del sistema (no reproducible).
+    """
+    if escenario.tipo not in ESCENARIOS:
+        raise ValueError(f"Escenario desconocido: {escenario.tipo} (use {', '.join(ESCENARIOS)})")
+    if not 0 <= escenario.proporcion <= 1:
+        raise ValueError("La proporción de la primera máquina debe estar entre 0 y 1")
+    rng = np.random.default_rng(semilla)
+    sigma = escenario.sigma
+    if sigma is None:
+        sigma = sigma_predeterminada(nominal, lim_inf, lim_sup)
+
+    pesos = _normal_truncada(rng, (int(lotes), int(n)), escenario.truncar, dtype)
+    pesos *= sigma
+    centro = nominal
+    if escenario.tipo != ESCENARIO_NORMAL:
+        centro += escenario.desplazamiento * sigma
+    pesos += centro
+    if escenario.tipo == ESCENARIO_BIMODAL:
+        mitad = escenario.separacion * sigma / 2
+        segunda = rng.random(pesos.shape, dtype=dtype) >= escenario.proporcion
+        pesos -= mitad
+        pesos += segunda * (2 * mitad)
+    if escenario.decimales is not None:
+        np.round(pesos, escenario.decimales, out=pesos)
+    return pesos
+
+
+def generar_lotes_por_bloques(lotes, n, nominal, lim_inf, lim_sup, escenario=Escenario(),
+                              semilla=None, tamano_bloque=LOTES_POR_BLOQUE, dtype=np.float64):
+    """Genera `lotes` lotes en bloques de `tamano_bloque` filas.
+
+    Cada bloque usa su propia semilla derivada de `semilla`, así que el
+    resultado es reproducible para un mismo tamaño de bloque.
+    """
+    bloques = -(-int(lotes) // tamano_bloque)
+    semillas = np.random.SeedSequence(semilla).spawn(bloques)
+    for i, semilla_bloque in enumerate(semillas):
+        filas = min(tamano_bloque, int(lotes) - i * tamano_bloque)
+        yield generar_lotes(filas, n, nominal, lim_inf, lim_sup, escenario, semilla_bloque, dtype)
+
+
+def generar_pesos_aleatorios(n, nominal, lim_inf, lim_sup, sigma=None, semilla=None,
+                             escenario=Escenario()):
+    """Un lote de n pesos (arreglo); `sigma` reemplaza la σ del escenario"""
+    if sigma is not None:
+        escenario = escenario._replace(sigma=sigma)
+    return generar_lotes(1, n, nominal, lim_inf, lim_sup, escenario, semilla)[0]
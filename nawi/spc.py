@@ -0,0 +1,254 @@
+"""Cartas de control X̄–S y capacidad (Cp/Cpk) móvil entre lotes.
+
+Cada lote aporta un subgrupo (n, X̄, S). Por producto y estación se
+mantienen sumas acumuladas, de modo que agregar un lote cuesta O(1) y
+los límites se obtienen de las sumas sin volver a recorrer el historial:
+
+- σ̂ = promedio de S_i / c4(n_i) (admite subgrupos de distinto tamaño).
+- Carta X̄: X̿ ± 3·σ̂/√n, con X̿ la media ponderada por n.
+- Carta S: c4(n)·σ̂ ± 3·σ̂·√(1 - c4(n)²), con el inferior truncado en 0.
+
+La capacidad usa una ventana móvil de los últimos lotes (sumas que se
+actualizan al entrar y salir cada lote) y la especificación del lote
+más reciente: Cp = (LS - LI) / 6σ̂ y Cpk = min(LS - μ, μ - LI) / 3σ̂.
+"""
+import math
+import threading
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+
+from .estilo import COLORES
+
+VENTANA_CAPACIDAD = 25
+CAPACIDAD_INICIAL = 256
+
+
+@lru_cache(maxsize=None)
+def c4(n):
+    """Constante c4(n) = E[S]/σ para muestras normales de tamaño n"""
+    n = int(n)
+    if n < 2:
+        return float('nan')
+    return math.sqrt(2 / (n - 1)) * math.exp(math.lgamma(n / 2) - math.lgamma((n - 1) / 2))
+
+
+def c4_vec(n):
+    """c4 para un arreglo de tamaños (se evalúa una vez por tamaño distinto)"""
+    unicos, inverso = np.unique(np.asarray(n, dtype=np.int64), return_inverse=True)
+    return np.array([c4(u) for u in unicos.tolist()], dtype=float)[inverso]
+
+
+def limites_control(gran_media, sigma, n):
+    """Límites X̄ y S para subgrupos de tamaño n (escalar o arreglo)"""
+    n = np.asarray(n)
+    c = c4_vec(n) if n.ndim else c4(n)
+    margen_media = 3 * sigma / np.sqrt(n)
+    margen_s = 3 * sigma * np.sqrt(1 - np.square(c))
+    return {
+        'lic_media': gran_media - margen_media,
+        'lc_media': gran_media + 0 * margen_media,
+        'lsc_media': gran_media + margen_media,
+        'lic_s': np.maximum(c * sigma - margen_s, 0.0),
+        'lc_s': c * sigma,
+        'lsc_s': c * sigma + margen_s,
+    }
+
+
+def indices_capacidad(media, sigma, lim_inf, lim_sup):
+    """(Cp, Cpk); NaN si σ̂ no es positiva"""
+    if not sigma > 0:
+        return float('nan'), float('nan')
+    cp = (lim_sup - lim_inf) / (6 * sigma)
+    cpk = min(lim_sup - media, media - lim_inf) / (3 * sigma)
+    return cp, cpk
+
+
+class _Columnas:
+    """Columnas numéricas que crecen por duplicación (agregar en O(1) amortizado)"""
+
+    def __init__(self, campos):
+        self._datos = {c: np.empty(CAPACIDAD_INICIAL) for c in campos}
+        self.cantidad = 0
+
+    def agregar(self, **valores):
+        if self.cantidad == len(next(iter(self._datos.values()))):
+            for campo, arreglo in self._datos.items():
+                nuevo = np.empty(2 * len(arreglo))
+                nuevo[:self.cantidad] = arreglo[:self.cantidad]
+                self._datos[campo] = nuevo
+        for campo, valor in valores.items():
+            self._datos[campo][self.cantidad] = valor
+        self.cantidad += 1
+
+    def vista(self, campo, desde=0):
+        return self._datos[campo][desde:self.cantidad]
+
+
+class CartaXS:
+    """Carta X̄–S y capacidad móvil de un producto en una estación"""
+
+    def __init__(self, ventana=VENTANA_CAPACIDAD):
+        self.ventana = ventana
+        self.fechas = []
+        self._puntos = _Columnas(('id', 'n', 'media', 'desviacion', 'cp', 'cpk'))
+        # Sumas acumuladas de todo el historial
+        self._suma_n = 0.0
+        self._suma_nx = 0.0
+        self._suma_sigma = 0.0
+        # Sumas de la ventana de capacidad
+        self._recientes = deque()
+        self._ventana_n = 0.0
+        self._ventana_nx = 0.0
+        self._ventana_sigma = 0.0
+        self.lim_inf = self.lim_sup = float('nan')
+
+    def __len__(self):
+        return self._puntos.cantidad
+
+    def agregar(self, lote_id, fecha, n, media, desviacion, lim_inf, lim_sup):
+        """Incorpora un lote en O(1); se ignoran subgrupos sin S válida"""
+        if n < 2 or media is None or desviacion is None or not math.isfinite(desviacion):
+            return False
+        sigma_lote = desviacion / c4(n)
+        self._suma_n += n
+        self._suma_nx += n * media
+        self._suma_sigma += sigma_lote
+
+        self._recientes.append((n, media, sigma_lote))
+        self._ventana_n += n
+        self._ventana_nx += n * media
+        self._ventana_sigma += sigma_lote
+        if len(self._recientes) > self.ventana:
+            n_sale, media_sale, sigma_sale = self._recientes.popleft()
+            self._ventana_n -= n_sale
+            self._ventana_nx -= n_sale * media_sale
+            self._ventana_sigma -= sigma_sale
+
+        self.lim_inf, self.lim_sup = lim_inf, lim_sup
+        cp, cpk = self.capacidad()
+        self.fechas.append(fecha)
+        self._puntos.agregar(id=lote_id, n=n, media=media, desviacion=desviacion,
+                             cp=cp, cpk=cpk)
+        return True
+
+    @property
+    def gran_media(self):
+        return self._suma_nx / self._suma_n if self._suma_n else float('nan')
+
+    @property
+    def sigma(self):
+        """σ̂ dentro de subgrupos con todo el historial"""
+        return self._suma_sigma / len(self) if len(self) else float('nan')
+
+    def capacidad(self):
+        """(Cp, Cpk) sobre la ventana móvil de lotes recientes"""
+        if not self._recientes:
+            return float('nan'), float('nan')
+        media = self._ventana_nx / self._ventana_n
+        sigma = self._ventana_sigma / len(self._recientes)
+        return indices_capacidad(media, sigma, self.lim_inf, self.lim_sup)
+
+    def datos(self, ultimos=None):
+        """Columnas de los últimos lotes con los límites vigentes y puntos fuera de control"""
+        desde = 0 if ultimos is None else max(len(self) - ultimos, 0)
+        n = self._puntos.vista('n', desde)
+        columnas = {campo: self._puntos.vista(campo, desde)
+                    for campo in ('id', 'media', 'desviacion', 'cp', 'cpk')}
+        columnas['n'] = n
+        columnas['fecha'] = self.fechas[desde:]
+        columnas.update(limites_control(self.gran_media, self.sigma, n))
+        columnas['fuera_control'] = (
+            (columnas['media'] < columnas['lic_media']) | (columnas['media'] > columnas['lsc_media'])
+            | (columnas['desviacion'] < columnas['lic_s']) | (columnas['desviacion'] > columnas['lsc_s'])
+        )
+        return columnas
+
+
+class MonitorSPC:
+    """Cartas de todos los productos y estaciones, alimentadas desde el historial"""
+
+    def __init__(self, ventana=VENTANA_CAPACIDAD):
+        self.ventana = ventana
+        self._cartas = {}
+        self._ultimo_id = 0
+        self._candado = threading.RLock()
+
+    def agregar(self, producto, estacion, lote_id, fecha, n, media, desviacion,
+                lim_inf, lim_sup):
+        with self._candado:
+            carta = self._cartas.get((producto, estacion))
+            if carta is None:
+                carta = self._cartas[(producto, estacion)] = CartaXS(self.ventana)
+            carta.agregar(lote_id, fecha, n, media, desviacion, lim_inf, lim_sup)
+
+    def actualizar(self, historial):
+        """Incorpora solo los lotes guardados desde la última actualización"""
+        with self._candado:
+            for (lote_id, fecha, producto, estacion, n, media, desviacion,
+                 lim_inf, lim_sup) in historial.subgrupos(despues_de_id=self._ultimo_id):
+                self.agregar(producto, estacion, lote_id, fecha, n, media, desviacion,
+                             lim_inf, lim_sup)
+                self._ultimo_id = lote_id
+
+    def claves(self):
+        """(producto, estación) con al menos un subgrupo válido"""
+        with self._candado:
+            return sorted(clave for clave, carta in self._cartas.items() if len(carta))
+
+    def carta(self, producto, estacion):
+        with self._candado:
+            return self._cartas.get((producto, estacion))
+
+
+def especificacion_cartas(datos):
+    """Especificación Vega-Lite de las cartas X̄ y S apiladas, con zoom sincronizado"""
+    filas = [
+        {'Lote': int(i), 'Fecha': f, 'n': int(n), 'Media': m, 'S': s,
+         'LIC X̄': a, 'LC X̄': b, 'LSC X̄': c, 'LIC S': d, 'LC S': e, 'LSC S': g,
+         'Fuera de control': bool(fc)}
+        for i, f, n, m, s, a, b, c, d, e, g, fc in zip(
+            datos['id'].tolist(), datos['fecha'], datos['n'].tolist(),
+            datos['media'].tolist(), datos['desviacion'].tolist(),
+            datos['lic_media'].tolist(), datos['lc_media'].tolist(),
+            datos['lsc_media'].tolist(), datos['lic_s'].tolist(), datos['lc_s'].tolist(),
+            datos['lsc_s'].tolist(), datos['fuera_control'].tolist())
+    ]
+    eje_x = {'field': 'Lote', 'type': 'quantitative', 'scale': {'zero': False}}
+
+    def carta(valor, limites, titulo):
+        capas = [
+            {
+                'mark': {'type': 'line', 'strokeDash': [4, 3], 'color': COLORES['danger']},
+                'encoding': {'x': eje_x, 'y': {'field': campo, 'type': 'quantitative'}},
+            }
+            for campo in (limites[0], limites[2])
+        ]
+        capas.append({
+            'mark': {'type': 'line', 'color': COLORES['success']},
+            'encoding': {'x': eje_x, 'y': {'field': limites[1], 'type': 'quantitative'}},
+        })
+        capas.append({
+            'mark': {'type': 'line', 'point': True, 'color': COLORES['primary'], 'tooltip': True},
+            'encoding': {
+                'x': eje_x,
+                'y': {'field': valor, 'type': 'quantitative', 'scale': {'zero': False},
+                      'title': titulo},
+            },
+        })
+        capas.append({
+            'transform': [{'filter': {'field': 'Fuera de control', 'equal': True}}],
+            'mark': {'type': 'point', 'filled': True, 'size': 80, 'color': COLORES['danger']},
+            'encoding': {'x': eje_x, 'y': {'field': valor, 'type': 'quantitative'}},
+        })
+        return {'layer': capas, 'height': 220, 'width': 'container'}
+
+    superior = carta('Media', ('LIC X̄', 'LC X̄', 'LSC X̄'), 'X̄ del lote')
+    superior['params'] = [{'name': 'zoom', 'select': 'interval', 'bind': 'scales',
+                           'encodings': ['x']}]
+    return {
+        'data': {'values': filas},
+        'vconcat': [superior, carta('S', ('LIC S', 'LC S', 'LSC S'), 'S del lote')],
+        'resolve': {'scale': {'x': 'shared'}},
+    }
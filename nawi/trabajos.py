@@ -0,0 +1,309 @@
+"""Pool de trabajos en procesos, compartido por todas las sesiones.
+
+El trabajo pesado (simulaciones, reportes) no debe correr en el hilo del
+script de Streamlit: bloquea la página de ese operador y compite por el
+GIL con las demás sesiones. `PoolTrabajos` lo ejecuta en procesos
+aparte y la interfaz solo consulta el estado:
+
+    pool = PoolTrabajos()
+    trabajo = pool.enviar(funcion, *args, nombre="Curva OC", propietario=sesion)
+    trabajo.estado, trabajo.progreso, trabajo.resultado
+    trabajo.cancelar()
+
+La función se ejecuta en otro proceso (debe poder importarse y sus
+argumentos y resultado deben poder serializarse) y recibe el argumento
+`progreso`: `progreso.informar(hechos, total)` publica el avance en
+memoria compartida y es también el punto de cancelación (lanza
+TrabajoCancelado si se pidió cancelar).
+
+Reparto justo: hay una cola por propietario y cada proceso libre toma el
+siguiente trabajo del propietario con menos trabajos en curso (y, a
+igualdad, del atendido hace más tiempo), así que los trabajos largos de
+una sesión no dejan en espera a las demás. Con `clave`, un trabajo
+idéntico pedido por otra sesión (o en otro rerun) reutiliza el existente.
+"""
+import importlib
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+PROCESOS_PREDETERMINADOS = os.cpu_count() or 1
+RANURAS = 1024
+MAXIMO_POR_PROPIETARIO = 4
+TERMINADOS_RETENIDOS = 64
+
+ESTADO_PENDIENTE = 'pendiente'
+ESTADO_EN_CURSO = 'en_curso'
+ESTADO_TERMINADO = 'terminado'
+ESTADO_CANCELADO = 'cancelado'
+ESTADO_ERROR = 'error'
+ESTADOS_ACTIVOS = (ESTADO_PENDIENTE, ESTADO_EN_CURSO)
+
+
+class TrabajoCancelado(Exception):
+    """Se lanza dentro del trabajo cuando se pidió cancelarlo"""
+
+
+class LimiteTrabajos(RuntimeError):
+    """El propietario ya tiene demasiados trabajos activos"""
+
+
+# ============================================================
+# LADO DEL PROCESO DE TRABAJO
+# ============================================================
+_progresos = None
+_cancelaciones = None
+
+
+def _inicializar(progresos, cancelaciones, precargar):
+    global _progresos, _cancelaciones
+    _progresos, _cancelaciones = progresos, cancelaciones
+    # Los procesos nacen vacíos (spawn): importar aquí saca ese costo del primer trabajo
+    for modulo in precargar:
+        importlib.import_module(modulo)
+
+
+class Progreso:
+    """Avance de un trabajo visto desde el proceso que lo ejecuta"""
+
+    def __init__(self, ranura):
+        self.ranura = ranura
+
+    @property
+    def cancelado(self):
+        return bool(_cancelaciones[self.ranura])
+
+    def informar(self, hechos, total=None):
+        """Publica el avance (fracción o hechos/total); lanza TrabajoCancelado si corresponde"""
+        _progresos[self.ranura] = hechos / total if total else hechos
+        if _cancelaciones[self.ranura]:
+            raise TrabajoCancelado()
+
+
+def _ejecutar(ranura, funcion, args, kwargs):
+    try:
+        return funcion(*args, progreso=Progreso(ranura), **kwargs)
+    except TrabajoCancelado:
+        return None
+
+
+# ============================================================
+# LADO DEL SERVIDOR
+# ============================================================
+class Trabajo:
+    """Trabajo enviado al pool; sus datos se leen desde cualquier hilo"""
+
+    def __init__(self, pool, identificador, nombre, propietario, clave, funcion, args, kwargs):
+        self._pool = pool
+        self.id = identificador
+        self.nombre = nombre
+        self.propietario = propietario
+        self.clave = clave
+        self.estado = ESTADO_PENDIENTE
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.inicio = self.fin = None
+        self._funcion, self._args, self._kwargs = funcion, args, kwargs
+        self._ranura = None
+        self._cancelar = False
+        self._terminado = threading.Event()
+
+    @property
+    def activo(self):
+        return self.estado in ESTADOS_ACTIVOS
+
+    @property
+    def progreso(self):
+        """Fracción de avance en [0, 1]"""
+        if self.estado == ESTADO_TERMINADO:
+            return 1.0
+        if self.estado != ESTADO_EN_CURSO or self._ranura is None:
+            return 0.0
+        return min(max(self._pool._progresos[self._ranura], 0.0), 1.0)
+
+    @property
+    def segundos(self):
+        if self.inicio is None:
+            return 0.0
+        return (self.fin or time.time()) - self.inicio
+
+    def cancelar(self):
+        self._pool.cancelar(self)
+
+    def esperar(self, timeout=None):
+        """Espera a que termine; devuelve True si ya no está activo"""
+        self._terminado.wait(timeout)
+        return not self.activo
+
+
+class PoolTrabajos:
+    """Procesos de trabajo compartidos con colas por propietario"""
+
+    def __init__(self, procesos=PROCESOS_PREDETERMINADOS, ranuras=RANURAS,
+                 maximo_por_propietario=MAXIMO_POR_PROPIETARIO, precargar=()):
+        self.procesos = max(int(procesos), 1)
+        self.precargar = tuple(precargar)
+        self.maximo_por_propietario = maximo_por_propietario
+        self._contexto = get_context('spawn')
+        self._progresos = self._contexto.RawArray('d', ranuras)
+        self._cancelaciones = self._contexto.RawArray('b', ranuras)
+        self._ranuras_libres = list(range(ranuras - 1, -1, -1))
+        self._candado = threading.RLock()
+        self._colas = {}
+        self._atendido = {}
+        self._turnos = itertools.count(1)
+        self._en_curso = 0
+        self._trabajos = {}
+        self._por_clave = {}
+        self._terminados = deque()
+        self._contador = itertools.count(1)
+        self._ejecutor = None
+
+    def _ejecutor_activo(self):
+        if self._ejecutor is None:
+            self._ejecutor = ProcessPoolExecutor(
+                max_workers=self.procesos, mp_context=self._contexto,
+                initializer=_inicializar, initargs=(self._progresos, self._cancelaciones, self.precargar),
+            )
+        return self._ejecutor
+
+    def calentar(self):
+        """Arranca los procesos ya, para que el primer trabajo no pague el arranque"""
+        with self._candado:
+            ejecutor = self._ejecutor_activo()
+            for _ in range(self.procesos):
+                ejecutor.submit(int)
+
+    # --------------------------------------------------------
+    # Envío y consulta
+    # --------------------------------------------------------
+    def enviar(self, funcion, *args, nombre=None, propietario='', clave=None, **kwargs):
+        """Encola `funcion(*args, progreso=..., **kwargs)` y devuelve su Trabajo"""
+        with self._candado:
+            if clave is not None:
+                existente = self._por_clave.get(clave)
+                if existente is not None and existente.estado not in (ESTADO_CANCELADO,
+                                                                      ESTADO_ERROR):
+                    return existente
+            activos = sum(t.activo for t in self._trabajos.values()
+                          if t.propietario == propietario)
+            if activos >= self.maximo_por_propietario:
+                raise LimiteTrabajos(
+                    f"Ya hay {activos} trabajos activos; espere o cancele alguno")
+            trabajo = Trabajo(self, f"t{next(self._contador)}", nombre or funcion.__name__,
+                              propietario, clave, funcion, args, kwargs)
+            self._trabajos[trabajo.id] = trabajo
+            if clave is not None:
+                self._por_clave[clave] = trabajo
+            self._colas.setdefault(propietario, deque()).append(trabajo)
+            self._despachar()
+        return trabajo
+
+    def obtener(self, identificador):
+        return self._trabajos.get(identificador)
+
+    def trabajos(self, propietario=None):
+        """Trabajos (activos y terminados recientes), del más nuevo al más antiguo"""
+        with self._candado:
+            lista = [t for t in self._trabajos.values()
+                     if propietario is None or t.propietario == propietario]
+        return sorted(lista, key=lambda t: t.creado, reverse=True)
+
+    def activos(self, propietario=None):
+        return [t for t in self.trabajos(propietario) if t.activo]
+
+    def cancelar(self, trabajo):
+        with self._candado:
+            if trabajo.estado == ESTADO_PENDIENTE:
+                cola = self._colas[trabajo.propietario]
+                cola.remove(trabajo)
+                if not cola:
+                    del self._colas[trabajo.propietario]
+                self._finalizar(trabajo, ESTADO_CANCELADO)
+            elif trabajo.estado == ESTADO_EN_CURSO:
+                trabajo._cancelar = True
+                self._cancelaciones[trabajo._ranura] = 1
+
+    # --------------------------------------------------------
+    # Reparto
+    # --------------------------------------------------------
+    def _despachar(self):
+        """Asigna los procesos libres a los propietarios con trabajos en cola"""
+        while self._en_curso < self.procesos and self._ranuras_libres:
+            en_espera = [p for p, cola in self._colas.items() if cola]
+            if not en_espera:
+                return
+            en_curso = {}
+            for t in self._trabajos.values():
+                if t.estado == ESTADO_EN_CURSO:
+                    en_curso[t.propietario] = en_curso.get(t.propietario, 0) + 1
+            propietario = min(en_espera,
+                              key=lambda p: (en_curso.get(p, 0), self._atendido.get(p, 0)))
+            self._atendido[propietario] = next(self._turnos)
+            trabajo = self._colas[propietario].popleft()
+            if not self._colas[propietario]:
+                del self._colas[propietario]
+            ranura = self._ranuras_libres.pop()
+            self._progresos[ranura] = 0.0
+            self._cancelaciones[ranura] = 0
+            trabajo._ranura = ranura
+            trabajo.estado = ESTADO_EN_CURSO
+            trabajo.inicio = time.time()
+            self._en_curso += 1
+            try:
+                futuro = self._ejecutor_activo().submit(
+                    _ejecutar, ranura, trabajo._funcion, trabajo._args, trabajo._kwargs)
+            except BrokenProcessPool:
+                self._ejecutor = None
+                futuro = self._ejecutor_activo().submit(
+                    _ejecutar, ranura, trabajo._funcion, trabajo._args, trabajo._kwargs)
+            futuro.add_done_callback(lambda f, t=trabajo: self._al_terminar(t, f))
+
+    def _al_terminar(self, trabajo, futuro):
+        with self._candado:
+            self._en_curso -= 1
+            self._ranuras_libres.append(trabajo._ranura)
+            error = futuro.exception()
+            if isinstance(error, BrokenProcessPool):
+                # Un proceso murió (p. ej. sin memoria): se recrea el pool
+                self._ejecutor = None
+            if trabajo._cancelar:
+                self._finalizar(trabajo, ESTADO_CANCELADO)
+            elif error is not None:
+                trabajo.error = str(error) or type(error).__name__
+                self._finalizar(trabajo, ESTADO_ERROR)
+            else:
+                trabajo.resultado = futuro.result()
+                self._finalizar(trabajo, ESTADO_TERMINADO)
+            self._despachar()
+
+    def _finalizar(self, trabajo, estado):
+        trabajo.estado = estado
+        trabajo.fin = time.time()
+        trabajo._funcion = trabajo._args = trabajo._kwargs = None
+        trabajo._terminado.set()
+        self._terminados.append(trabajo)
+        while len(self._terminados) > TERMINADOS_RETENIDOS:
+            viejo = self._terminados.popleft()
+            self._trabajos.pop(viejo.id, None)
+            if viejo.clave is not None and self._por_clave.get(viejo.clave) is viejo:
+                del self._por_clave[viejo.clave]
+
+    def cerrar(self):
+        with self._candado:
+            for cola in self._colas.values():
+                for trabajo in cola:
+                    self._finalizar(trabajo, ESTADO_CANCELADO)
+            self._colas.clear()
+            for trabajo in self._trabajos.values():
+                if trabajo.estado == ESTADO_EN_CURSO:
+                    self._cancelaciones[trabajo._ranura] = 1
+            ejecutor, self._ejecutor = self._ejecutor, None
+        if ejecutor is not None:
+            ejecutor.shutdown(wait=False, cancel_futures=True)